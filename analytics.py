@@ -0,0 +1,324 @@
+"""نمای فشرده و فقط‌خواندنی ستونی از نمرات برای معدل، رتبه، توزیع نمرات و آمار هر درس و استاد."""
+import math
+import statistics
+import sys
+import threading
+from array import array
+from collections import defaultdict, namedtuple
+from itertools import groupby, islice
+
+try:
+    import numpy as np
+except ImportError:  # NumPy اختیاری است
+    np = None
+
+from models import Lesson, Master, Presentation, Student, Selection, table_versions
+import services
+
+PASS_SCORE = 10
+SCORE_BINS = 21  # نمره‌های ۰ تا ۲۰؛ نمره اعشاری در خانه جزء صحیح خود شمرده می‌شود
+NO_YEAR = 0  # سال تحصیلی ثبت‌نشده
+NO_MAJOR = -1
+
+GradeStats = namedtuple('GradeStats', 'group_id name count mean median stdev pass_rate minimum maximum histogram')
+
+# نوع array هر ستون و dtype معادل در NumPy (frombuffer بدون کپی روی همان حافظه کار می‌کند)
+COLUMN_TYPES = {'student_ids': 'i', 'lesson_ids': 'i', 'master_ids': 'i', 'units': 'h',
+                'scores': 'd', 'years': 'i', 'major_codes': 'b'}
+
+
+def load_snapshot(session, batch_size=20000, use_numpy=None) -> 'GradebookSnapshot':
+    """همه انتخاب‌های دارای ارائه و درس را ستونی بارگذاری می‌کند؛ use_numpy=False یعنی پایتون ساده."""
+    snapshot = GradebookSnapshot(np is not None if use_numpy is None else use_numpy)
+
+    major_index = {}
+    student_majors = {}
+    for student_id, name, major in session.query(Student.IdStudent, Student.Name, Student.Major):
+        snapshot.student_names[student_id] = sys.intern(name)
+        if major not in major_index:
+            major_index[major] = len(snapshot.majors)
+            snapshot.majors.append(sys.intern(major))
+        student_majors[student_id] = major_index[major]
+    for lesson_id, name, major in session.query(Lesson.LessonId, Lesson.Name, Lesson.Major):
+        snapshot.lesson_names[lesson_id] = sys.intern(name)
+        snapshot.lesson_majors[lesson_id] = sys.intern(major)
+    for master_id, name in session.query(Master.MasterId, Master.Name):
+        snapshot.master_names[master_id] = sys.intern(name)
+
+    columns = {name: array(typecode) for name, typecode in COLUMN_TYPES.items()}
+    query = session.query(Selection.IdStudent, Presentation.LessonId, Presentation.MasterId, Lesson.Unit,
+                          Selection.Score, Selection.YearEducation) \
+        .join(Presentation, Selection.IdPresentation == Presentation.PresentationId) \
+        .join(Lesson, Presentation.LessonId == Lesson.LessonId)
+    rows = iter(query.yield_per(batch_size))
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        students, lessons, masters, units, scores, years = zip(*batch)
+        columns['student_ids'].extend(students)
+        columns['lesson_ids'].extend(lessons)
+        columns['master_ids'].extend(masters)
+        columns['units'].extend(units)
+        columns['scores'].extend(math.nan if score is None else score for score in scores)
+        columns['years'].extend(NO_YEAR if year is None else year for year in years)
+        columns['major_codes'].extend(student_majors.get(student_id, NO_MAJOR) for student_id in students)
+
+    for name, column in columns.items():
+        setattr(snapshot, name, np.frombuffer(column, dtype=column.typecode) if snapshot.use_numpy else column)
+    return snapshot
+
+
+class GradebookSnapshot:
+    """ستون‌های هم‌طول انتخاب‌ها و dictهای شناسه به نام؛ پس از بارگذاری تغییر نمی‌کند."""
+
+    def __init__(self, use_numpy: bool):
+        if use_numpy and np is None:
+            raise ValueError("برای محاسبات برداری باید NumPy نصب باشد.")
+        self.use_numpy = use_numpy
+        self.student_names, self.lesson_names, self.lesson_majors, self.master_names = {}, {}, {}, {}
+        self.majors = []
+        for name, typecode in COLUMN_TYPES.items():
+            setattr(self, name, array(typecode))
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """حجم ستون‌ها (بدون dictهای نام)."""
+        return sum(len(getattr(self, name)) * array(typecode).itemsize for name, typecode in COLUMN_TYPES.items())
+
+    def major_name(self, code):
+        return self.majors[code] if code != NO_MAJOR else services.UNKNOWN_NAME
+
+    # --- معدل و رتبه ---
+
+    def gpa(self, by_year=False) -> list[tuple]:
+        """معدل وزنی هر دانشجو (یا هر دانشجو در هر سال ثبت‌شده): [(دانشجو، سال یا None، کد رشته، معدل)]."""
+        if self.use_numpy:
+            students, years, majors, gpas = self._gpa_columns(by_year)
+            years = years.tolist() if by_year else [None] * len(students)
+            return list(zip(students.tolist(), years, majors.tolist(), gpas.tolist()))
+
+        sums = defaultdict(lambda: [0.0, 0])
+        majors = {}
+        for student_id, unit, score, year, major in zip(self.student_ids, self.units, self.scores, self.years,
+                                                        self.major_codes):
+            if math.isnan(score) or unit <= 0 or (by_year and year == NO_YEAR):
+                continue
+            key = (student_id, year if by_year else None)
+            sums[key][0] += score * unit
+            sums[key][1] += unit
+            majors[student_id] = major
+        return [(student_id, year, majors[student_id], weighted / units)
+                for (student_id, year), (weighted, units) in sorted(sums.items())]
+
+    def _gpa_columns(self, by_year):
+        valid = ~np.isnan(self.scores) & (self.units > 0)
+        if by_year:
+            valid &= self.years != NO_YEAR
+        students, years = self.student_ids[valid], self.years[valid]
+        order = np.lexsort((years, students)) if by_year else np.argsort(students, kind='stable')
+        students, years = students[order], years[order]
+        units = self.units[valid][order].astype(np.float64)
+        weighted = self.scores[valid][order] * units
+        starts = _group_starts(students, years) if by_year else _group_starts(students)
+        if not len(starts):
+            return students[:0], years[:0], self.major_codes[:0], weighted[:0]
+        gpas = np.add.reduceat(weighted, starts) / np.add.reduceat(units, starts)
+        return students[starts], years[starts], self.major_codes[valid][order][starts], gpas
+
+    def rank(self, by_year=False, by_major=False) -> list['services.RankEntry']:
+        """رتبه‌بندی کامل (رتبه فشرده، ردیف و صدک) مثل services.GpaRanking، به ترتیب گروه و رتبه."""
+        if self.use_numpy:
+            students, years, majors, values = self._gpa_columns(by_year)
+            if not len(students):
+                return []
+            group_years = years if by_year else np.zeros(len(students), dtype=np.int32)
+            group_majors = majors if by_major else np.zeros(len(students), dtype=np.int8)
+            order = np.lexsort((students, -values, group_majors, group_years))
+            students, years, majors, values = students[order], years[order], majors[order], values[order]
+            starts = _group_starts(group_years[order], group_majors[order])
+
+            positions = np.arange(len(order))
+            group_of = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(order))))
+            group_start = starts[group_of]
+            new_value = np.ones(len(order), dtype=bool)
+            new_value[1:] = values[1:] != values[:-1]
+            new_value[starts] = True
+            distinct = np.cumsum(new_value)
+            dense = distinct - distinct[group_start] + 1
+            ordinal = positions - group_start + 1
+            tied = np.maximum.accumulate(np.where(new_value, positions, 0)) - group_start + 1
+            sizes = np.diff(np.append(starts, len(order)))[group_of]
+            years = years.tolist() if by_year else [None] * len(students)
+            ranked = zip(zip(students.tolist(), years, majors.tolist(), values.tolist()),
+                         dense.tolist(), ordinal.tolist(), tied.tolist(), sizes.tolist())
+        else:
+            def group(item):
+                return (item[1] if by_year else 0, item[2] if by_major else 0)
+            ranked = []
+            ordered = sorted(self.gpa(by_year), key=lambda item: (group(item), -item[3], item[0]))
+            for _, members in groupby(ordered, key=group):
+                members = list(members)
+                dense, previous = 0, None
+                for ordinal, item in enumerate(members, 1):
+                    if item[3] != previous:
+                        dense, tied, previous = dense + 1, ordinal, item[3]
+                    ranked.append((item, dense, ordinal, tied, len(members)))
+
+        entries = []
+        for (student_id, year, major, value), dense, ordinal, tied, size in ranked:
+            percentile = 100 * (1 - (tied - 1) / (size - 1)) if size > 1 else 100.0
+            entries.append(services.RankEntry(student_id, self.student_names.get(student_id, services.UNKNOWN_NAME),
+                                              self.major_name(major), year, value, dense, ordinal, size, percentile))
+        return entries
+
+    # --- توزیع نمرات و آمار دروس ---
+
+    def score_distribution(self, by=None) -> dict:
+        """تعداد نمره‌ها در SCORE_BINS خانه؛ با by ('year'، 'major' یا 'lesson') جداگانه برای هر گروه."""
+        keys = {None: None, 'year': self.years, 'major': self.major_codes, 'lesson': self.lesson_ids}[by]
+        if self.use_numpy:
+            valid = ~np.isnan(self.scores)
+            bins = np.clip(self.scores[valid], 0, SCORE_BINS - 1).astype(np.int64)
+            if keys is None:
+                return {None: np.bincount(bins, minlength=SCORE_BINS).tolist()}
+            groups, inverse = np.unique(keys[valid], return_inverse=True)
+            counts = np.bincount(inverse * SCORE_BINS + bins, minlength=len(groups) * SCORE_BINS)
+            return dict(zip(self._group_labels(by, groups.tolist()), counts.reshape(-1, SCORE_BINS).tolist()))
+
+        histograms = defaultdict(lambda: [0] * SCORE_BINS)
+        for i, score in enumerate(self.scores):
+            if not math.isnan(score):
+                histograms[keys[i] if keys is not None else None][min(max(int(score), 0), SCORE_BINS - 1)] += 1
+        groups = sorted(histograms, key=lambda key: (key is None, key))
+        return dict(zip(self._group_labels(by, groups), (histograms[key] for key in groups)))
+
+    def _group_labels(self, by, groups):
+        if by == 'major':
+            return [self.major_name(code) for code in groups]
+        if by == 'year':
+            return [None if year == NO_YEAR else year for year in groups]
+        return groups
+
+    def group_names(self, by) -> dict:
+        if by == 'master':
+            return self.master_names
+        return {lesson_id: f"{name} ({self.lesson_majors[lesson_id]})" for lesson_id, name in self.lesson_names.items()}
+
+    def year_values(self) -> list[int]:
+        """سال‌های تحصیلی ثبت‌شده در انتخاب‌ها به ترتیب صعودی."""
+        years = np.unique(self.years).tolist() if self.use_numpy else sorted(set(self.years))
+        return [year for year in years if year != NO_YEAR]
+
+    def grade_stats(self, by='lesson', year=None, major=None) -> list[GradeStats]:
+        """آمار نمرات همه درس‌ها (by='lesson') یا استادان (by='master') در یک پیمایش، با فیلتر year و major."""
+        groups = {'lesson': self.lesson_ids, 'master': self.master_ids}[by]
+        names = self.group_names(by)
+        if major is not None and major not in self.majors:
+            return []
+        code = self.majors.index(major) if major is not None else None
+
+        if self.use_numpy:
+            valid = ~np.isnan(self.scores)
+            if year is not None:
+                valid &= self.years == year
+            if code is not None:
+                valid &= self.major_codes == code
+            keys, scores = groups[valid], self.scores[valid]
+            order = np.lexsort((scores, keys))
+            keys, scores = keys[order], scores[order]
+            starts = _group_starts(keys)
+            if not len(starts):
+                return []
+            counts = np.diff(np.append(starts, len(scores)))
+            means = np.add.reduceat(scores, starts) / counts
+            variances = np.maximum(np.add.reduceat(scores * scores, starts) / counts - means * means, 0)
+            medians = (scores[starts + (counts - 1) // 2] + scores[starts + counts // 2]) / 2
+            passed = np.add.reduceat((scores >= PASS_SCORE).astype(np.int64), starts)
+            bins = np.clip(scores, 0, SCORE_BINS - 1).astype(np.int64)
+            group_of = np.repeat(np.arange(len(starts)), counts)
+            histograms = np.bincount(group_of * SCORE_BINS + bins, minlength=len(starts) * SCORE_BINS)
+            columns = zip(keys[starts].tolist(), counts.tolist(), means.tolist(), medians.tolist(),
+                          np.sqrt(variances).tolist(), (100 * passed / counts).tolist(),
+                          scores[starts].tolist(), scores[starts + counts - 1].tolist(),
+                          histograms.reshape(-1, SCORE_BINS).tolist())
+        else:
+            by_group = defaultdict(list)
+            for key, score, row_year, row_major in zip(groups, self.scores, self.years, self.major_codes):
+                if math.isnan(score) or year not in (None, row_year) or code not in (None, row_major):
+                    continue
+                by_group[key].append(score)
+            columns = []
+            for key, scores in sorted(by_group.items()):
+                histogram = [0] * SCORE_BINS
+                for score in scores:
+                    histogram[min(max(int(score), 0), SCORE_BINS - 1)] += 1
+                passed = sum(score >= PASS_SCORE for score in scores)
+                columns.append((key, len(scores), statistics.fmean(scores), statistics.median(scores),
+                                statistics.pstdev(scores), 100 * passed / len(scores), min(scores), max(scores),
+                                histogram))
+
+        return [GradeStats(key, names.get(key, services.UNKNOWN_NAME), *values) for key, *values in columns]
+
+    def lesson_stats(self) -> list[GradeStats]:
+        """آمار نمرات هر درس در همه سال‌ها و رشته‌ها."""
+        return self.grade_stats('lesson')
+
+
+class GradeStatsCache:
+    """cache آمار نمرات به تفکیک (گروه‌بندی، سال، رشته) روی یک snapshot مشترک که با نسخه جدول‌ها باطل می‌شود."""
+
+    DEPENDENCIES = (Selection, Presentation, Lesson, Student, Master)
+
+    def __init__(self, use_numpy=None):
+        self.use_numpy = use_numpy
+        self.versions = None
+        self.snapshot = None
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _snapshot(self, session):
+        versions = table_versions(*self.DEPENDENCIES)
+        with self.lock:
+            if self.versions == versions:
+                return versions, self.snapshot
+        snapshot = load_snapshot(session, use_numpy=self.use_numpy)
+        with self.lock:
+            # نتیجه کهنه (اگر در حین بارگذاری commit دیگری انجام شده باشد) ذخیره نمی‌شود
+            if versions == table_versions(*self.DEPENDENCIES) and self.versions != versions:
+                self.versions, self.snapshot, self.results = versions, snapshot, {}
+        return versions, snapshot
+
+    def get(self, session, by='lesson', year=None, major=None) -> list[GradeStats]:
+        """مانند GradebookSnapshot.grade_stats، ولی تا تغییر بعدی نمرات از cache پاسخ می‌دهد."""
+        key = (by, year, major)
+        with self.lock:
+            if self.versions == table_versions(*self.DEPENDENCIES) and key in self.results:
+                self.hits += 1
+                return self.results[key]
+            self.misses += 1
+        versions, snapshot = self._snapshot(session)
+        stats = snapshot.grade_stats(by, year, major)
+        with self.lock:
+            if self.versions == versions:
+                self.results[key] = stats
+        return stats
+
+    def year_values(self, session) -> list[int]:
+        return self._snapshot(session)[1].year_values()
+
+
+def _group_starts(*keys):
+    """اندیس شروع هر گروه در ستون‌های مرتب‌شده (جایی که یکی از کلیدها عوض می‌شود)."""
+    if not len(keys[0]):
+        return np.array([], dtype=np.int64)
+    change = np.zeros(len(keys[0]), dtype=bool)
+    change[0] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(change)
@@ -0,0 +1,105 @@
+"""بنچمارک و بررسی درستی cache گزینه‌های منوهای کشویی (services.ComboOptionsCache).
+
+تعویض پی‌درپی تب‌ها و فیلتر رشته را با و بدون cache شبیه‌سازی می‌کند، سپس بررسی می‌کند که
+CRUD خود برنامه (delta + revalidate) ورودی‌ها را بدون کوئری مجدد به‌روز نگه می‌دارد و تغییرات
+خارج از آن (session دیگر) ورودی‌های وابسته را باطل می‌کند.
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_combo_cache.py --selections 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Master, Lesson, Presentation, Student
+import services
+from bench_load_data import populate
+
+LOOKUPS = [(Student, 'IdStudent', 'Name'), (Presentation, 'PresentationId', 'Display'),
+           (Master, 'MasterId', 'Name'), (Lesson, 'LessonId', 'Name')]
+
+
+def simulate_tab_changes(session, fetch, rounds):
+    started = time.perf_counter()
+    for i in range(rounds):
+        for fk_model, fk_id_field, fk_name_field in LOOKUPS:
+            fetch(session, fk_model, fk_id_field, fk_name_field, services.MAJORS[i % len(services.MAJORS)])
+    return time.perf_counter() - started
+
+
+def assert_matches_database(session, cache):
+    for fk_model, fk_id_field, fk_name_field in LOOKUPS:
+        for major in (None, *services.MAJORS):
+            loaded = cache.get(session, fk_model, fk_id_field, fk_name_field, major)
+            expected = services.fetch_combo_options(session, fk_model, fk_id_field, fk_name_field, major)
+            assert loaded == expected, f"{fk_model.__name__}/{major}: cache با دیتابیس یکسان نیست"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--selections', type=int, default=200000)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    populate(session, args.selections)
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda conn, cursor, statement, *rest: statements.append(statement))
+
+    uncached = simulate_tab_changes(session, services.fetch_combo_options, args.rounds)
+    cache = services.ComboOptionsCache()
+    cached = simulate_tab_changes(session, cache.get, args.rounds)
+    print(f"{args.rounds} rounds x {len(LOOKUPS)} lookups: uncached {uncached * 1000:.1f}ms, "
+          f"cached {cached * 1000:.1f}ms, {cache.stats()}")
+
+    # CRUD خود برنامه: delta + revalidate، بدون کوئری مجدد در درخواست بعدی
+    versions = cache.snapshot()
+    student = services.create_record(session, Student, {'Name': 'دانشجو جدید', 'EntranceTerm': '012', 'Mobile': '09',
+                                                         'Major': 'کامپیوتر'})
+    cache.apply_delta(Student, student.IdStudent, None, services.combo_entry(Student, student))
+    cache.revalidate(versions)
+
+    versions = cache.snapshot()
+    master = services.get_record(session, Master, 1)
+    old_name = master.Name
+    services.update_record(session, Master, 1, {'Name': 'استاد تغییرنام'})
+    cache.apply_delta(Master, 1, (old_name, None), ('استاد تغییرنام', None))
+    for present_id, lesson_name, master_name, day_hold in services.fetch_presentation_names(session, Master, 1):
+        cache.apply_delta(Presentation, present_id,
+                          (services.presentation_display_name(lesson_name, old_name, day_hold), None),
+                          (services.presentation_display_name(lesson_name, master_name, day_hold), None))
+    cache.revalidate(versions)
+
+    misses = cache.misses
+    statements.clear()
+    simulate_tab_changes(session, cache.get, len(services.MAJORS))
+    assert cache.misses == misses and not statements, "پس از delta + revalidate نباید کوئری اجرا شود"
+    assert_matches_database(session, cache)
+    print(f"after in-app CRUD: no queries, cache matches database ({cache.stats()})")
+
+    # تغییر خارج از delta (session دیگر): فقط ورودی‌های وابسته به درس باطل می‌شوند
+    other = Session()
+    services.update_record(other, Lesson, 1, {'Name': 'درس تغییرنام'})
+    other.close()
+    misses = cache.misses
+    simulate_tab_changes(session, cache.get, len(services.MAJORS))
+    invalidated = cache.misses - misses
+    # درس به تفکیک پنج رشته + «سایر/بدون فیلتر»، و یک ورودی ارائه
+    assert invalidated == len(services.MAJORS) + 1, f"انتظار باطل شدن ورودی‌های درس و ارائه، {invalidated} ورودی دوباره خوانده شد"
+    assert_matches_database(session, cache)
+    print(f"after out-of-band lesson rename: {invalidated} lookups refetched (Lesson per major, Presentation), "
+          f"cache matches database")
+
+
+if __name__ == '__main__':
+    main()
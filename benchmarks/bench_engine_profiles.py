@@ -0,0 +1,128 @@
+"""بنچمارک پروفایل‌های اتصال SQLite (models.ENGINE_PROFILES) روی یک فایل دیتابیس مشترک.
+
+برای هر پروفایل دو چیز اندازه‌گیری می‌شود:
+  * تاخیر commit: بروزرسانی پی‌درپی نمره از یک پردازش (p50 / p99)
+  * کار همزمان: چند پردازش نویسنده (ثبت نمره) و چند پردازش خواننده (بارگذاری صفحه و معدل) که همزمان
+    روی همان فایل کار می‌کنند، مثل چند کارمند آموزش با یک دیتابیس؛ تعداد خطاهای «database is locked» هم شمرده می‌شود.
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_engine_profiles.py --profiles legacy wal --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from models import ENGINE_PROFILES, Base, Selection, Student, make_engine, migrate
+import services
+from bench_load_data import populate
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0
+
+
+def commit_latencies(url, profile, count):
+    engine = make_engine(url, profile)
+    session = sessionmaker(bind=engine)()
+    n_selections = session.query(Selection).count()
+    rnd = random.Random(0)
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        services.update_record(session, Selection, rnd.randint(1, n_selections), {'Score': rnd.randint(0, 20)})
+        latencies.append(time.perf_counter() - started)
+    session.close()
+    engine.dispose()
+    return latencies
+
+
+def worker(url, profile, role, seconds, seed, results):
+    """حالت پردازش فرزند: تا پایان مهلت کار نویسنده یا خواننده را تکرار می‌کند و (نقش، تعداد، خطاها) را گزارش می‌دهد."""
+    engine = make_engine(url, profile)
+    session = sessionmaker(bind=engine)()
+    rnd = random.Random(seed)
+    n_selections = session.query(Selection).count()
+    n_students = session.query(Student).count()
+    session.rollback()
+
+    operations = locked = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            if role == 'writer':
+                services.update_record(session, Selection, rnd.randint(1, n_selections), {'Score': rnd.randint(0, 20)})
+            else:
+                services.fetch_display_page(session, Selection, after_key=rnd.randint(0, n_selections), limit=200)
+                services.student_gpa(session, rnd.randint(1, n_students))
+                session.rollback()
+            operations += 1
+        except OperationalError as e:
+            session.rollback()
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            locked += 1
+    session.close()
+    engine.dispose()
+    results.put((role, operations, locked))
+
+
+def run_concurrent(url, profile, writers, readers, seconds):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(url, profile, role, seconds, i, results))
+                 for i, role in enumerate(['writer'] * writers + ['reader'] * readers)]
+    for process in processes:
+        process.start()
+    totals = {'writer': [0, 0], 'reader': [0, 0]}
+    for _ in processes:
+        role, operations, locked = results.get()
+        totals[role][0] += operations
+        totals[role][1] += locked
+    for process in processes:
+        process.join()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--profiles', nargs='+', default=list(ENGINE_PROFILES), choices=list(ENGINE_PROFILES))
+    parser.add_argument('--selections', type=int, default=50000)
+    parser.add_argument('--commits', type=int, default=300)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as workdir:
+            url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+            engine = make_engine(url, profile)
+            Base.metadata.create_all(engine)
+            session = sessionmaker(bind=engine)()
+            populate(session, args.selections)
+            session.close()
+            migrate(engine)
+            engine.dispose()
+
+            latencies = commit_latencies(url, profile, args.commits)
+            totals = run_concurrent(url, profile, args.writers, args.readers, args.seconds)
+            (writes, write_locked), (reads, read_locked) = totals['writer'], totals['reader']
+            print(f"{profile:<12} commit p50={statistics.median(latencies) * 1000:6.2f}ms "
+                  f"p99={percentile(latencies, 0.99) * 1000:6.2f}ms | "
+                  f"{args.writers}w/{args.readers}r: writes={writes / args.seconds:7.0f}/s "
+                  f"reads={reads / args.seconds:7.0f}/s locked errors={write_locked + read_locked}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""آزمون بار ثبت‌نام همزمان (services.enroll / enroll_many) روی یک فایل دیتابیس مشترک.
+
+چند پردازش (یا نخ) هزاران درخواست ثبت‌نام تصادفی را همزمان روی ارائه‌هایی با ظرفیت محدود می‌فرستند،
+مثل روز شروع انتخاب واحد. در پایان بررسی می‌شود که هیچ ارائه‌ای بیش از ظرفیت ثبت‌نام نگرفته و شمارنده
+Enrolled با تعداد واقعی انتخاب‌ها برابر است و هر انتخاب به دانشجوی موجود و حذف‌نشده اشاره می‌کند، و توان عملیاتی و تاخیر p50 / p99 هر حالت گزارش می‌شود.
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_enroll.py --requests 5000 --workers 8 --batch 1 20
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from models import Lesson, Master, Presentation, PresentationFullError, Selection, Student, make_engine, migrate
+import schedule
+import services
+from bench_engine_profiles import percentile
+
+YEAR = 1403
+
+
+def create_database(url, n_students, n_presentations, capacity, seed=1):
+    """ارائه‌ها در ساعت‌های مختلف هفته پخش می‌شوند تا بخشی از درخواست‌ها به تداخل کلاس هم بخورند."""
+    engine = make_engine(url, 'wal')
+    migrate(engine)
+    rnd = random.Random(seed)
+    session = sessionmaker(bind=engine)()
+    session.bulk_insert_mappings(Master, [
+        {'MasterId': i, 'Name': f'استاد {i}', 'Graduation': 'دکتری', 'Mobile': f'0912{i:07d}'} for i in range(1, 41)])
+    session.bulk_insert_mappings(Lesson, [
+        {'LessonId': i, 'Name': f'درس {i}', 'Unit': 3, 'Major': 'کامپیوتر'} for i in range(1, n_presentations + 1)])
+    session.bulk_insert_mappings(Presentation, [
+        {'PresentationId': i, 'MasterId': rnd.randint(1, 40), 'LessonId': i, 'DayHold': rnd.choice(services.WEEK_DAYS),
+         'StartTime': start, 'FinishTime': start + 2, 'Capacity': capacity, 'Enrolled': 0}
+        for i, start in ((i, rnd.choice((8, 10, 13, 15))) for i in range(1, n_presentations + 1))])
+    session.bulk_insert_mappings(Student, [
+        {'IdStudent': i, 'Name': f'دانشجو {i}', 'EntranceTerm': '021', 'Mobile': f'0935{i:07d}', 'Major': 'کامپیوتر',
+         'Deleted': int(i % 50 == 0)}
+        for i in range(1, n_students + 1)])
+    session.commit()
+    session.close()
+    engine.dispose()
+
+
+def make_requests(n_requests, n_students, n_presentations, seed=2):
+    """حدود ۲٪ درخواست‌ها دانشجوی ناموجود و ۲٪ دانشجوی حذف‌شده دارند."""
+    rnd = random.Random(seed)
+    return [services.EnrollRequest(rnd.randint(1, n_students + n_students // 50), rnd.randint(1, n_presentations), YEAR)
+            for _ in range(n_requests)]
+
+
+def run_worker(url, requests, batch_size, retries=5):
+    """درخواست‌ها را در دسته‌های batch_size می‌فرستد؛ (تاخیر هر دسته، شمارش نتیجه‌ها، بازه زمانی کار) را برمی‌گرداند.
+
+    دسته‌ای که پس از busy_timeout هنوز قفل دیتابیس را نگرفته دوباره فرستاده می‌شود (locked تعداد تلاش‌های مجدد است).
+    """
+    engine = make_engine(url, 'wal')
+    session = sessionmaker(bind=engine)()
+    latencies = []
+    outcomes = {'enrolled': 0, 'full': 0, 'conflict': 0, 'invalid': 0, 'locked': 0}
+    first_started = time.time()
+    for start in range(0, len(requests), batch_size):
+        batch = requests[start:start + batch_size]
+        started = time.perf_counter()
+        for attempt in range(retries + 1):
+            try:
+                results = services.enroll_many(session, batch)
+                break
+            except OperationalError:
+                if attempt == retries:
+                    raise
+                outcomes['locked'] += 1
+        latencies.append(time.perf_counter() - started)
+        for result in results:
+            if isinstance(result, PresentationFullError):
+                outcomes['full'] += 1
+            elif isinstance(result, schedule.ScheduleConflictError):
+                outcomes['conflict'] += 1
+            elif isinstance(result, ValueError):
+                outcomes['invalid'] += 1
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                outcomes['enrolled'] += 1
+    finished = time.time()
+    session.close()
+    engine.dispose()
+    return latencies, outcomes, (first_started, finished)
+
+
+def _process_worker(url, requests, batch_size, results):
+    results.put(run_worker(url, requests, batch_size))
+
+
+def run_concurrent(url, requests, workers, batch_size, use_threads):
+    shares = [requests[i::workers] for i in range(workers)]
+    collected = []
+    if use_threads:
+        threads = [threading.Thread(target=lambda share=share: collected.append(run_worker(url, share, batch_size)))
+                   for share in shares]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        context = multiprocessing.get_context('spawn')
+        queue = context.Queue()
+        processes = [context.Process(target=_process_worker, args=(url, share, batch_size, queue)) for share in shares]
+        for process in processes:
+            process.start()
+        collected = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    # زمان راه‌اندازی پردازش‌ها حساب نمی‌شود: از شروع اولین کارگر تا پایان آخرین
+    latencies = [latency for worker_latencies, _, _ in collected for latency in worker_latencies]
+    outcomes = {key: sum(worker_outcomes[key] for _, worker_outcomes, _ in collected) for key in collected[0][1]}
+    elapsed = max(finished for _, _, (_, finished) in collected) - min(started for _, _, (started, _) in collected)
+    return latencies, outcomes, elapsed
+
+
+def assert_no_overbooking(url):
+    engine = make_engine(url, 'wal')
+    session = sessionmaker(bind=engine)()
+    counts = dict(session.query(Selection.IdPresentation, func.count()).group_by(Selection.IdPresentation).all())
+    for present_id, capacity, enrolled in session.query(
+            Presentation.PresentationId, Presentation.Capacity, Presentation.Enrolled):
+        actual = counts.get(present_id, 0)
+        assert capacity is None or actual <= capacity, f"ارائه {present_id}: {actual} ثبت‌نام با ظرفیت {capacity}"
+        assert enrolled == actual, f"ارائه {present_id}: شمارنده {enrolled} ولی {actual} انتخاب"
+    total = sum(counts.values())
+    session.close()
+    engine.dispose()
+    return total
+
+
+def assert_live_students(url):
+    engine = make_engine(url, 'wal')
+    with engine.connect() as connection:
+        orphans = connection.execute(
+            select(func.count()).select_from(Selection)
+            .outerjoin(Student, Selection.IdStudent == Student.IdStudent)
+            .where(or_(Student.IdStudent == None, Student.Deleted != 0))).scalar()
+    engine.dispose()
+    assert not orphans, f"{orphans} انتخاب به دانشجوی ناموجود یا حذف‌شده اشاره می‌کند"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--presentations', type=int, default=100)
+    parser.add_argument('--capacity', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 20], help="اندازه دسته درخواست‌ها در هر تراکنش")
+    parser.add_argument('--threads', action='store_true', help="نخ به جای پردازش (رقابت داخل یک pool اتصال)")
+    args = parser.parse_args()
+
+    requests = make_requests(args.requests, args.students, args.presentations)
+    for batch_size in args.batch:
+        with tempfile.TemporaryDirectory() as workdir:
+            url = f"sqlite:///{os.path.join(workdir, 'enroll.db')}"
+            create_database(url, args.students, args.presentations, args.capacity)
+
+            latencies, outcomes, elapsed = run_concurrent(url, requests, args.workers, batch_size, args.threads)
+            total = assert_no_overbooking(url)
+            assert_live_students(url)
+            assert total == outcomes['enrolled'], f"{total} انتخاب در دیتابیس ولی {outcomes['enrolled']} ثبت‌نام موفق"
+
+            print(f"batch={batch_size:>3} workers={args.workers}: {args.requests / elapsed:8.0f} req/s | "
+                  f"per-transaction p50={statistics.median(latencies) * 1000:7.2f}ms "
+                  f"p99={percentile(latencies, 0.99) * 1000:7.2f}ms | "
+                  f"enrolled={outcomes['enrolled']} full={outcomes['full']} conflict={outcomes['conflict']} "
+                  f"invalid={outcomes['invalid']} "
+                  f"locked retries={outcomes['locked']} (capacity {args.presentations * args.capacity})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""بنچمارک سرعت و مصرف حافظه خروجی جریانی (exporter.py) روی یک جدول انتخاب واحد مصنوعی.
+
+هر خروجی در یک پردازش جداگانه اجرا می‌شود تا بیشینه حافظه (peak RSS) فقط مربوط به خروجی باشد؛
+با دو اندازه مختلف می‌توان دید که حافظه با بزرگ شدن جدول ثابت می‌ماند.
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_export.py --selections 100000 1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def peak_rss_mb():
+    """بیشینه حافظه همین پردازش؛ ru_maxrss پس از exec از پردازش والد به ارث می‌رسد، پس VmHWM ترجیح دارد."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / 1024 if sys.platform != 'darwin' else usage / (1024 * 1024)
+
+
+def run_export(kind, path, file_format, batch_size):
+    """حالت پردازش فرزند: دیتابیس chamran_uni.db در پوشه جاری را خروجی می‌گیرد."""
+    import exporter
+    count, elapsed = exporter.export(kind, path, file_format, batch_size)
+    print(json.dumps({'count': count, 'elapsed': elapsed, 'peak_rss_mb': peak_rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--selections', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--child', nargs=3, metavar=('KIND', 'PATH', 'FORMAT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_export(*args.child, args.batch_size)
+        return
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from models import DB_FILE, Base, migrate
+    from bench_load_data import populate
+
+    for n_selections in args.selections:
+        with tempfile.TemporaryDirectory() as workdir:
+            engine = create_engine(f"sqlite:///{os.path.join(workdir, DB_FILE)}")
+            Base.metadata.create_all(engine)
+            started = time.perf_counter()
+            session = sessionmaker(bind=engine)()
+            populate(session, n_selections)
+            session.close()
+            migrate(engine)
+            engine.dispose()
+            print(f"populate: {n_selections} selections in {time.perf_counter() - started:.1f}s")
+
+            for kind in ('selections', 'transcripts'):
+                for file_format in ('csv', 'jsonl'):
+                    path = os.path.join(workdir, f'{kind}.{file_format}')
+                    output = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), '--batch-size', str(args.batch_size),
+                         '--child', kind, path, file_format],
+                        cwd=workdir, check=True, capture_output=True, text=True).stdout
+                    result = json.loads(output.strip().splitlines()[-1])
+                    size_mb = os.path.getsize(path) / (1024 * 1024)
+                    print(f"  {kind:<12} {file_format:<5} records={result['count']:>8} "
+                          f"time={result['elapsed']:6.2f}s rate={result['count'] / result['elapsed']:>10,.0f}/s "
+                          f"file={size_mb:6.1f}MB peak rss={result['peak_rss_mb']:.0f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""بنچمارک ثبت نمرات همه دانشجویان یک ارائه: ویرایش تک‌تک انتخاب‌ها در برابر services.save_scores.
+
+روی کپی دیتابیس ساخته‌شده با generate_data.py، پرجمعیت‌ترین ارائه‌ها انتخاب می‌شوند و برای همه دانشجویان
+آن‌ها نمره تازه نوشته می‌شود؛ یک بار مثل فرم ویرایش (services.update_record و commit برای هر ردیف) و یک
+بار با یک UPDATE دسته‌ای در یک تراکنش. زمان، تعداد کوئری و تعداد commit هر روش چاپ می‌شود و در پایان
+جدول خلاصه معدل با تجمیع از ابتدا مقایسه می‌شود (verify_gpa_summary) تا دلتاهای دسته‌ای درست باشند.
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_gradebook.py --selections 100k --presentations 5
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import sessionmaker
+
+from models import Selection, make_engine, verify_gpa_summary
+import services
+from generate_data import SCALES, ensure_database
+
+
+def largest_presentations(session, n):
+    return [row[0] for row in session.query(Selection.IdPresentation)
+            .group_by(Selection.IdPresentation).order_by(func.count().desc(), Selection.IdPresentation).limit(n)]
+
+
+def new_scores(rows, rnd):
+    """برای هر ردیف نمره تازه (ربع نمره) یا گاهی خالی، همیشه متفاوت با نمره فعلی."""
+    scores = {}
+    for row in rows:
+        score = None if rnd.random() < 0.05 else rnd.randrange(0, 81) / 4
+        if score == row.score:
+            score = 10.0 if row.score != 10.0 else 12.0
+        scores[row.selection_id] = score
+    return scores
+
+
+def per_row(session, presentation_id, scores):
+    # فرم ویرایش هر ردیف را دوباره با بررسی تداخل کلاس ذخیره می‌کند؛ داده مصنوعی تداخل‌های قدیمی دارد که
+    # ویرایش تک‌ردیفی آن‌ها را رد می‌کند (save_scores زمان کلاس را تغییر نمی‌دهد و این بررسی را لازم ندارد)
+    saved = 0
+    for selection_id, score in scores.items():
+        try:
+            services.update_record(session, Selection, selection_id, {'Score': score})
+            saved += 1
+        except ValueError:
+            pass
+    return saved
+
+
+def batched(session, presentation_id, scores):
+    return services.save_scores(session, presentation_id, scores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--selections', default='100k', help="تعداد انتخاب‌ها یا نام مقیاس (1k، 100k، 1m)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--presentations', type=int, default=5, help="تعداد ارائه‌هایی که نمره‌شان ثبت می‌شود")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'chamran_bench'))
+    args = parser.parse_args()
+
+    n_selections = SCALES.get(args.selections.lower()) or int(args.selections)
+    os.makedirs(args.data_dir, exist_ok=True)
+    source = ensure_database(args.data_dir, n_selections, args.seed)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'gradebook.db')
+        shutil.copyfile(source, path)
+        engine = make_engine(f"sqlite:///{path}")
+        session = sessionmaker(bind=engine)()
+        counters = {'statements': 0, 'commits': 0}
+
+        def count(key):
+            def listener(*args):
+                counters[key] += 1
+            return listener
+        event.listen(engine, 'before_cursor_execute', count('statements'))
+        event.listen(engine, 'commit', count('commits'))
+
+        rnd = random.Random(args.seed)
+        presentations = largest_presentations(session, args.presentations)
+        print(f"selections={n_selections} presentations={len(presentations)}")
+        for name, save in (('per-row update_record', per_row), ('save_scores', batched)):
+            total_rows = elapsed = statements = commits = 0
+            for presentation_id in presentations:
+                scores = new_scores(services.fetch_gradebook(session, presentation_id), rnd)
+                session.close()
+                counters.update(statements=0, commits=0)
+                started = time.perf_counter()
+                total_rows += save(session, presentation_id, scores)
+                elapsed += time.perf_counter() - started
+                statements += counters['statements']
+                commits += counters['commits']
+            print(f"  {name:<22} rows={total_rows:>6} {elapsed * 1000:9.1f}ms "
+                  f"({elapsed * 1e6 / max(total_rows, 1):8.1f}us/row) queries={statements:>6} commits={commits:>5}")
+
+        with engine.connect() as connection:
+            mismatches = verify_gpa_summary(connection)
+        print(f"  gpa summary mismatches: {len(mismatches)}")
+        session.close()
+        engine.dispose()
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""مقایسه زمان بازخوانی کامل جدول با به‌روزرسانی افزایشی یک ردیف پس از عملیات CRUD.
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_incremental_refresh.py --sizes 1000 10000 100000
+
+اگر نمایشگر در دسترس باشد، هزینه درج ردیف‌ها در Treeview هم اندازه‌گیری می‌شود.
+"""
+import argparse
+import os
+import sys
+import time
+from bisect import insort
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Student, Selection
+from services import fetch_display_rows, fetch_display_row
+from bench_load_data import populate
+
+
+def make_tree():
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+        root = tk.Tk()
+    except Exception:
+        return None
+    root.withdraw()
+    return ttk.Treeview(root, columns=list(Selection.COLUMNS.keys()), show="headings")
+
+
+def run(size, tree):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    populate(session, size)
+
+    started = time.perf_counter()
+    rows = fetch_display_rows(session, Selection)
+    student_names = sorted(name for (name,) in session.query(Student.Name))
+    if tree is not None:
+        tree.delete(*tree.get_children())
+        for row in rows:
+            tree.insert("", "end", iid=str(row[0]), values=row)
+    full = time.perf_counter() - started
+
+    record = Selection(IdStudent=1, IdPresentation=1, Score=15.0, YearEducation=1403)
+    session.add(record)
+    session.commit()
+
+    started = time.perf_counter()
+    row = fetch_display_row(session, Selection, record.IdSelection)
+    insort(student_names, 'دانشجوی جدید')
+    if tree is not None:
+        tree.insert("", "end", iid=str(row[0]), values=row)
+    incremental = time.perf_counter() - started
+
+    session.close()
+    engine.dispose()
+    return full, incremental
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    tree = make_tree()
+    print(f"Treeview: {'enabled' if tree is not None else 'skipped (no display)'}")
+    print(f"{'selections':>12} {'full refresh':>14} {'incremental':>13}")
+    for size in args.sizes:
+        full, incremental = run(size, tree)
+        print(f"{size:>12} {full * 1000:>12.1f}ms {incremental * 1000:>11.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""بنچمارک بارگذاری ردیف‌های تب‌ها و بررسی تعداد کوئری‌ها (بدون نیاز به نمایشگر).
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_load_data.py --selections 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Master, Lesson, Presentation, Student, Selection, recount_enrolled
+from services import fetch_display_rows
+
+
+def populate(session, n_selections, seed=1):
+    """یک دیتابیس مصنوعی با تعداد مشخصی انتخاب واحد می‌سازد."""
+    rnd = random.Random(seed)
+    n_students = max(10, n_selections // 20)
+    n_lessons = max(5, n_selections // 1000)
+    n_presentations = n_lessons * 2
+
+    session.bulk_insert_mappings(Master, [
+        {'MasterId': i, 'Name': f'استاد {i}', 'Graduation': 'دکتری', 'Mobile': f'0912{i:07d}'}
+        for i in range(1, 21)])
+    session.bulk_insert_mappings(Lesson, [
+        {'LessonId': i, 'Name': f'درس {i}', 'Unit': rnd.randint(1, 4), 'Major': 'کامپیوتر'}
+        for i in range(1, n_lessons + 1)])
+    session.bulk_insert_mappings(Presentation, [
+        {'PresentationId': i, 'MasterId': rnd.randint(1, 20), 'LessonId': rnd.randint(1, n_lessons),
+         'DayHold': 'شنبه', 'StartTime': 8, 'FinishTime': 10}
+        for i in range(1, n_presentations + 1)])
+    session.bulk_insert_mappings(Student, [
+        {'IdStudent': i, 'Name': f'دانشجو {i}', 'EntranceTerm': '012', 'Mobile': f'0935{i:07d}', 'Major': 'کامپیوتر'}
+        for i in range(1, n_students + 1)])
+    session.bulk_insert_mappings(Selection, [
+        {'IdSelection': i, 'IdStudent': rnd.randint(1, n_students),
+         'IdPresentation': rnd.randint(1, n_presentations),
+         'Score': round(rnd.uniform(0, 20), 2), 'YearEducation': 1402}
+        for i in range(1, n_selections + 1)])
+    recount_enrolled(session.connection())
+    session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--selections', type=int, default=20000)
+    parser.add_argument('--page-size', type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    populate(session, args.selections)
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, *rest: statements.append(statement))
+
+    for model in (Student, Master, Lesson, Presentation, Selection):
+        session.expunge_all()
+        statements.clear()
+        started = time.perf_counter()
+        rows = fetch_display_rows(session, model)
+        elapsed = time.perf_counter() - started
+        print(f"{model.__name__:<13} rows={len(rows):>8} queries={len(statements)} time={elapsed * 1000:.1f}ms")
+        assert len(statements) == 1, f"{model.__name__}: انتظار یک کوئری، {len(statements)} کوئری اجرا شد"
+
+        if rows:
+            middle_key = rows[len(rows) // 2][0]
+            started = time.perf_counter()
+            page = fetch_display_rows(session, model, after_key=middle_key, limit=args.page_size)
+            elapsed = time.perf_counter() - started
+            print(f"{'':<13} keyset page after {middle_key}: rows={len(page)} time={elapsed * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""مقایسه حافظه و زمان تحلیل نمرات: اشیای ORM در برابر نمای ستونی analytics.GradebookSnapshot.
+
+هر مسیر یک بار بدون tracemalloc (برای زمان) و یک بار با آن (برای اوج حافظه) اجرا می‌شود و کار یکسانی
+انجام می‌دهد: بارگذاری، معدل همه دانشجویان، رتبه‌بندی، توزیع نمرات و آمار هر درس. نتیجه‌های سه مسیر
+با هم مقایسه می‌شوند.
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_snapshot.py --selections 200000
+"""
+import argparse
+import gc
+import math
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import joinedload, sessionmaker
+
+from models import Base, Presentation, Selection
+import analytics
+from bench_load_data import populate
+
+
+def orm_path(session):
+    """همان محاسبات با یک شیء ORM برای هر انتخاب (و ارائه / درس / دانشجوی مرتبط)."""
+    selections = session.query(Selection).options(
+        joinedload(Selection.presentation).joinedload(Presentation.lesson), joinedload(Selection.student)).all()
+    sums = defaultdict(lambda: [0.0, 0])
+    histogram = [0] * analytics.SCORE_BINS
+    by_lesson = defaultdict(list)
+    for selection in selections:
+        if selection.Score is None:
+            continue
+        lesson = selection.presentation.lesson
+        sums[selection.student][0] += selection.Score * lesson.Unit
+        sums[selection.student][1] += lesson.Unit
+        histogram[min(max(int(selection.Score), 0), analytics.SCORE_BINS - 1)] += 1
+        by_lesson[lesson.LessonId].append(selection.Score)
+    ranking = sorted(((weighted / units, student.IdStudent) for student, (weighted, units) in sums.items() if units),
+                     key=lambda item: (-item[0], item[1]))
+    stats = {lesson_id: (len(scores), statistics.fmean(scores), statistics.median(scores))
+             for lesson_id, scores in by_lesson.items()}
+    result = ({student_id: gpa for gpa, student_id in ranking}, histogram, stats)
+    session.expunge_all()
+    return result
+
+
+def snapshot_path(session, use_numpy):
+    snapshot = analytics.load_snapshot(session, use_numpy=use_numpy)
+    started = time.perf_counter()
+    ranking = snapshot.rank()
+    histogram = snapshot.score_distribution()[None]
+    stats = {s.group_id: (s.count, s.mean, s.median) for s in snapshot.lesson_stats()}
+    compute = time.perf_counter() - started
+    return {entry.student_id: entry.gpa for entry in ranking}, histogram, stats, snapshot.nbytes, compute
+
+
+def measure(function, *args):
+    gc.collect()
+    started = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def same_gpas(first, second):
+    # ترتیب جمع اعشاری در دو مسیر فرق دارد، پس معدل‌ها تقریبی مقایسه می‌شوند
+    return first.keys() == second.keys() and all(math.isclose(first[key], second[key]) for key in first)
+
+
+def same_stats(first, second):
+    return first.keys() == second.keys() and all(
+        a[0] == b[0] and math.isclose(a[1], b[1]) and a[2] == b[2] for a, b in
+        ((first[key], second[key]) for key in first))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--selections', type=int, default=100000)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    populate(session, args.selections)
+
+    paths = [('ORM objects', orm_path, ())]
+    if analytics.np is not None:
+        paths.append(('snapshot (NumPy)', snapshot_path, (True,)))
+    paths.append(('snapshot (array)', snapshot_path, (False,)))
+
+    reference = None
+    for label, function, extra in paths:
+        result, elapsed, peak = measure(function, session, *extra)
+        gpas, histogram, stats = result[:3]
+        if reference is None:
+            reference = result
+        else:
+            assert same_gpas(gpas, reference[0]) and histogram == reference[1] and same_stats(stats, reference[2]), label
+        # برای نمای ستونی حجم خود ستون‌ها و زمان محاسبات بدون بارگذاری هم نمایش داده می‌شود
+        columns = f" columns={result[3] / 2**20:5.1f}MB compute={result[4] * 1000:6.1f}ms" if len(result) > 3 else ""
+        print(f"{label:<17} rows={args.selections:>8} time={elapsed * 1000:8.1f}ms "
+              f"peak memory={peak / 2**20:7.1f}MB{columns}")
+
+
+if __name__ == '__main__':
+    main()
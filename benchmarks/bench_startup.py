@@ -0,0 +1,96 @@
+"""بنچمارک زمان شروع برنامه تا نمایش اولین پنجره روی یک دیتابیس بزرگ (نیاز به نمایشگر دارد).
+
+هر اجرا یک پردازش تازه است (import سرد) که مثل python main.py روی کپی دیتابیس ساخته‌شده با
+generate_data.py برنامه را باز می‌کند و زمان هر مرحله را از شروع اسکریپت گزارش می‌دهد: import ماژول‌ها،
+بررسی / مهاجرت اسکیما، ساخت ChamranApp، اولین رسم پنجره و رسیدن صفحه اول تب اول. زمان کل پردازش
+(شامل راه‌اندازی مفسر) هم جداگانه اندازه‌گیری می‌شود و میانه اجراها چاپ می‌شود.
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_startup.py --selections 1m --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PHASES = ['imported', 'migrated', 'app_created', 'first_window', 'first_page']
+
+
+def child():
+    """حالت پردازش فرزند: برنامه را باز می‌کند، زمان مراحل را به صورت JSON چاپ می‌کند و می‌بندد."""
+    started = time.perf_counter()
+    times = {}
+    import tkinter as tk
+    import main
+    from models import get_engine, migrate
+    times['imported'] = time.perf_counter() - started
+
+    migrate(get_engine())
+    times['migrated'] = time.perf_counter() - started
+
+    root = tk.Tk()
+    app = main.ChamranApp(root)
+    times['app_created'] = time.perf_counter() - started
+    root.update()
+    times['first_window'] = time.perf_counter() - started
+    while app.queries.pending:
+        root.update()
+        time.sleep(0.001)
+    times['first_page'] = time.perf_counter() - started
+
+    app.queries.shutdown()
+    app.session.close()
+    root.destroy()
+    print(json.dumps(times))
+
+
+def run_once(path):
+    env = dict(os.environ, CHAMRAN_DATABASE_URL=f"sqlite:///{path}")
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    times = json.loads(output.strip().splitlines()[-1])
+    times['process'] = time.perf_counter() - started
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--selections', default='1m', help="تعداد انتخاب‌ها یا نام مقیاس (1k، 100k، 1m)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'chamran_bench'))
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    from generate_data import SCALES, ensure_database
+    n_selections = SCALES.get(args.selections.lower()) or int(args.selections)
+    os.makedirs(args.data_dir, exist_ok=True)
+    source = ensure_database(args.data_dir, n_selections, args.seed)
+
+    runs = []
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'startup.db')
+        shutil.copyfile(source, path)
+        for _ in range(args.runs):
+            runs.append(run_once(path))
+
+    print(f"selections={n_selections} runs={args.runs} (median, ms from script start)")
+    for phase in PHASES + ['process']:
+        values = [run[phase] * 1000 for run in runs]
+        print(f"  {phase:<13} {statistics.median(values):8.1f}ms  (min {min(values):8.1f}ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""مجموعه بنچمارک بدون نمایشگر برای عملیات اصلی برنامه، با خروجی JSON برای مقایسه بین اجراها.
+
+برای هر مقیاس (تعداد انتخاب واحد) یک دیتابیس با generate_data.py ساخته می‌شود (و در --data-dir برای
+اجراهای بعدی می‌ماند) و روی یک کپی از آن این عملیات، همان‌طور که رابط کاربری آن‌ها را صدا می‌زند، اجرا می‌شوند:
+  * tab_load: صفحه اول هر تب همراه با شمارش ردیف‌ها (main.load_page)، و تب انتخاب‌ها مرتب‌شده بر اساس نمره
+  * combo_options: گزینه‌های منوهای کشویی کلید خارجی، بدون cache و از cache گرم
+  * gpa_lookup: معدل و رتبه یک دانشجو (main.calculate_average) و معدل یک دانشجو از جدول خلاصه
+  * crud: درج، ویرایش و حذف یک دانشجو و یک انتخاب (با بررسی تداخل و به‌روزرسانی معدل)
+برای هر عملیات میانه و کمینه زمان، تعداد کوئری‌ها و اوج حافظه (tracemalloc، در اجرای جداگانه) ثبت می‌شود.
+با --compare نتیجه با یک اجرای قبلی مقایسه می‌شود و اگر عملیاتی کندتر از آستانه شده یا کوئری بیشتری
+اجرا کرده باشد، کد خروج ۱ است.
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_suite.py --scales 1k 100k --output bench.json
+    python benchmarks/bench_suite.py --scales 1k 100k --compare bench.json
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from models import Lesson, Master, Presentation, Selection, Student, make_engine
+import services
+from generate_data import SCALES, ensure_database
+
+PAGE_SIZE = 200
+LOOKUPS = [(Student, 'IdStudent', 'Name'), (Presentation, 'PresentationId', 'Display'),
+           (Master, 'MasterId', 'Name'), (Lesson, 'LessonId', 'Name')]
+NEW_STUDENT = {'Name': 'دانشجوی بنچمارک', 'EntranceTerm': '031', 'Graduation': 'کارشناسی',
+               'Mobile': '09350000000', 'Email': None, 'Major': 'کامپیوتر'}
+
+
+def tab_load(model, sort=None):
+    def run(session):
+        services.fetch_display_page(session, model, None, sort, limit=PAGE_SIZE + 1)
+        services.count_rows(session, model, None)
+    return run
+
+
+def combo_options(session):
+    for fk_model, fk_id_field, fk_name_field in LOOKUPS:
+        services.fetch_combo_options(session, fk_model, fk_id_field, fk_name_field, services.MAJORS[0])
+
+
+def cached_combo_options(cache):
+    def run(session):
+        for fk_model, fk_id_field, fk_name_field in LOOKUPS:
+            cache.get(session, fk_model, fk_id_field, fk_name_field, services.MAJORS[0])
+    return run
+
+
+def gpa_lookup(student_id):
+    def run(session):
+        ranking = services.rank_students(session)
+        services.rank_students(session, by_major=True).get(student_id)
+        ranking.get(student_id)
+        services.get_record(session, Student, student_id)
+    return run
+
+
+def student_gpa(student_id):
+    return lambda session: services.student_gpa(session, student_id)
+
+
+def crud_student(session):
+    record = services.create_record(session, Student, dict(NEW_STUDENT))
+    services.update_record(session, Student, record.IdStudent, {'Email': 'bench@scu.ac.ir'})
+    services.delete_record(session, Student, record.IdStudent)
+
+
+def crud_selection(student_id, presentation_id):
+    def run(session):
+        record = services.create_record(session, Selection, {
+            'IdStudent': student_id, 'IdPresentation': presentation_id, 'YearEducation': 1403, 'Score': None})
+        services.update_record(session, Selection, record.IdSelection, {'Score': 17.5})
+        services.delete_record(session, Selection, record.IdSelection)
+    return run
+
+
+def operations(session):
+    """(نام، تابع) عملیات‌ها؛ داده لازم برای CRUD انتخاب (یک دانشجوی بدون کلاس) همین‌جا ساخته می‌شود."""
+    student_id = session.query(Selection.IdStudent).order_by(Selection.IdSelection).limit(1).scalar()
+    free_student = services.create_record(session, Student, dict(NEW_STUDENT, Name='دانشجوی بنچمارک CRUD')).IdStudent
+    presentation_id = session.query(Presentation.PresentationId).order_by(Presentation.PresentationId).limit(1).scalar()
+    cache = services.ComboOptionsCache()
+    cached_combo_options(cache)(session)
+
+    ops = [(f"tab_load/{model.__name__}", tab_load(model)) for model in (Student, Master, Lesson, Presentation, Selection)]
+    ops += [
+        ("tab_load/Selection sorted by score", tab_load(Selection, ('Score', True))),
+        ("combo_options/uncached", combo_options),
+        ("combo_options/cached", cached_combo_options(cache)),
+        ("gpa_lookup/rank", gpa_lookup(student_id)),
+        ("gpa_lookup/summary", student_gpa(student_id)),
+        ("crud/Student", crud_student),
+        ("crud/Selection", crud_selection(free_student, presentation_id)),
+    ]
+    return ops
+
+
+def measure(session, function, repeats, statements):
+    """(زمان‌ها، تعداد کوئری یک اجرا، اوج حافظه)؛ هر اجرا با session خالی شروع می‌شود."""
+    session.close()
+    function(session)  # گرم کردن cache صفحات SQLite و کامپایل کوئری‌ها
+    timings = []
+    for _ in range(repeats):
+        session.close()
+        gc.collect()
+        statements.clear()
+        started = time.perf_counter()
+        function(session)
+        timings.append(time.perf_counter() - started)
+    queries = len(statements)
+
+    session.close()
+    gc.collect()
+    tracemalloc.start()
+    function(session)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return timings, queries, peak
+
+
+def run_scale(data_dir, n_selections, seed, repeats):
+    source = ensure_database(data_dir, n_selections, seed)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # CRUD روی کپی انجام می‌شود تا فایل ساخته‌شده برای اجراهای بعدی دست‌نخورده بماند
+        path = os.path.join(workdir, 'bench.db')
+        shutil.copyfile(source, path)
+        engine = make_engine(f"sqlite:///{path}")
+        session = sessionmaker(bind=engine)()
+        statements = []
+        event.listen(engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *rest: statements.append(statement))
+
+        for name, function in operations(session):
+            timings, queries, peak = measure(session, function, repeats, statements)
+            result = {'scale': n_selections, 'operation': name,
+                      'median_ms': round(statistics.median(timings) * 1000, 3),
+                      'min_ms': round(min(timings) * 1000, 3), 'queries': queries, 'peak_kb': round(peak / 1024, 1)}
+            results.append(result)
+            print(f"{n_selections:>8} {name:<36} median={result['median_ms']:9.2f}ms min={result['min_ms']:9.2f}ms "
+                  f"queries={queries:>3} peak={result['peak_kb']:9.1f}KB")
+        session.close()
+        engine.dispose()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """نتیجه‌ها را با فایل اجرای قبلی مقایسه و تعداد پسرفت‌ها را برمی‌گرداند."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['scale'], r['operation']): r for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\nمقایسه با {baseline_path} (آستانه {threshold:.2f}x):")
+    for result in results:
+        old = baseline.get((result['scale'], result['operation']))
+        if old is None:
+            continue
+        ratio = result['median_ms'] / old['median_ms'] if old['median_ms'] else 1.0
+        slower = ratio > threshold
+        more_queries = result['queries'] > old['queries']
+        regressions += slower or more_queries
+        flag = " <-- پسرفت" if slower or more_queries else ""
+        print(f"{result['scale']:>8} {result['operation']:<36} {old['median_ms']:9.2f}ms -> {result['median_ms']:9.2f}ms "
+              f"({ratio:5.2f}x) queries {old['queries']} -> {result['queries']}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', default=['1k', '100k'],
+                        help=f"تعداد انتخاب‌ها یا نام مقیاس ({', '.join(SCALES)})")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'chamran_bench'),
+                        help="محل نگهداری دیتابیس‌های ساخته‌شده")
+    parser.add_argument('--output', help="فایل JSON نتیجه‌ها")
+    parser.add_argument('--compare', metavar='BASELINE', help="فایل JSON یک اجرای قبلی")
+    parser.add_argument('--threshold', type=float, default=1.25, help="نسبت زمان میانه‌ای که پسرفت حساب می‌شود")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = []
+    for scale in args.scales:
+        results += run_scale(args.data_dir, SCALES.get(scale.lower()) or int(scale), args.seed, args.repeats)
+
+    if args.output:
+        report = {
+            'meta': {'created': datetime.datetime.now().isoformat(timespec='seconds'), 'revision': git_revision(),
+                     'python': platform.python_version(), 'sqlalchemy': sqlalchemy.__version__,
+                     'sqlite': sqlite3.sqlite_version,
+                     'platform': platform.platform(), 'seed': args.seed, 'repeats': args.repeats},
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""بنچمارک تولید برنامه کلاسی (timetable.py) روی یک مسئله مصنوعی با چند صد ارائه.
+
+زمان رسیدن به برنامه بدون تداخل استاد، میزان همزمانی دروس یک رشته و اثر تعداد شروع‌های تصادفی
+را گزارش می‌دهد و درستی نتیجه را با مقایسه دوبه‌دوی ارائه‌ها بررسی می‌کند.
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_timetable.py --offerings 300 --masters 60
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services
+from timetable import Offering, TimetableProblem, solve
+
+
+def make_problem(n_offerings, n_masters, seed=1):
+    """هر ارائه ۱ تا ۳ استاد مجاز دارد و هر استاد در حدود یک‌پنجم روزها نیم‌روز در دسترس نیست."""
+    rnd = random.Random(seed)
+    majors = services.MAJORS[:-1]
+    offerings = [Offering(i, rnd.choice(majors), rnd.randint(1, 4),
+                          tuple(rnd.sample(range(1, n_masters + 1), rnd.randint(1, 3))))
+                 for i in range(1, n_offerings + 1)]
+    blocked = []
+    for master_id in range(1, n_masters + 1):
+        for day in services.WEEK_DAYS:
+            if rnd.random() < 0.2:
+                blocked.append((master_id, day, *rnd.choice([(8, 13), (13, 18)])))
+    return TimetableProblem(offerings, blocked)
+
+
+def assert_valid(problem, solution):
+    placed = list(zip(problem.offerings, solution.slots))
+    for offering, slot in placed:
+        assert slot.master_id in offering.masters and slot.finish - slot.start == offering.hours
+        assert not problem.blocked.get((slot.master_id, slot.day), 0) & problem.hours_mask(slot.start, slot.finish)
+    for k, (_, a) in enumerate(placed):
+        for _, b in placed[k + 1:]:
+            overlap = a.master_id == b.master_id and a.day == b.day and a.start < b.finish and b.start < a.finish
+            assert not overlap, f"تداخل استاد: {a} و {b}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--offerings', type=int, nargs='+', default=[100, 300, 600])
+    parser.add_argument('--masters', type=int, default=60)
+    parser.add_argument('--restarts', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--workers', type=int, help="تعداد پردازش‌های موازی (پیش‌فرض: تعداد CPU)")
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    for n_offerings in args.offerings:
+        problem = make_problem(n_offerings, args.masters)
+        for restarts in args.restarts:
+            started = time.perf_counter()
+            solution = solve(problem, restarts, args.workers, args.seconds)
+            elapsed = time.perf_counter() - started
+            if not solution.hard:
+                assert_valid(problem, solution)
+            print(f"offerings={n_offerings:>4} restarts={restarts}: {elapsed:6.2f}s "
+                  f"master conflicts={solution.hard} same-major overlap hours={solution.soft} "
+                  f"(best seed {solution.seed}, {solution.iterations} steps)")
+
+
+if __name__ == '__main__':
+    main()
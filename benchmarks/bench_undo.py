@@ -0,0 +1,106 @@
+"""بنچمارک حذف نرم، بازگردانی و واگرد / ازنو دسته‌ای انتخاب واحدها در برابر حذف تک‌تک رکوردها.
+
+روی کپی دیتابیس ساخته‌شده با generate_data.py تعدادی انتخاب تصادفی یک بار مثل
+دکمه حذف فرم (services.delete_record و commit برای هر ردیف) و یک بار با journal.delete_records حذف و
+سپس با واگرد، ازنو و بازگردانی از سطل بازیافت برگردانده می‌شوند. زمان، تعداد کوئری و تعداد commit هر مرحله
+چاپ می‌شود و در پایان جدول خلاصه معدل (verify_gpa_summary) و شمارنده ثبت‌نام ارائه‌ها با شمارش از ابتدا
+مقایسه می‌شوند.
+
+اجرا از ریشه پروژه:
+    python benchmarks/bench_undo.py --selections 100k --rows 20000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import sessionmaker
+
+from models import Presentation, Selection, make_engine, recount_enrolled, verify_gpa_summary
+import journal
+import services
+from generate_data import SCALES, ensure_database
+
+
+def enrolled_mismatches(engine):
+    """ارائه‌هایی که شمارنده ثبت‌نامشان با شمارش انتخاب‌های فعال فرق دارد (شمارش از نو بدون commit)."""
+    presentation = Presentation.__table__
+    query = select(presentation.c.PresentationId, presentation.c.Enrolled)
+    with engine.connect() as connection:
+        with connection.begin() as transaction:
+            stored = dict(connection.execute(query).all())
+            recount_enrolled(connection)
+            actual = dict(connection.execute(query).all())
+            transaction.rollback()
+    return [presentation_id for presentation_id, enrolled in stored.items() if actual.get(presentation_id) != enrolled]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--selections', default='100k', help="تعداد انتخاب‌ها یا نام مقیاس (1k، 100k، 1m)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--rows', type=int, default=20000, help="تعداد انتخاب‌هایی که دسته‌ای حذف و بازگردانده می‌شوند")
+    parser.add_argument('--per-row', type=int, default=500, help="تعداد انتخاب‌هایی که تک‌تک حذف می‌شوند")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'chamran_bench'))
+    args = parser.parse_args()
+
+    n_selections = SCALES.get(args.selections.lower()) or int(args.selections)
+    os.makedirs(args.data_dir, exist_ok=True)
+    source = ensure_database(args.data_dir, n_selections, args.seed)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'undo.db')
+        shutil.copyfile(source, path)
+        engine = make_engine(f"sqlite:///{path}")
+        session = sessionmaker(bind=engine)()
+        counters = {'statements': 0, 'commits': 0}
+
+        def count(key):
+            def listener(*args):
+                counters[key] += 1
+            return listener
+        event.listen(engine, 'before_cursor_execute', count('statements'))
+        event.listen(engine, 'commit', count('commits'))
+
+        all_ids = [row[0] for row in session.query(Selection.IdSelection)]
+        session.close()
+        ids = random.Random(args.seed).sample(all_ids, min(args.rows + args.per_row, len(all_ids)))
+        single, batch = ids[:args.per_row], ids[args.per_row:]
+        print(f"selections={n_selections} batch rows={len(batch)} per-row rows={len(single)}")
+
+        def step(name, rows, action):
+            counters.update(statements=0, commits=0)
+            started = time.perf_counter()
+            result = action()
+            elapsed = time.perf_counter() - started
+            print(f"  {name:<26} rows={rows:>6} {elapsed * 1000:9.1f}ms "
+                  f"({elapsed * 1e6 / max(rows, 1):8.1f}us/row) queries={counters['statements']:>6} "
+                  f"commits={counters['commits']:>5}")
+            return result
+
+        step('per-row delete_record', len(single),
+             lambda: [services.delete_record(session, Selection, selection_id) for selection_id in single])
+        step('delete_records', len(batch), lambda: journal.delete_records(session, Selection, batch))
+        step('undo (restore)', len(batch), lambda: journal.undo(session))
+        step('redo (delete again)', len(batch), lambda: journal.redo(session))
+        restored = step('restore_records (trash)', len(ids), lambda: journal.restore_records(session, Selection, ids))
+        session.close()
+
+        with engine.connect() as connection:
+            mismatches = verify_gpa_summary(connection)
+        wrong_enrolled = enrolled_mismatches(engine)
+        print(f"  restored: {restored}  gpa summary mismatches: {len(mismatches)}  "
+              f"enrolled mismatches: {len(wrong_enrolled)}")
+        engine.dispose()
+    if mismatches or wrong_enrolled or restored != len(ids):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
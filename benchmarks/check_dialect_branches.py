@@ -0,0 +1,242 @@
+"""پوشش شاخه‌های غیر SQLite سرویس‌ها با یک جایگزین SQLite؛ این بررسی یک دیتابیس دیگر را اجرا نمی‌کند.
+
+یک سناریوی ثابت یک بار با مسیرهای معمول SQLite و یک بار روی فایل SQLite دیگری اجرا می‌شود که تصمیم گویش در آن
+به PostgreSQL برگردانده شده (services._dialect_name، importer._preallocates_ids و نبود تعداد ردیف executemany
+مثل psycopg2)؛ نتیجه‌ها باید یکسان باشند و همه دستورهای اجرای دوم برای گویش postgresql هم کامپایل می‌شوند. با --database-url همان سناریو روی یک دیتابیس خالی واقعی دیگر اجرا می‌شود.
+
+اجرا از ریشه پروژه:
+    python benchmarks/check_dialect_branches.py
+    python benchmarks/check_dialect_branches.py --database-url postgresql://localhost/chamran_check
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import ClauseElement
+
+from models import (ChangeJournal, Lesson, Master, Presentation, Selection, Session, Student, close_database,
+                    configure_database, get_engine, migrate, verify_gpa_summary)
+import importer
+import journal
+import services
+
+STUDENT_NAMES = ['ali_1', 'ali%2', 'aliX3', 'ali_4', 'alice', 'bob']
+# تکه‌هایی که شاخه‌های غیر SQLite باید در SQL گویش postgresql تولید کنند
+EXPECTED_SQL = ['LIKE', 'ESCAPE', 'NULLS FIRST', 'NULLS LAST', 'RETURNING', 'IS NOT DISTINCT FROM']
+
+
+@contextlib.contextmanager
+def other_dialect_branches(engine):
+    """سرویس‌ها و ورود دسته‌ای را روی این engine وادار به رفتن شاخه‌های PostgreSQL می‌کند."""
+    saved = services._dialect_name, importer._preallocates_ids, engine.dialect.supports_sane_multi_rowcount
+    services._dialect_name = lambda session: 'postgresql'
+    importer._preallocates_ids = lambda connection: False
+    # مثل psycopg2 که تعداد ردیف‌های UPDATE با executemany را برنمی‌گرداند
+    engine.dialect.supports_sane_multi_rowcount = False
+    try:
+        yield
+    finally:
+        services._dialect_name, importer._preallocates_ids, engine.dialect.supports_sane_multi_rowcount = saved
+
+
+@contextlib.contextmanager
+def compiled_for_postgresql(engine, statements, failures):
+    """هر دستور اجراشده روی engine را برای گویش postgresql کامپایل و SQL آن را در statements جمع می‌کند."""
+    dialect = postgresql.dialect()
+
+    def compile_statement(connection, clauseelement, multiparams, params, execution_options):
+        if not isinstance(clauseelement, ClauseElement):
+            return
+        try:
+            statements.append(str(clauseelement.compile(dialect=dialect)))
+        except Exception as e:
+            failures.append(f"کامپایل برای postgresql: {e.__class__.__name__}: {e}")
+
+    event.listen(engine, 'before_execute', compile_statement)
+    try:
+        yield
+    finally:
+        event.remove(engine, 'before_execute', compile_statement)
+
+
+@contextlib.contextmanager
+def concurrent_score_change(engine, selection_id):
+    """درست پیش از UPDATE دسته‌ای نمره‌ها، نمره یک انتخاب را مثل کاربری دیگر عوض می‌کند."""
+    state = {'done': False}
+
+    def change(connection, clauseelement, multiparams, params, execution_options):
+        if state['done'] or not getattr(clauseelement, 'is_update', False):
+            return
+        if clauseelement.table is not Selection.__table__:
+            return
+        state['done'] = True
+        connection.execute(update(Selection.__table__).where(Selection.IdSelection == selection_id).values(Score=0.25))
+
+    event.listen(engine, 'before_execute', change)
+    try:
+        yield
+    finally:
+        event.remove(engine, 'before_execute', change)
+
+
+def seed(session):
+    masters = [Master(Name=f"استاد {k}", Mobile=f"0912{k:07d}") for k in range(2)]
+    lessons = [Lesson(Name=f"درس {k}", Unit=2 + k, Major='کامپیوتر') for k in range(2)]
+    students = [Student(Name=name, Mobile=f"0935{k:07d}", Major='کامپیوتر') for k, name in enumerate(STUDENT_NAMES)]
+    session.add_all(masters + lessons + students)
+    session.flush()
+    presentations = [Presentation(MasterId=masters[k].MasterId, LessonId=lesson.LessonId, DayHold='شنبه',
+                                  StartTime=8 + 2 * k, FinishTime=10 + 2 * k) for k, lesson in enumerate(lessons)]
+    session.add_all(presentations)
+    session.flush()
+    session.add_all([Selection(IdStudent=student.IdStudent, IdPresentation=presentation.PresentationId,
+                               Score=None if (i + j) % 3 == 0 else 10.0 + i + j, YearEducation=1402)
+                     for i, student in enumerate(students) for j, presentation in enumerate(presentations)])
+    session.commit()
+    return presentations[0].PresentationId
+
+
+def sorted_pages(session, descending, page_size=4):
+    """کلید همه انتخاب‌ها با مرتب‌سازی نمره، صفحه‌به‌صفحه رو به جلو و سپس از آخر رو به عقب."""
+    sort = ('Score', descending)
+    forward, pages, after_key = [], [], None
+    while True:
+        rows, keys = services.fetch_display_page(session, Selection, sort=sort, after_key=after_key, limit=page_size)
+        if not rows:
+            break
+        pages.append(keys)
+        forward.extend(keys)
+        after_key = keys[-1]
+    backward, before_key = [], pages[-1][0] if pages else None
+    while before_key is not None:
+        rows, keys = services.fetch_display_page(session, Selection, sort=sort, before_key=before_key, limit=page_size)
+        if not rows:
+            break
+        backward = keys + backward
+        before_key = keys[0]
+    return forward, backward + pages[-1] if pages else backward
+
+
+def import_lessons(path):
+    names = [f"درس وارداتی {k}" for k in range(7)]
+    with open(path, 'w', encoding='utf-8', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['Name', 'Unit', 'Major'])
+        writer.writerows([(name, 1 + k % 3, 'برق') for k, name in enumerate(names)])
+    inserted, rejected, elapsed = importer.import_file('lessons', path, chunk_size=3, report=lambda message: None)
+    return inserted, rejected
+
+
+def imported_ids_match(session):
+    """شناسه هر درس واردشده در تاریخچه با همان ردیف دیتابیس یکی است (ترتیب RETURNING)."""
+    entries = session.query(ChangeJournal.RowId, ChangeJournal.After) \
+        .filter(ChangeJournal.TableName == Lesson.__tablename__, ChangeJournal.Action == 'insert').all()
+    names = dict(session.query(Lesson.LessonId, Lesson.Name))
+    return bool(entries) and all(json.loads(after)['Name'] == names.get(row_id) for row_id, after in entries)
+
+
+def scenario(session, workdir):
+    """سناریوی ثابت؛ دیکشنری مشاهده‌ها را برمی‌گرداند که باید در همه اجراها یکسان باشد."""
+    observed = {}
+    presentation_id = seed(session)
+    student_names = dict(session.query(Student.IdStudent, Student.Name))
+
+    for prefix in ('ali_', 'ali%', 'ali'):
+        rows, keys = services.fetch_display_page(session, Student, filters={'Name': prefix})
+        observed[f"prefix {prefix}"] = sorted(student_names[key] for key in keys)
+        observed[f"count {prefix}"] = services.count_rows(session, Student, {'Name': prefix})
+
+    for descending in (False, True):
+        forward, backward = sorted_pages(session, descending)
+        observed[f"sorted desc={descending}"] = forward
+        observed[f"paging back desc={descending}"] = backward == forward
+
+    observed['import'] = import_lessons(os.path.join(workdir, 'lessons.csv'))
+    observed['import ids'] = imported_ids_match(session)
+
+    rows = services.fetch_gradebook(session, presentation_id)
+    scores = {row.selection_id: 12.0 if row.score is None else row.score + 1 for row in rows}
+    observed['save_scores'] = services.save_scores(session, presentation_id, scores)
+
+    before = [(row.selection_id, row.score) for row in services.fetch_gradebook(session, presentation_id)]
+    scores = {selection_id: (score or 0) + 0.5 for selection_id, score in before}
+    try:
+        with concurrent_score_change(get_engine(), before[0][0]):
+            services.save_scores(session, presentation_id, scores)
+        observed['save_scores conflict'] = 'saved'
+    except ValueError:
+        observed['save_scores conflict'] = 'rejected'
+    after = [(row.selection_id, row.score) for row in services.fetch_gradebook(session, presentation_id)]
+    observed['conflict rolled back'] = after == before
+
+    total = services.count_rows(session, Selection)
+    ids = services.fetch_display_page(session, Selection, limit=3)[1]
+    observed['delete'] = journal.delete_records(session, Selection, ids), services.count_rows(session, Selection) - total
+    journal.undo(session)
+    observed['undo'] = services.count_rows(session, Selection) - total
+
+    with get_engine().connect() as connection:
+        observed['gpa mismatches'] = len(verify_gpa_summary(connection))
+    return observed
+
+
+def run(url, workdir, stand_in=False):
+    engine = configure_database(url)
+    migrate(engine)
+    session = Session()
+    if services.count_rows(session, Student):
+        raise SystemExit(f"دیتابیس {url} خالی نیست؛ سناریو به یک دیتابیس خالی نیاز دارد.")
+    statements, failures = [], []
+    if stand_in:
+        with other_dialect_branches(engine), compiled_for_postgresql(engine, statements, failures):
+            observed = scenario(session, workdir)
+    else:
+        observed = scenario(session, workdir)
+    session.close()
+    close_database()
+    return observed, statements, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help="یک دیتابیس خالی دیگر (مثلاً PostgreSQL) برای اجرای همان سناریو")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        reference = run(f"sqlite:///{os.path.join(workdir, 'sqlite.db')}", workdir)[0]
+        runs = [('stand-in', *run(f"sqlite:///{os.path.join(workdir, 'stand_in.db')}", workdir, stand_in=True))]
+        if args.database_url:
+            runs.append((args.database_url, *run(args.database_url, workdir)))
+
+    print(f"[sqlite] {len(reference)} مشاهده")
+    for name, observed, statements, compile_failures in runs:
+        differences = [key for key in reference if observed.get(key) != reference[key]]
+        for key in differences:
+            failures.append(f"{name}: {key}: {observed.get(key)!r} != {reference[key]!r}")
+        failures.extend(f"{name}: {failure}" for failure in compile_failures)
+        print(f"[{'OK' if not differences else 'FAIL'}] {name}: {len(observed) - len(differences)}/{len(reference)} "
+              f"مشاهده یکسان با sqlite")
+        if statements:
+            sql = '\n'.join(statements)
+            missing = [fragment for fragment in EXPECTED_SQL if fragment not in sql]
+            failures.extend(f"{name}: '{fragment}' در SQL گویش postgresql دیده نشد" for fragment in missing)
+            print(f"[{'OK' if not missing else 'FAIL'}] {name}: {len(statements)} دستور برای postgresql کامپایل شد")
+
+    for key, value in reference.items():
+        print(f"       {key}: {value}")
+    for failure in failures:
+        print(f"[FAIL] {failure}")
+    assert not failures, f"{len(failures)} بررسی شاخه‌های گویش ناموفق بود"
+
+
+if __name__ == '__main__':
+    main()
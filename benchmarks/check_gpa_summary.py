@@ -0,0 +1,86 @@
+"""بررسی به‌روزرسانی دلتایی جدول خلاصه معدل در flushهایی که چند چیز را با هم عوض می‌کنند.
+
+هر مرحله با ORM یک commit انجام می‌دهد (اشیا پس از commit قبلی expire شده‌اند) و سپس جدول خلاصه با
+verify_gpa_summary با تجمیع از ابتدا مقایسه می‌شود.
+
+اجرا از ریشه پروژه:
+    python benchmarks/check_gpa_summary.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import (Lesson, Master, Presentation, Selection, Session, Student, close_database, configure_database,
+                    migrate, verify_gpa_summary)
+
+
+def seed(session):
+    master = Master(Name="استاد", Mobile="09120000000")
+    lessons = [Lesson(Name=f"درس {k}", Unit=3 - k, Major='کامپیوتر') for k in range(2)]
+    student = Student(Name="دانشجو", Mobile="09350000000", Major='کامپیوتر')
+    session.add_all([master, student, *lessons])
+    session.flush()
+    presentations = [Presentation(MasterId=master.MasterId, LessonId=lesson.LessonId) for lesson in lessons]
+    session.add_all(presentations)
+    session.flush()
+    session.add_all([Selection(IdStudent=student.IdStudent, IdPresentation=presentation.PresentationId,
+                               Score=10.0 + k, YearEducation=1402) for k, presentation in enumerate(presentations)])
+    session.commit()
+
+
+def steps(session):
+    """مرحله‌ها به ترتیب؛ هر کدام تغییرات یک commit را روی session می‌گذارد و نامش را برمی‌گرداند."""
+    lesson = session.query(Lesson).order_by(Lesson.LessonId).first()
+    selection = session.query(Selection).order_by(Selection.IdSelection).first()
+    selection.Score = 20.0
+    lesson.Unit = 1
+    yield "تغییر نمره و واحد درس آن در یک commit"
+
+    master = session.query(Master).first()
+    session.add(Selection(student=Student(Name="دانشجوی جدید", Mobile="09350000001", Major='کامپیوتر'),
+                          presentation=Presentation(master=master, lesson=Lesson(Name="درس جدید", Unit=2,
+                                                                                 Major='کامپیوتر')),
+                          Score=15.0, YearEducation=1403))
+    yield "ارائه، درس و دانشجوی جدید با انتخاب در همان flush"
+
+    presentation = session.query(Presentation).order_by(Presentation.PresentationId).first()
+    other = session.query(Lesson).order_by(Lesson.LessonId.desc()).first()
+    presentation.lesson = other
+    selection.Score = 12.0
+    yield "جابه‌جایی درس ارائه با رابطه و تغییر نمره یکی از انتخاب‌های آن"
+
+    selection.Deleted = 1
+    other.Unit = 4
+    yield "حذف نرم یک انتخاب همراه با تغییر واحد درس آن"
+
+    last = session.query(Presentation).order_by(Presentation.PresentationId.desc()).first()
+    selection.Deleted = 0
+    selection.presentation = last
+    yield "بازگردانی انتخاب و انتقال آن به ارائه دیگر با رابطه"
+
+
+def main():
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = configure_database(f"sqlite:///{os.path.join(workdir, 'gpa.db')}")
+        migrate(engine)
+        session = Session()
+        seed(session)
+        for name in steps(session):
+            session.commit()
+            with engine.connect() as connection:
+                mismatches = verify_gpa_summary(connection)
+            print(f"[{'OK' if not mismatches else 'FAIL'}] {name}")
+            failures.extend(f"{name}: {mismatch}" for mismatch in mismatches)
+        session.close()
+        close_database()
+
+    for failure in failures:
+        print(f"[FAIL] {failure}")
+    assert not failures, f"{len(failures)} مغایرت در جدول خلاصه معدل"
+
+
+if __name__ == '__main__':
+    main()
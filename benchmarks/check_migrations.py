@@ -0,0 +1,110 @@
+"""بررسی مهاجرت فایل دیتابیس همراه پروژه (chamran_uni.db) به آخرین نسخه اسکیما.
+
+بنچمارک‌ها دیتابیس را از نو با generate_data.py می‌سازند و مهاجرت‌های قدیمی را روی فایل واقعی اجرا
+نمی‌کنند. این اسکریپت یک کپی از chamran_uni.db برمی‌دارد، چند ردیف با ستون‌های همان جدول‌های قدیمی
+(بدون ORM) در آن درج می‌کند، migrate را اجرا می‌کند و سپس نسخه، جدول خلاصه معدل، شمارنده ثبت‌نام
+ارائه‌ها و کوئری‌های ORM (که ردیف‌های حذف‌شده را فیلتر می‌کنند) را بررسی می‌کند.
+
+اجرا از ریشه پروژه:
+    python benchmarks/check_migrations.py
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import func, inspect, select
+from sqlalchemy.orm import sessionmaker
+
+from models import (DB_FILE, LATEST_VERSION, SOFT_DELETE_MODELS, Presentation, Selection, make_engine, migrate,
+                    schema_version, verify_gpa_summary)
+import journal
+import services
+
+
+def seed_old_schema(path):
+    """چند استاد، درس، دانشجو، ارائه و انتخاب با ستون‌های نسخه اول جدول‌ها درج می‌کند."""
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.executemany('INSERT INTO "Master" ("Name", "Mobile") VALUES (?, ?)',
+                               [(f"استاد {k}", f"0912000000{k}") for k in range(3)])
+        connection.executemany('INSERT INTO "Lesson" ("Name", "Unit", "Major") VALUES (?, ?, ?)',
+                               [(f"درس {k}", 2 + k % 2, 'کامپیوتر') for k in range(4)])
+        connection.executemany('INSERT INTO "Student" ("Name", "Mobile", "Major") VALUES (?, ?, ?)',
+                               [(f"دانشجو {k}", f"0935000000{k}", 'کامپیوتر') for k in range(6)])
+        masters = [row[0] for row in connection.execute('SELECT "MasterId" FROM "Master"')]
+        lessons = [row[0] for row in connection.execute('SELECT "LessonId" FROM "Lesson"')]
+        connection.executemany(
+            'INSERT INTO "Presentation" ("MasterId", "LessonId", "DayHold", "StartTime", "FinishTime") '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(masters[k % len(masters)], lesson, 'شنبه', 8 + 2 * k, 10 + 2 * k) for k, lesson in enumerate(lessons)])
+        students = [row[0] for row in connection.execute('SELECT "IdStudent" FROM "Student"')]
+        presentations = [row[0] for row in connection.execute('SELECT "PresentationId" FROM "Presentation"')]
+        connection.executemany(
+            'INSERT INTO "Selection" ("IdStudent", "IdPresentation", "Score", "YearEducation") VALUES (?, ?, ?, ?)',
+            [(student, presentation, None if (i + j) % 5 == 0 else 10 + (i * 3 + j) % 10, 1402)
+             for i, student in enumerate(students) for j, presentation in enumerate(presentations)])
+    connection.close()
+
+
+def enrolled_mismatches(connection):
+    counts = dict(connection.execute(select(Selection.IdPresentation, func.count())
+                                     .where(Selection.Deleted == 0).group_by(Selection.IdPresentation)).all())
+    return [(presentation_id, enrolled, counts.get(presentation_id, 0)) for presentation_id, enrolled
+            in connection.execute(select(Presentation.PresentationId, Presentation.Enrolled))
+            if enrolled != counts.get(presentation_id, 0)]
+
+
+def main():
+    source = os.path.join(ROOT, DB_FILE)
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, DB_FILE)
+        shutil.copyfile(source, path)
+        seed_old_schema(path)
+
+        engine = make_engine(f"sqlite:///{path}")
+        with engine.connect() as connection:
+            before = schema_version(connection)
+        version = migrate(engine)
+        print(f"نسخه اسکیما: {before} -> {version}")
+        if version != LATEST_VERSION:
+            failures.append(f"نسخه نهایی {version} است نه {LATEST_VERSION}")
+
+        with engine.connect() as connection:
+            inspector = inspect(connection)
+            for model in SOFT_DELETE_MODELS:
+                if 'Deleted' not in {column['name'] for column in inspector.get_columns(model.__tablename__)}:
+                    failures.append(f"ستون Deleted در جدول {model.__tablename__} اضافه نشده است")
+            gpa = verify_gpa_summary(connection)
+            enrolled = enrolled_mismatches(connection)
+        print(f"مغایرت خلاصه معدل: {len(gpa)}  مغایرت شمارنده ثبت‌نام: {len(enrolled)}")
+        if gpa or enrolled:
+            failures.append("جدول خلاصه معدل یا شمارنده ثبت‌نام پس از مهاجرت درست نیست")
+
+        # کوئری‌های ORM شرط Deleted = 0 را اضافه می‌کنند؛ حذف و واگرد یک انتخاب روی دیتابیس مهاجرت‌داده‌شده
+        session = sessionmaker(bind=engine)()
+        total = services.count_rows(session, Selection)
+        selection_id = session.query(Selection.IdSelection).order_by(Selection.IdSelection).first()[0]
+        journal.delete_records(session, Selection, [selection_id])
+        after_delete = services.count_rows(session, Selection)
+        journal.undo(session)
+        after_undo = services.count_rows(session, Selection)
+        print(f"انتخاب‌ها: {total}، پس از حذف {after_delete}، پس از واگرد {after_undo}")
+        if (after_delete, after_undo) != (total - 1, total):
+            failures.append("حذف نرم یا واگرد روی دیتابیس مهاجرت‌داده‌شده درست کار نمی‌کند")
+        session.close()
+        engine.dispose()
+
+    for failure in failures:
+        print(f"[FAIL] {failure}")
+    assert not failures, f"{len(failures)} بررسی مهاجرت ناموفق بود"
+    print("[OK] مهاجرت chamran_uni.db")
+
+
+if __name__ == '__main__':
+    main()
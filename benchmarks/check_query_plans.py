@@ -0,0 +1,102 @@
+"""بررسی EXPLAIN QUERY PLAN کوئری‌های پرتکرار تا مطمئن شویم از ایندکس‌ها استفاده می‌کنند.
+
+اجرا از ریشه پروژه:
+    python benchmarks/check_query_plans.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import sessionmaker
+
+from models import (Lesson, Master, Presentation, Student, Selection, DELETED, migrate,
+                  _summary_source, _regrouped_scores)
+from services import PREFIX_END, _display_query
+
+
+def query_plan(connection, statement):
+    compiled = statement.compile(connection, compile_kwargs={'literal_binds': True})
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").fetchall()
+    return [row[-1] for row in rows]
+
+
+def main():
+    engine = create_engine('sqlite://')
+    migrate(engine)
+    session = sessionmaker(bind=engine)()
+    trash, trash_pk = _display_query(session, Selection)[:2]
+
+    checks = [
+        ("گزینه‌های دانشجو با فیلتر رشته",
+         session.query(Student).filter(Student.Major == 'کامپیوتر').statement,
+         'Student', 'ix_Student_Major_Name'),
+        ("گزینه‌های درس با فیلتر رشته",
+         session.query(Lesson).filter(Lesson.Major == 'کامپیوتر').statement,
+         'Lesson', 'ix_Lesson_Major_Name'),
+        ("ارائه‌های یک استاد",
+         select(Presentation.PresentationId).where(Presentation.MasterId == 1),
+         'Presentation', 'ix_Presentation_MasterId'),
+        ("معدل یک دانشجو از روی نمرات",
+         select(func.sum(Selection.Score * Lesson.Unit) / func.sum(Lesson.Unit))
+         .select_from(Selection)
+         .join(Presentation, Selection.IdPresentation == Presentation.PresentationId)
+         .join(Lesson, Presentation.LessonId == Lesson.LessonId)
+         .where(Selection.IdStudent == 1, Selection.Score != None),
+         'Selection', 'ix_Selection_IdStudent_Score'),
+        ("بازسازی خلاصه معدل برای چند دانشجو",
+         _summary_source([1, 2, 3]),
+         'Selection', 'ix_Selection_IdStudent_Score'),
+        ("دلتای تغییر واحد یک درس",
+         _regrouped_scores(Presentation.LessonId == 1),
+         'Presentation', 'ix_Presentation_LessonId'),
+        ("دلتای تغییر درس یک ارائه",
+         _regrouped_scores(Presentation.PresentationId == 1),
+         'Selection', 'ix_Selection_IdPresentation'),
+        ("فیلتر پیشوندی نام دانشجو با مرتب‌سازی نام",
+         session.query(Student).filter(Student.Name >= 'دانشجو 12', Student.Name < 'دانشجو 12' + PREFIX_END)
+         .order_by(Student.Name, Student.IdStudent).statement,
+         'Student', 'ix_Student_Name'),
+        ("فیلتر پیشوندی موبایل دانشجو",
+         session.query(Student).filter(Student.Mobile >= '0935', Student.Mobile < '0935' + PREFIX_END).statement,
+         'Student', 'ix_Student_Mobile'),
+        ("فیلتر پیشوندی نام استاد",
+         session.query(Master).filter(Master.Name >= 'استاد', Master.Name < 'استاد' + PREFIX_END).statement,
+         'Master', 'ix_Master_Name'),
+        ("فیلتر پیشوندی نام درس",
+         session.query(Lesson).filter(Lesson.Name >= 'درس', Lesson.Name < 'درس' + PREFIX_END).statement,
+         'Lesson', 'ix_Lesson_Name'),
+        ("تداخل برنامه یک استاد در یک روز",
+         select(Presentation.PresentationId).where(Presentation.MasterId == 1, Presentation.DayHold == 'شنبه',
+                                                   Presentation.StartTime < 12, Presentation.FinishTime > 10),
+         'Presentation', 'ix_Presentation_MasterId_DayHold_StartTime'),
+        ("فیلتر سال تحصیلی انتخاب واحد",
+         select(Selection.IdSelection).where(Selection.YearEducation == 1402),
+         'Selection', 'ix_Selection_YearEducation'),
+        ("سطل بازیافت انتخاب واحد (آخرین حذف‌شده‌ها)",
+         trash.filter(Selection.Deleted == DELETED).order_by(trash_pk.desc()).limit(500).statement,
+         'Selection', 'ix_Selection_Deleted'),
+        ("تعداد دانشجویان حذف‌شده",
+         select(func.count(Student.IdStudent)).where(Student.Deleted == DELETED),
+         'Student', 'ix_Student_Deleted'),
+    ]
+
+    failures = 0
+    with engine.connect() as connection:
+        for title, statement, table, index_name in checks:
+            plan = query_plan(connection, statement)
+            uses_index = any(index_name in line for line in plan)
+            # پیمایش ایندکس جزئی (مثل ردیف‌های حذف‌شده) فقط ردیف‌های همان ایندکس را می‌خواند
+            full_scan = any(line.startswith(f"SCAN {table}") and index_name not in line for line in plan)
+            ok = uses_index and not full_scan
+            failures += not ok
+            print(f"[{'OK' if ok else 'FAIL'}] {title}")
+            for line in plan:
+                print(f"       {line}")
+
+    assert failures == 0, f"{failures} کوئری از ایندکس مورد انتظار استفاده نمی‌کند"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""ساخت فایل دیتابیس مصنوعی در مقیاس دلخواه برای بنچمارک‌ها (با seed ثابت، همیشه همان داده).
+
+داده شبیه یک دانشکده واقعی است: دانشجویان و درس‌ها در رشته‌های services.MAJORS با سهم‌های متفاوت،
+ارائه‌ها در روزهای services.WEEK_DAYS و ساعت‌های ۸ تا ۱۸ (مدت کلاس به اندازه واحد درس)، و هر دانشجو
+از سال ورود خود تا CURRENT_YEAR هر سال چند درس (بیشتر از رشته خودش) انتخاب کرده است. نمره درس‌های
+سال جاری بخشی خالی است (ترم در جریان). ردیف‌ها دسته‌ای با INSERT هسته SQLAlchemy نوشته می‌شوند تا
+ساخت یک میلیون انتخاب هم حافظه کمی بگیرد؛ جدول خلاصه معدل و شمارنده ثبت‌نام ارائه‌ها در پایان پر می‌شوند.
+
+اجرا از ریشه پروژه:
+    python benchmarks/generate_data.py bench_100k.db --selections 100000 --seed 1
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+
+from models import Lesson, Master, Presentation, Selection, Student, make_engine, migrate, rebuild_gpa_summary, \
+    recount_enrolled
+import services
+from timetable import DAY_END, DAY_START, HOURS_PER_UNIT
+
+# مقیاس‌های پیش‌فرض بنچمارک (تعداد انتخاب واحد)
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+MAJOR_WEIGHTS = [30, 20, 18, 15, 10, 7]
+FIRST_YEAR = 1398
+CURRENT_YEAR = 1403
+SELECTIONS_PER_STUDENT = 24
+CHUNK_SIZE = 10000
+FIRST_NAMES = ['علی', 'محمد', 'زهرا', 'فاطمه', 'حسین', 'مریم', 'رضا', 'سارا', 'امیر', 'نرگس', 'مهدی', 'الهام']
+LAST_NAMES = ['احمدی', 'محمدی', 'حسینی', 'رضایی', 'موسوی', 'کریمی', 'جعفری', 'رحیمی', 'کاظمی', 'صادقی']
+DEGREES = ['دکتری', 'دکتری', 'دکتری', 'کارشناسی ارشد']
+
+
+def _person_name(rnd, index):
+    # شماره در انتهای نام، نام‌ها را یکتا نگه می‌دارد (منوهای کشویی نام را به شناسه map می‌کنند)
+    return f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)} {index}"
+
+
+def _insert_chunks(connection, model, rows):
+    table = model.__table__
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            connection.execute(insert(table), chunk)
+            chunk = []
+    if chunk:
+        connection.execute(insert(table), chunk)
+
+
+def scale_sizes(n_selections):
+    """تعداد دانشجو، درس، استاد و ارائه متناسب با تعداد انتخاب‌ها."""
+    n_students = max(10, n_selections // SELECTIONS_PER_STUDENT)
+    n_lessons = max(len(services.MAJORS) * 4, n_selections // 500)
+    n_masters = max(5, n_lessons // 3)
+    return n_students, n_lessons, n_masters, n_lessons * 2
+
+
+def generate(engine, n_selections, seed=1):
+    """جدول‌ها را روی engine می‌سازد (migrate) و با داده مصنوعی پر می‌کند؛ تعداد ردیف هر جدول را برمی‌گرداند."""
+    migrate(engine)
+    rnd = random.Random(seed)
+    n_students, n_lessons, n_masters, n_presentations = scale_sizes(n_selections)
+
+    lesson_majors = rnd.choices(services.MAJORS, MAJOR_WEIGHTS, k=n_lessons)
+    lesson_units = [rnd.choice((1, 2, 3, 3, 3, 4)) for _ in range(n_lessons)]
+    presentation_lessons = [rnd.randint(1, n_lessons) for _ in range(n_presentations)]
+    by_major = {major: [] for major in services.MAJORS}
+    for present_id, lesson_id in enumerate(presentation_lessons, start=1):
+        by_major[lesson_majors[lesson_id - 1]].append(present_id)
+    student_majors = rnd.choices(services.MAJORS, MAJOR_WEIGHTS, k=n_students)
+    student_years = [rnd.randint(FIRST_YEAR, CURRENT_YEAR) for _ in range(n_students)]
+
+    def presentations():
+        for present_id, lesson_id in enumerate(presentation_lessons, start=1):
+            hours = lesson_units[lesson_id - 1] * HOURS_PER_UNIT
+            start = rnd.randrange(DAY_START, DAY_END - hours + 1)
+            yield {'PresentationId': present_id, 'MasterId': rnd.randint(1, n_masters), 'LessonId': lesson_id,
+                   'DayHold': rnd.choice(services.WEEK_DAYS), 'StartTime': start, 'FinishTime': start + hours,
+                   'Enrolled': 0}
+
+    def selections():
+        # دانشجویان به نوبت انتخاب می‌گیرند تا دقیقاً n_selections ردیف ساخته شود
+        ability = [rnd.gauss(14, 2.5) for _ in range(n_students)]
+        for selection_id in range(1, n_selections + 1):
+            student = rnd.randrange(n_students)
+            major_presentations = by_major[student_majors[student]]
+            if major_presentations and rnd.random() < 0.8:
+                present_id = rnd.choice(major_presentations)
+            else:
+                present_id = rnd.randint(1, n_presentations)
+            year = rnd.randint(student_years[student], CURRENT_YEAR)
+            score = None
+            if year < CURRENT_YEAR or rnd.random() < 0.5:
+                score = min(20.0, max(0.0, round(rnd.gauss(ability[student], 3) * 4) / 4))
+            yield {'IdSelection': selection_id, 'IdStudent': student + 1, 'IdPresentation': present_id,
+                   'Score': score, 'YearEducation': year}
+
+    with engine.begin() as connection:
+        _insert_chunks(connection, Master, (
+            {'MasterId': i, 'Name': f"دکتر {_person_name(rnd, i)}", 'Graduation': rnd.choice(DEGREES),
+             'Mobile': f'0912{i:07d}', 'Email': f'master{i}@scu.ac.ir'} for i in range(1, n_masters + 1)))
+        _insert_chunks(connection, Lesson, (
+            {'LessonId': i, 'Name': f"درس {major} {i}", 'Unit': unit, 'Major': major}
+            for i, (major, unit) in enumerate(zip(lesson_majors, lesson_units), start=1)))
+        _insert_chunks(connection, Presentation, presentations())
+        _insert_chunks(connection, Student, (
+            {'IdStudent': i, 'Name': _person_name(rnd, i), 'EntranceTerm': f"{year % 100:02d}{rnd.choice('12')}",
+             'Graduation': 'کارشناسی', 'Mobile': f'0935{i:07d}', 'Email': None, 'Major': major}
+            for i, (major, year) in enumerate(zip(student_majors, student_years), start=1)))
+        _insert_chunks(connection, Selection, selections())
+        rebuild_gpa_summary(connection)
+        recount_enrolled(connection)
+    return {'Master': n_masters, 'Lesson': n_lessons, 'Presentation': n_presentations,
+            'Student': n_students, 'Selection': n_selections}
+
+
+def database_path(directory, n_selections, seed):
+    return os.path.join(directory, f"chamran_bench_{n_selections}_{seed}.db")
+
+
+def ensure_database(directory, n_selections, seed=1):
+    """فایل دیتابیس همین مقیاس و seed را (اگر قبلاً ساخته نشده) می‌سازد و مسیر آن را برمی‌گرداند.
+
+    فایلی که با نسخه قدیمی‌تر ساخته شده به اسکیمای فعلی مهاجرت داده می‌شود (داده‌ها همان می‌مانند).
+    """
+    path = database_path(directory, n_selections, seed)
+    if not os.path.exists(path):
+        partial = path + '.partial'
+        if os.path.exists(partial):
+            os.remove(partial)
+        engine = make_engine(f"sqlite:///{partial}", 'legacy')
+        generate(engine, n_selections, seed)
+        engine.dispose()
+        os.replace(partial, path)
+    else:
+        engine = make_engine(f"sqlite:///{path}", 'legacy')
+        migrate(engine)
+        engine.dispose()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path', help="مسیر فایل دیتابیس خروجی (نباید وجود داشته باشد)")
+    parser.add_argument('--selections', default='100k', help=f"تعداد انتخاب‌ها یا یکی از {', '.join(SCALES)}")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} از قبل وجود دارد")
+    n_selections = SCALES.get(args.selections.lower()) or int(args.selections)
+    started = time.perf_counter()
+    engine = make_engine(f"sqlite:///{args.path}", 'legacy')
+    counts = generate(engine, n_selections, args.seed)
+    engine.dispose()
+    print(', '.join(f"{name}={count}" for name, count in counts.items()),
+          f"({time.perf_counter() - started:.1f}s, {os.path.getsize(args.path) / 2**20:.1f}MB)")
+
+
+if __name__ == '__main__':
+    main()
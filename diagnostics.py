@@ -0,0 +1,212 @@
+"""اندازه‌گیری اختیاری تعداد کوئری و زمان هر عملیات (SQL، پس‌زمینه، رابط کاربری) و لاگ کوئری‌های کند."""
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from functools import wraps
+
+from sqlalchemy import event
+
+PROFILE = os.environ.get('CHAMRAN_PROFILE', '') not in ('', '0')
+SLOW_QUERY_MS = float(os.environ.get('CHAMRAN_SLOW_QUERY_MS', '100'))
+SLOW_LOG_SIZE = 200
+NO_OPERATION = '(بدون عملیات)'
+
+SlowQuery = namedtuple('SlowQuery', 'operation duration_ms statement parameters executemany')
+
+
+class OperationStats:
+    """آمار تجمعی یک عملیات؛ همه زمان‌ها به ثانیه."""
+
+    __slots__ = ('calls', 'wall', 'max_wall', 'db', 'job', 'ui', 'statements')
+
+    def __init__(self):
+        self.calls = self.statements = 0
+        self.wall = self.max_wall = self.db = self.job = self.ui = 0.0
+
+    def as_dict(self):
+        per_call = self.calls or 1
+        return {'calls': self.calls, 'wall_ms': self.wall * 1000, 'max_wall_ms': self.max_wall * 1000,
+                'db_ms': self.db * 1000, 'job_ms': self.job * 1000, 'ui_ms': self.ui * 1000,
+                'statements': self.statements, 'statements_per_call': self.statements / per_call}
+
+
+class Profiler:
+    """شمارنده‌های عملیات و لاگ کوئری‌های کند؛ از چند thread به طور همزمان قابل استفاده است."""
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.engine = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.plans = {}
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+            self.slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+            self.started = time.perf_counter()
+
+    def _stats(self, name):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = OperationStats()
+        return stats
+
+    # --- SQL ---
+
+    def install(self, engine):
+        self.engine = engine
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+
+    def uninstall(self):
+        if self.engine is not None:
+            event.remove(self.engine, 'before_cursor_execute', self._before_execute)
+            event.remove(self.engine, 'after_cursor_execute', self._after_execute)
+            self.engine = None
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['profiler_started'].pop()
+        if getattr(self.local, 'paused', False):
+            return
+        self.local.db = getattr(self.local, 'db', 0.0) + elapsed
+        operation = self.current()
+        with self.lock:
+            stats = self._stats(operation)
+            stats.statements += 1
+            stats.db += elapsed
+            if elapsed * 1000 >= self.slow_query_ms:
+                self.slow_queries.append(SlowQuery(operation, elapsed * 1000, statement, parameters, executemany))
+
+    # --- عملیات ---
+
+    def current(self):
+        stack = getattr(self.local, 'stack', None)
+        return stack[-1][0] if stack else NO_OPERATION
+
+    @contextmanager
+    def operation(self, name, kind='call'):
+        """بدنه را به عنوان عملیات name اندازه می‌گیرد؛ فقط kind='call' در تعداد فراخوانی‌ها شمرده می‌شود."""
+        stack = self.local.__dict__.setdefault('stack', [])
+        # فریم: [نام، زمان شروع، SQL همین thread در شروع، زمان فرزندان، SQL فرزندان]
+        frame = [name, time.perf_counter(), getattr(self.local, 'db', 0.0), 0.0, 0.0]
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            total = time.perf_counter() - frame[1]
+            db_total = getattr(self.local, 'db', 0.0) - frame[2]
+            own = max(total - frame[3] - (db_total - frame[4]), 0.0)
+            if stack:
+                stack[-1][3] += total
+                stack[-1][4] += db_total
+            with self.lock:
+                stats = self._stats(name)
+                if threading.current_thread() is threading.main_thread():
+                    stats.ui += own
+                else:
+                    stats.job += own
+                if kind == 'call':
+                    stats.calls += 1
+                    stats.wall += total
+                    stats.max_wall = max(stats.max_wall, total)
+
+    def wrap(self, owner, *names):
+        """متدها یا توابع owner (نمونه کلاس یا ماژول) را با نسخه اندازه‌گیری‌شده جایگزین می‌کند."""
+        prefix = getattr(owner, '__name__', type(owner).__name__)
+        for name in names:
+            function = getattr(owner, name)
+            setattr(owner, name, self._wrapped(f"{prefix}.{name}", function))
+
+    def _wrapped(self, label, function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.operation(label):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def track(self, job, on_done, on_error=None):
+        """کار پس‌زمینه و callbackهای آن را به عملیاتی که آن را فرستاده نسبت می‌دهد (برای QueryRunner.submit)."""
+        name = self.current()
+        if name == NO_OPERATION:
+            return job, on_done, on_error
+
+        def tracked_job(session):
+            with self.operation(name, 'job'):
+                return job(session)
+
+        def tracked(callback):
+            if callback is None:
+                return None
+
+            def run(*args):
+                with self.operation(name, 'callback'):
+                    return callback(*args)
+            return run
+
+        return tracked_job, tracked(on_done), tracked(on_error)
+
+    # --- گزارش ---
+
+    def operations(self):
+        """(نام، آمار) عملیات‌ها به ترتیب نزولی مجموع زمان."""
+        with self.lock:
+            items = [(name, stats.as_dict()) for name, stats in self.stats.items()]
+        return sorted(items, key=lambda item: -(item[1]['db_ms'] + item[1]['job_ms'] + item[1]['ui_ms']))
+
+    def slow_query_log(self):
+        with self.lock:
+            return sorted(self.slow_queries, key=lambda query: -query.duration_ms)
+
+    def explain(self, query):
+        """طرح اجرای یک کوئری کند (هر خط یک مرحله)؛ نتیجه برای هر متن کوئری نگه داشته می‌شود."""
+        if query.statement in self.plans:
+            return self.plans[query.statement]
+        if self.engine is None:
+            return []
+        sqlite = self.engine.dialect.name == 'sqlite'
+        parameters = query.parameters[0] if query.executemany and query.parameters else query.parameters
+        self.local.paused = True
+        try:
+            with self.engine.connect() as connection:
+                rows = connection.exec_driver_sql(
+                    ('EXPLAIN QUERY PLAN ' if sqlite else 'EXPLAIN ') + query.statement, parameters).fetchall()
+            plan = [str(row[-1]) if sqlite else ' | '.join(map(str, row)) for row in rows]
+        except Exception as e:
+            plan = [f"EXPLAIN ناموفق: {e}"]
+        finally:
+            self.local.paused = False
+        self.plans[query.statement] = plan
+        return plan
+
+    def report(self):
+        return {
+            'elapsed_s': time.perf_counter() - self.started,
+            'slow_query_ms': self.slow_query_ms,
+            'operations': {name: stats for name, stats in self.operations()},
+            'slow_queries': [{**query._asdict(), 'parameters': repr(query.parameters), 'plan': self.explain(query)}
+                             for query in self.slow_query_log()],
+        }
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def format_report(self):
+        lines = [f"{'operation':<44} {'calls':>6} {'wall ms':>9} {'sql ms':>9} {'job ms':>9} {'ui ms':>9} "
+                 f"{'queries':>8} {'q/call':>7}"]
+        for name, s in self.operations():
+            lines.append(f"{name:<44} {s['calls']:>6} {s['wall_ms']:>9.1f} {s['db_ms']:>9.1f} {s['job_ms']:>9.1f} "
+                         f"{s['ui_ms']:>9.1f} {s['statements']:>8} {s['statements_per_call']:>7.1f}")
+        for query in self.slow_query_log():
+            lines.append(f"\nslow query ({query.duration_ms:.1f}ms, {query.operation}): {query.statement}")
+            lines.extend(f"    {step}" for step in self.explain(query))
+        return '\n'.join(lines)
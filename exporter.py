@@ -0,0 +1,146 @@
+"""خروجی جریانی انتخاب واحدها و کارنامه دانشجویان به CSV یا JSON Lines.
+
+ردیف‌ها با yield_per به صورت دسته‌ای از دیتابیس خوانده و از طریق فایل بافر‌شده نوشته می‌شوند،
+بنابراین مصرف حافظه به اندازه جدول بستگی ندارد.
+
+نمونه:
+    python exporter.py selections selections.csv
+    python exporter.py transcripts transcripts.jsonl --batch-size 20000
+"""
+import argparse
+import csv
+import json
+import time
+from itertools import groupby
+
+from sqlalchemy.orm import aliased
+
+from models import (Lesson, Master, Presentation, Student, Selection, Session, close_database, configure_database,
+                    get_engine, migrate)
+import services
+
+SELECTION_COLUMNS = ('IdSelection', 'IdStudent', 'StudentName', 'StudentMajor', 'IdPresentation', 'Presentation',
+                     'LessonName', 'LessonMajor', 'Unit', 'MasterName', 'DayHold', 'YearEducation', 'Score')
+TRANSCRIPT_COLUMNS = ('IdStudent', 'StudentName', 'StudentMajor', 'EntranceTerm', 'Gpa', 'TotalUnits',
+                      'IdSelection', 'LessonName', 'Unit', 'MasterName', 'YearEducation', 'Score')
+COURSE_COLUMNS = TRANSCRIPT_COLUMNS[6:]
+
+BUFFER_SIZE = 1 << 20
+
+
+def iter_selection_rows(session, batch_size=10000):
+    """همه انتخاب واحدها را با نام دانشجو، درس، استاد و تعداد واحد به ترتیب شناسه برمی‌گرداند."""
+    present = aliased(Presentation)
+    query = session.query(
+        Selection.IdSelection, Selection.IdStudent, Student.Name, Student.Major,
+        Selection.IdPresentation, Lesson.Name, Lesson.Major, Lesson.Unit, Master.Name, present.DayHold,
+        Selection.YearEducation, Selection.Score,
+    ).outerjoin(Student, Selection.IdStudent == Student.IdStudent) \
+     .outerjoin(present, Selection.IdPresentation == present.PresentationId)
+    query = services.join_presentation_names(query, present).order_by(Selection.IdSelection)
+
+    for (sel_id, student_id, st_name, st_major, present_id, l_name, l_major, unit, m_name, day_hold,
+         year, score) in query.yield_per(batch_size):
+        present_name = services.presentation_display_name(l_name, m_name, day_hold) if present_id else None
+        yield (sel_id, student_id, st_name or services.UNKNOWN_NAME, st_major, present_id, present_name,
+               l_name, l_major, unit, m_name, day_hold, year, score)
+
+
+def iter_transcripts(session, batch_size=10000):
+    """کارنامه هر دانشجو را به شکل dict با معدل وزنی و لیست دروس (به ترتیب شناسه دانشجو) برمی‌گرداند.
+
+    معدل همانند جدول خلاصه فقط از دروس نمره‌دار با تعداد واحد مشخص محاسبه می‌شود.
+    """
+    present = aliased(Presentation)
+    query = session.query(
+        Student.IdStudent, Student.Name, Student.Major, Student.EntranceTerm,
+        Selection.IdSelection, Lesson.Name, Lesson.Unit, Master.Name, Selection.YearEducation, Selection.Score,
+    ).outerjoin(Selection, Selection.IdStudent == Student.IdStudent) \
+     .outerjoin(present, Selection.IdPresentation == present.PresentationId)
+    query = services.join_presentation_names(query, present).order_by(Student.IdStudent, Selection.IdSelection)
+
+    for (student_id, name, major, term), rows in groupby(query.yield_per(batch_size), key=lambda row: row[:4]):
+        courses = [dict(zip(COURSE_COLUMNS, row[4:])) for row in rows if row[4] is not None]
+        weighted = units = 0
+        for course in courses:
+            if course['Score'] is not None and course['Unit'] is not None:
+                weighted += course['Score'] * course['Unit']
+                units += course['Unit']
+        yield {'IdStudent': student_id, 'StudentName': name, 'StudentMajor': major, 'EntranceTerm': term,
+               'Gpa': round(weighted / units, 2) if units else None, 'TotalUnits': units, 'Courses': courses}
+
+
+def _transcript_csv_rows(transcripts):
+    """هر کارنامه را به یک ردیف برای هر درس (یا یک ردیف خالی برای دانشجوی بدون درس) باز می‌کند."""
+    for transcript in transcripts:
+        student = tuple(transcript[column] for column in TRANSCRIPT_COLUMNS[:6])
+        if not transcript['Courses']:
+            yield student + (None,) * len(COURSE_COLUMNS)
+        for course in transcript['Courses']:
+            yield student + tuple(course[column] for column in COURSE_COLUMNS)
+
+
+def write_csv(path, columns, rows):
+    """ردیف‌ها را در فایل CSV بافر‌شده می‌نویسد و تعداد آن‌ها را برمی‌گرداند."""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8', buffering=BUFFER_SIZE) as handle:
+        writer = csv.writer(handle)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_jsonl(path, records):
+    """هر dict را در یک خط از فایل JSON Lines بافر‌شده می‌نویسد و تعداد آن‌ها را برمی‌گرداند."""
+    count = 0
+    with open(path, 'w', encoding='utf-8', buffering=BUFFER_SIZE) as handle:
+        for record in records:
+            handle.write(json.dumps(record, ensure_ascii=False))
+            handle.write('\n')
+            count += 1
+    return count
+
+
+def export(kind, path, file_format=None, batch_size=10000, session=None):
+    """یک خروجی کامل می‌نویسد و (تعداد رکوردها، ثانیه) را برمی‌گرداند."""
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+    session = session or Session()
+    started = time.perf_counter()
+
+    if kind == 'selections':
+        rows = iter_selection_rows(session, batch_size)
+        if file_format == 'csv':
+            count = write_csv(path, SELECTION_COLUMNS, rows)
+        else:
+            count = write_jsonl(path, (dict(zip(SELECTION_COLUMNS, row)) for row in rows))
+    else:
+        transcripts = iter_transcripts(session, batch_size)
+        if file_format == 'csv':
+            count = write_csv(path, TRANSCRIPT_COLUMNS, _transcript_csv_rows(transcripts))
+        else:
+            count = write_jsonl(path, transcripts)
+
+    return count, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="خروجی جریانی داده‌ها به CSV یا JSON Lines")
+    parser.add_argument('kind', choices=['selections', 'transcripts'], help="نوع خروجی")
+    parser.add_argument('path', help="مسیر فایل خروجی")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="قالب فایل (پیش‌فرض: از روی پسوند)")
+    parser.add_argument('--batch-size', type=int, default=10000, help="تعداد ردیف در هر دسته خواندن از دیتابیس")
+    parser.add_argument('--database-url', help="آدرس دیتابیس (پیش‌فرض: CHAMRAN_DATABASE_URL یا فایل chamran_uni.db)")
+    args = parser.parse_args(argv)
+
+    engine = configure_database(args.database_url) if args.database_url else get_engine()
+    migrate(engine)
+    count, elapsed = export(args.kind, args.path, args.format, args.batch_size)
+    rate = count / elapsed if elapsed else 0
+    print(f"{count} رکورد در {elapsed:.2f} ثانیه نوشته شد ({rate:,.0f} رکورد در ثانیه)")
+
+
+if __name__ == '__main__':
+    main()
+    close_database()
@@ -0,0 +1,325 @@
+"""ورود دسته‌ای استادان، دانشجویان، دروس، ارائه‌ها و نمرات از فایل CSV یا JSON Lines.
+
+فایل به صورت جریانی و در قطعه‌های (chunk) چندهزار ردیفی خوانده می‌شود؛ هر قطعه با یک
+INSERT چندردیفی (executemany) در یک تراکنش درج می‌شود. کلیدهای خارجی با کلیدهای طبیعی
+و از روی دیکشنری‌های درون حافظه پیدا می‌شوند و ردیف‌های نامعتبر در فایل رد‌شده‌ها نوشته می‌شوند.
+کل ورود یک عملیات در تاریخچه تغییرات است و با یک واگرد برمی‌گردد (رکوردهای حذف‌شده در جست‌وجوی
+کلیدها دیده نمی‌شوند).
+
+ستون‌های ورودی همان نام ستون‌های جدول هستند، به جز کلیدهای خارجی:
+    presentations: MasterMobile یا MasterName، LessonName و LessonMajor
+    selections:    StudentMobile یا StudentName، LessonName و LessonMajor،
+                   و در صورت وجود چند ارائه برای یک درس: MasterName و/یا DayHold
+
+نمونه:
+    python importer.py students students.csv --chunk-size 5000
+    python importer.py selections grades.jsonl --rejects grades.rejects.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from itertools import islice
+
+from sqlalchemy import func, insert, select
+
+from models import (Master, Lesson, Presentation, Student, Selection, JOURNAL_SKIPPED_COLUMNS, close_database,
+                    configure_database, get_engine, migrate, adjust_enrolled, apply_gpa_deltas, add_gpa_delta,
+                    bump_table_versions, open_change_set, write_journal)
+import services
+
+KINDS = {
+    'masters': Master,
+    'students': Student,
+    'lessons': Lesson,
+    'presentations': Presentation,
+    'selections': Selection,
+}
+
+AMBIGUOUS = object()
+
+
+def _index(pairs):
+    """دیکشنری کلید به شناسه؛ کلیدهای تکراری با AMBIGUOUS علامت می‌خورند."""
+    index = {}
+    for key, value in pairs:
+        index[key] = AMBIGUOUS if key in index and index[key] != value else value
+    return index
+
+
+class NaturalKeyLookups:
+    """دیکشنری‌های درون حافظه برای تبدیل کلیدهای طبیعی به شناسه‌ها (یک بار در شروع ورود ساخته می‌شوند)."""
+
+    def __init__(self, connection, kind):
+        self.masters_by_mobile = self.masters_by_name = {}
+        self.students_by_mobile = self.students_by_name = {}
+        self.lessons = {}
+        self.lesson_units = {}
+        self.presentations_by_lesson = defaultdict(list)
+        self.presentation_lessons = {}
+
+        if kind in ('presentations', 'selections'):
+            lessons = connection.execute(select(Lesson.LessonId, Lesson.Name, Lesson.Major, Lesson.Unit)
+                                         .where(Lesson.Deleted == 0)).all()
+            self.lessons = _index(((name, major), lesson_id) for lesson_id, name, major, unit in lessons)
+            self.lesson_units = {lesson_id: unit for lesson_id, name, major, unit in lessons}
+
+        if kind == 'presentations':
+            masters = connection.execute(select(Master.MasterId, Master.Name, Master.Mobile)
+                                         .where(Master.Deleted == 0)).all()
+            self.masters_by_mobile = _index((mobile, master_id) for master_id, name, mobile in masters)
+            self.masters_by_name = _index((name, master_id) for master_id, name, mobile in masters)
+
+        if kind == 'selections':
+            students = connection.execute(select(Student.IdStudent, Student.Name, Student.Mobile)
+                                          .where(Student.Deleted == 0)).all()
+            self.students_by_mobile = _index((mobile, student_id) for student_id, name, mobile in students)
+            self.students_by_name = _index((name, student_id) for student_id, name, mobile in students)
+
+            presentations = connection.execute(
+                select(Presentation.PresentationId, Presentation.LessonId, Master.Name, Presentation.DayHold)
+                .outerjoin(Master, Presentation.MasterId == Master.MasterId)
+                .where(Presentation.Deleted == 0))
+            for present_id, lesson_id, master_name, day_hold in presentations:
+                self.presentations_by_lesson[lesson_id].append((present_id, master_name, day_hold))
+                self.presentation_lessons[present_id] = lesson_id
+
+    @staticmethod
+    def _lookup(index, key, label):
+        found = index.get(key)
+        if found is None:
+            raise ValueError(f"'{label}' با مقدار '{key}' یافت نشد.")
+        if found is AMBIGUOUS:
+            raise ValueError(f"'{label}' با مقدار '{key}' مبهم است (چند رکورد با این مقدار وجود دارد).")
+        return found
+
+    def natural_key(self, db_field, row):
+        """کلید طبیعی یک فیلد کلید خارجی را از ستون‌های ردیف ورودی می‌سازد (یا '' اگر خالی باشد)."""
+        if db_field == 'MasterId':
+            if row.get('MasterMobile'):
+                return ('mobile', row['MasterMobile'])
+            return ('name', row['MasterName']) if row.get('MasterName') else ''
+        if db_field == 'IdStudent':
+            if row.get('StudentMobile'):
+                return ('mobile', row['StudentMobile'])
+            return ('name', row['StudentName']) if row.get('StudentName') else ''
+        if db_field == 'LessonId':
+            return (row['LessonName'], row.get('LessonMajor', '')) if row.get('LessonName') else ''
+        if db_field == 'IdPresentation':
+            if not row.get('LessonName'):
+                return ''
+            return (row['LessonName'], row.get('LessonMajor', ''), row.get('MasterName', ''), row.get('DayHold', ''))
+        return row.get(db_field, '')
+
+    def resolve(self, label, type_info, key):
+        fk_model = type_info[1]
+        if fk_model == Master:
+            index = self.masters_by_mobile if key[0] == 'mobile' else self.masters_by_name
+            return self._lookup(index, key[1], label)
+        if fk_model == Student:
+            index = self.students_by_mobile if key[0] == 'mobile' else self.students_by_name
+            return self._lookup(index, key[1], label)
+        if fk_model == Lesson:
+            return self._lookup(self.lessons, key, label)
+
+        lesson_name, lesson_major, master_name, day_hold = key
+        lesson_id = self._lookup(self.lessons, (lesson_name, lesson_major), label)
+        candidates = [present_id for present_id, m_name, day in self.presentations_by_lesson.get(lesson_id, [])
+                      if (not master_name or m_name == master_name) and (not day_hold or day == day_hold)]
+        if len(candidates) != 1:
+            state = "یافت نشد" if not candidates else "مبهم است؛ MasterName یا DayHold را مشخص کنید"
+            raise ValueError(f"ارائه درس '{lesson_name}' ({lesson_major}) {state}.")
+        return candidates[0]
+
+
+def read_rows(path, file_format):
+    """ردیف‌ها را به صورت جریانی (بدون بارگذاری کل فایل) به شکل dict با مقادیر متنی برمی‌گرداند."""
+    with open(path, newline='', encoding='utf-8-sig', buffering=1 << 20) as handle:
+        if file_format == 'csv':
+            for row in csv.DictReader(handle):
+                yield {key: (value or '').strip() for key, value in row.items() if key}
+        else:
+            for line in handle:
+                if line.strip():
+                    yield {key: '' if value is None else str(value).strip() for key, value in json.loads(line).items()}
+
+
+class RejectWriter:
+    """ردیف‌های رد‌شده را همراه با علت خطا در قالب فایل ورودی می‌نویسد (فایل فقط در صورت نیاز ساخته می‌شود)."""
+
+    def __init__(self, path, file_format):
+        self.path = path
+        self.file_format = file_format
+        self.handle = None
+        self.writer = None
+        self.count = 0
+
+    def write(self, row, error):
+        if self.handle is None:
+            self.handle = open(self.path, 'w', newline='', encoding='utf-8', buffering=1 << 20)
+        if self.file_format == 'csv':
+            if self.writer is None:
+                self.writer = csv.DictWriter(self.handle, fieldnames=[*row.keys(), 'Error'], extrasaction='ignore')
+                self.writer.writeheader()
+            self.writer.writerow({**row, 'Error': error})
+        else:
+            self.handle.write(json.dumps({**row, '_error': error}, ensure_ascii=False) + '\n')
+        self.count += 1
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+
+
+def _preallocates_ids(connection):
+    # RETURNING مرتب در SQLite به یک INSERT برای هر ردیف تبدیل می‌شود؛ شناسه‌ها از بیشترین شناسه فعلی داده
+    # می‌شوند و اگر همزمان ردیفی درج شده باشد برخورد کلید قطعه را به مسیر ردیف‌به‌ردیف می‌فرستد
+    return connection.dialect.name == 'sqlite'
+
+
+def _insert_chunk(connection, model, records):
+    """یک قطعه را با executemany درج می‌کند؛ اگر دیتابیس قطعه را نپذیرد، ردیف‌به‌ردیف درج و خطاها جدا می‌شوند.
+
+    ((ردیف، داده‌ها، شناسه)، خطاها) برمی‌گرداند؛ شناسه‌ها برای تاریخچه تغییرات لازم‌اند.
+    """
+    table = model.__table__
+    pk = table.c[model.__mapper__.primary_key[0].key]
+    try:
+        with connection.begin_nested():
+            if _preallocates_ids(connection):
+                start = connection.execute(select(func.coalesce(func.max(pk), 0))).scalar() + 1
+                ids = range(start, start + len(records))
+                connection.execute(insert(table), [{**data, pk.key: row_id}
+                                                   for (row, data), row_id in zip(records, ids)])
+            else:
+                ids = connection.execute(insert(table).returning(pk, sort_by_parameter_order=True),
+                                         [data for row, data in records]).scalars().all()
+        return [(row, data, row_id) for (row, data), row_id in zip(records, ids)], []
+    except Exception:
+        inserted, failed = [], []
+        for row, data in records:
+            try:
+                with connection.begin_nested():
+                    row_id = connection.execute(insert(table), data).inserted_primary_key[0]
+                inserted.append((row, data, row_id))
+            except Exception as e:
+                failed.append((row, f"خطای دیتابیس: {e.__class__.__name__}"))
+        return inserted, failed
+
+
+def _journal_entries(model, inserted):
+    pk_name = model.__mapper__.primary_key[0].key
+    return [(model.__tablename__, row_id, 'insert', None,
+             {pk_name: row_id, **{key: value for key, value in data.items() if key not in JOURNAL_SKIPPED_COLUMNS},
+              'Deleted': 0})
+            for row, data, row_id in inserted]
+
+
+def _selection_gpa_deltas(lookups, records):
+    deltas = defaultdict(lambda: [0.0, 0])
+    for row, data, row_id in records:
+        unit = lookups.lesson_units.get(lookups.presentation_lessons.get(data['IdPresentation']))
+        if data.get('Score') is None or unit is None:
+            continue
+        add_gpa_delta(deltas, data['IdStudent'], data.get('YearEducation'), data['Score'] * unit, unit)
+    return deltas
+
+
+def _enrolled_counts(records):
+    counts = defaultdict(int)
+    for row, data, row_id in records:
+        counts[data['IdPresentation']] += 1
+    return counts
+
+
+def import_file(kind, path, file_format=None, chunk_size=5000, rejects_path=None, bind=None, report=print):
+    """یک فایل را وارد می‌کند و (تعداد درج‌شده، تعداد رد‌شده، ثانیه) را برمی‌گرداند."""
+    model = KINDS[kind]
+    fields = services.FIELD_SPECS[model.__name__]
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+    if rejects_path is None:
+        base, ext = os.path.splitext(path)
+        rejects_path = f"{base}.rejects{ext or '.csv'}"
+
+    bind = bind or get_engine()
+    rejects = RejectWriter(rejects_path, file_format)
+    inserted_total = 0
+    change_set_id = None
+    started = time.perf_counter()
+
+    with bind.connect() as connection:
+        with connection.begin():
+            lookups = NaturalKeyLookups(connection, kind)
+        rows = read_rows(path, file_format)
+
+        chunk_no = 0
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            chunk_no += 1
+
+            records = []
+            for row in chunk:
+                raw_values = {db_field: lookups.natural_key(db_field, row) for label, db_field, *rest in fields}
+                try:
+                    records.append((row, services.parse_fields(fields, raw_values, lookups.resolve)))
+                except ValueError as e:
+                    rejects.write(row, str(e))
+
+            with connection.begin():
+                inserted, failed = _insert_chunk(connection, model, records) if records else ([], [])
+                if inserted:
+                    # همه قطعه‌ها یک عملیات تاریخچه‌اند که همراه اولین قطعه درج‌شده ثبت می‌شود
+                    if change_set_id is None:
+                        change_set_id = open_change_set(connection, f"ورود {kind} از {os.path.basename(path)}")
+                    write_journal(connection, change_set_id, _journal_entries(model, inserted))
+                if model == Selection and inserted:
+                    apply_gpa_deltas(connection, _selection_gpa_deltas(lookups, inserted))
+                    # نمرات واردشده سوابق ثبت‌نام‌اند، پس ظرفیت بررسی نمی‌شود و فقط شمارنده ارائه‌ها جلو می‌رود
+                    adjust_enrolled(connection, _enrolled_counts(inserted))
+
+            if inserted:
+                bump_table_versions(model.__tablename__)
+                if model == Selection:
+                    bump_table_versions(Presentation.__tablename__)
+            for row, error in failed:
+                rejects.write(row, error)
+            inserted_total += len(inserted)
+
+            elapsed = time.perf_counter() - started
+            report(f"قطعه {chunk_no}: {inserted_total} ردیف درج شد، {rejects.count} ردیف رد شد "
+                   f"({inserted_total / elapsed:,.0f} ردیف در ثانیه)")
+
+    rejects.close()
+    elapsed = time.perf_counter() - started
+    if rejects.count:
+        report(f"ردیف‌های رد‌شده در {rejects_path} نوشته شدند.")
+    return inserted_total, rejects.count, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ورود دسته‌ای داده‌ها از CSV یا JSON Lines")
+    parser.add_argument('kind', choices=sorted(KINDS), help="نوع داده‌ها")
+    parser.add_argument('path', help="مسیر فایل ورودی")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="قالب فایل (پیش‌فرض: از روی پسوند)")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="تعداد ردیف در هر تراکنش")
+    parser.add_argument('--rejects', help="مسیر فایل ردیف‌های رد‌شده")
+    parser.add_argument('--database-url', help="آدرس دیتابیس (پیش‌فرض: CHAMRAN_DATABASE_URL یا فایل chamran_uni.db)")
+    args = parser.parse_args(argv)
+
+    engine = configure_database(args.database_url) if args.database_url else get_engine()
+    migrate(engine)
+    inserted, rejected, elapsed = import_file(args.kind, args.path, args.format, args.chunk_size, args.rejects)
+    rate = inserted / elapsed if elapsed else 0
+    print(f"پایان: {inserted} ردیف درج شد، {rejected} ردیف رد شد، {elapsed:.2f} ثانیه ({rate:,.0f} ردیف در ثانیه)")
+    return 1 if rejected else 0
+
+
+if __name__ == '__main__':
+    status = main()
+    close_database()
+    sys.exit(status)
@@ -0,0 +1,269 @@
+"""تاریخچه تغییرات: واگرد / ازنو، حذف نرم و بازگردانی دسته‌ای از سطل بازیافت."""
+import json
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import and_, bindparam, func, select, update
+from sqlalchemy.orm import Session
+
+from models import (Base, ChangeJournal, ChangeSet, JOURNAL_TABLES, TABLE_LABELS, Lesson, Master, Presentation,
+                    PresentationFullError, Selection, Student, bump_table_versions, journal_changes,
+                    rebuild_gpa_summary, recount_enrolled)
+
+Model = type[Base]
+
+CHUNK_SIZE = 500
+# (مدل فرزند، ستون کلید خارجی، مدل والد): ردیفی که فرزند فعال دارد حذف نمی‌شود و فرزند بدون والد فعال برنمی‌گردد
+REFERENCES = [(Presentation, 'MasterId', Master), (Presentation, 'LessonId', Lesson),
+              (Selection, 'IdStudent', Student), (Selection, 'IdPresentation', Presentation)]
+
+ChangeSetInfo = namedtuple('ChangeSetInfo', 'change_set_id description created_at')
+# تغییر یک ردیف: مقدار فعلی ستون‌های expected باید همان باشد تا ستون‌های target نوشته شوند
+Change = namedtuple('Change', 'model row_id expected target')
+
+
+class UndoConflictError(ValueError):
+    """ردیف‌های یک عملیات پس از آن تغییر کرده‌اند و واگرد / ازنو آن تغییرات را بازنویسی می‌کرد."""
+
+
+class DependentRecordsError(ValueError):
+    """حذف ردیفی که رکورد فعالی به آن وابسته است، یا بازگردانی ردیفی که والد آن حذف شده است."""
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+def _pk(model: Model):
+    return model.__table__.c[model.__mapper__.primary_key[0].key]
+
+
+def _label(model: Model) -> str:
+    return TABLE_LABELS.get(model.__tablename__, model.__tablename__)
+
+
+def _current_rows(connection, model, row_ids):
+    pk = _pk(model)
+    rows = {}
+    for chunk in _chunks(row_ids):
+        for row in connection.execute(select(model.__table__).where(pk.in_(chunk))).mappings():
+            rows[row[pk.key]] = row
+    return rows
+
+
+def _check_references(connection, by_model):
+    """پس از نوشتن (داخل همان تراکنش): والد حذف‌شده فرزند فعال ندارد و فرزند فعال‌شده والد فعال دارد."""
+    for child, fk, parent in REFERENCES:
+        child_table, parent_table = child.__table__, parent.__table__
+        removed = [change.row_id for change in by_model.get(parent, ()) if change.target.get('Deleted') == 1]
+        for chunk in _chunks(removed):
+            count = connection.execute(select(func.count()).select_from(child_table).where(
+                child_table.c[fk].in_(chunk), child_table.c.Deleted == 0)).scalar()
+            if count:
+                raise DependentRecordsError(
+                    f"{count} {_label(child)} فعال به این {_label(parent)} وابسته است؛ ابتدا آن‌ها را حذف کنید.")
+
+        revived = [change.row_id for change in by_model.get(child, ())
+                   if change.target.get('Deleted') == 0 or fk in change.target]
+        parent_pk = _pk(parent)
+        for chunk in _chunks(revived):
+            count = connection.execute(
+                select(func.count())
+                .select_from(child_table.outerjoin(
+                    parent_table, and_(parent_pk == child_table.c[fk], parent_table.c.Deleted == 0)))
+                .where(_pk(child).in_(chunk), child_table.c.Deleted == 0, parent_pk.is_(None))).scalar()
+            if count:
+                raise DependentRecordsError(
+                    f"{_label(parent)} مربوط به {count} {_label(child)} حذف شده است؛ ابتدا آن را بازگردانی کنید.")
+
+
+def _rebuild_derived(connection, by_model, current):
+    """معدل دانشجویان و شمارنده ثبت‌نام ارائه‌هایی که این تغییرات رویشان اثر دارد از نو ساخته می‌شوند."""
+    students, presentations = set(), set()
+    for change in by_model.get(Selection, ()):
+        old = current[Selection][change.row_id]
+        for column, ids in (('IdStudent', students), ('IdPresentation', presentations)):
+            ids.add(old[column])
+            ids.add(change.target.get(column, old[column]))
+
+    # تغییر واحد درس یا درس ارائه، معدل همه دانشجویان آن ارائه‌ها را عوض می‌کند
+    lessons = [change.row_id for change in by_model.get(Lesson, ()) if 'Unit' in change.target]
+    moved = [change.row_id for change in by_model.get(Presentation, ()) if 'LessonId' in change.target]
+    for column, ids in ((Presentation.LessonId, lessons), (Presentation.PresentationId, moved)):
+        for chunk in _chunks(ids):
+            students.update(connection.execute(
+                select(Selection.IdStudent).distinct()
+                .join(Presentation, Selection.IdPresentation == Presentation.PresentationId)
+                .where(column.in_(chunk))).scalars())
+    presentations.update(change.row_id for change in by_model.get(Presentation, ()))
+
+    students.discard(None)
+    presentations.discard(None)
+    for chunk in _chunks(students):
+        rebuild_gpa_summary(connection, chunk)
+    if presentations:
+        recount_enrolled(connection, presentations)
+    presentation = Presentation.__table__
+    for chunk in _chunks(presentations):
+        full = connection.execute(select(func.count()).select_from(presentation).where(
+            presentation.c.PresentationId.in_(chunk), presentation.c.Capacity.is_not(None),
+            presentation.c.Enrolled > presentation.c.Capacity)).scalar()
+        if full:
+            raise PresentationFullError(f"ظرفیت {full} ارائه با این تغییر از حد مجاز بیشتر می‌شود.")
+
+
+def _apply_changes(connection, changes) -> set[str]:
+    """تغییرات را برای هر (جدول، ستون‌ها) با یک UPDATE executemany اعمال و نام جدول‌های اثرگرفته را برمی‌گرداند."""
+    by_model = defaultdict(list)
+    for change in changes:
+        by_model[change.model].append(change)
+
+    current = {}
+    for model, items in by_model.items():
+        rows = current[model] = _current_rows(connection, model, [change.row_id for change in items])
+        stale = sum(1 for change in items if change.row_id not in rows
+                    or any(rows[change.row_id][column] != value for column, value in change.expected.items()))
+        if stale:
+            raise UndoConflictError(f"{stale} {_label(model)} پس از این عملیات تغییر کرده یا دیگر وجود ندارد؛ "
+                                    "ابتدا تغییرات بعدی را واگرد کنید.")
+
+    groups = defaultdict(list)
+    for change in changes:
+        columns = tuple(sorted(column for column in change.target if column != _pk(change.model).key))
+        groups[(change.model, columns)].append(change)
+    for (model, columns), items in groups.items():
+        if not columns:
+            continue
+        connection.execute(
+            update(model.__table__).where(_pk(model) == bindparam('b_pk'))
+            .values({column: bindparam(f'b_{column}') for column in columns}),
+            [{'b_pk': change.row_id, **{f'b_{column}': change.target[column] for column in columns}}
+             for change in items])
+
+    _check_references(connection, by_model)
+    _rebuild_derived(connection, by_model, current)
+    tables = {model.__tablename__ for model in by_model}
+    if Selection in by_model:
+        tables.add(Presentation.__tablename__)  # شمارنده ثبت‌نام
+    return tables
+
+
+# --- حذف نرم و بازگردانی ---
+
+def _set_deleted(session: Session, model: Model, ids, deleted: int, action: str, description: str | None) -> int:
+    table, pk = model.__table__, _pk(model)
+    try:
+        connection = session.connection()
+        targets = []
+        for chunk in _chunks(ids):
+            targets.extend(connection.execute(
+                select(pk).where(pk.in_(chunk), table.c.Deleted == 1 - deleted)).scalars())
+        if targets:
+            changes = [Change(model, row_id, {'Deleted': 1 - deleted}, {'Deleted': deleted}) for row_id in targets]
+            tables = _apply_changes(connection, changes)
+            journal_changes(session, [(model.__tablename__, change.row_id, action, change.expected, change.target)
+                                      for change in changes], description)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    if targets:
+        bump_table_versions(*tables)
+    return len(targets)
+
+
+def delete_records(session: Session, model: Model, ids, description: str | None = None) -> int:
+    """ردیف‌ها را (نرم) حذف و تعدادشان را برمی‌گرداند؛ با رکورد فعال وابسته DependentRecordsError می‌دهد."""
+    return _set_deleted(session, model, ids, 1, 'delete', description)
+
+
+def restore_records(session: Session, model: Model, ids, description: str | None = None) -> int:
+    """ردیف‌های حذف‌شده را با یک UPDATE دسته‌ای بازمی‌گرداند و تعداد آن‌ها را برمی‌گرداند."""
+    return _set_deleted(session, model, ids, 0, 'restore', description)
+
+
+# --- واگرد و ازنو ---
+
+def _info(row) -> ChangeSetInfo | None:
+    return ChangeSetInfo(row.ChangeSetId, row.Description, row.CreatedAt) if row is not None else None
+
+
+def _next_undo(connection):
+    change_set = ChangeSet.__table__
+    return connection.execute(select(change_set).where(change_set.c.Undone == 0)
+                              .order_by(change_set.c.ChangeSetId.desc()).limit(1)).first()
+
+
+def _next_redo(connection):
+    # عملیات واگردشده به ترتیب عکس واگرد دوباره اعمال می‌شوند؛ عملیاتی که پس از واگرد آن عملیات تازه‌ای ثبت
+    # شده (Undone کوچک‌تر از بزرگ‌ترین شناسه) دیگر قابل ازنو نیست
+    change_set = ChangeSet.__table__
+    latest = select(func.max(change_set.c.ChangeSetId)).scalar_subquery()
+    return connection.execute(select(change_set).where(change_set.c.Undone > 0, change_set.c.Undone >= latest)
+                              .order_by(change_set.c.ChangeSetId).limit(1)).first()
+
+
+def undo_state(session: Session) -> tuple[ChangeSetInfo | None, ChangeSetInfo | None]:
+    """(عملیاتی که واگرد برمی‌گرداند، عملیاتی که ازنو دوباره اعمال می‌کند)؛ هر کدام ممکن است None باشد."""
+    connection = session.connection()
+    return _info(_next_undo(connection)), _info(_next_redo(connection))
+
+
+def _merged_changes(connection, change_set_id, undoing):
+    """ورودی‌های یک عملیات را برای هر ردیف به یک تغییر تبدیل می‌کند (ردیفی که چند بار در عملیات تغییر کرده)."""
+    journal = ChangeJournal.__table__
+    merged = {}
+    for table_name, row_id, action, before, after in connection.execute(
+            select(journal.c.TableName, journal.c.RowId, journal.c.Action, journal.c.Before, journal.c.After)
+            .where(journal.c.ChangeSetId == change_set_id).order_by(journal.c.EntryId)):
+        before, after = json.loads(before) if before else {}, json.loads(after) if after else {}
+        item = merged.get((table_name, row_id))
+        if item is None:
+            merged[(table_name, row_id)] = [action == 'insert', before, after]
+            continue
+        for column, value in before.items():
+            item[1].setdefault(column, value)
+        item[2].update(after)
+
+    changes = []
+    for (table_name, row_id), (inserted, before, after) in merged.items():
+        if inserted:
+            before = {'Deleted': 1}  # پیش از درج ردیفی نبود: واگرد درج آن را حذف (نرم) می‌کند
+        expected, target = (after, before) if undoing else (before, after)
+        changes.append(Change(JOURNAL_TABLES[table_name], row_id, expected, target))
+    return changes
+
+
+def _replay(session: Session, undoing: bool) -> ChangeSetInfo | None:
+    change_set = ChangeSet.__table__
+    tables = set()
+    try:
+        connection = session.connection()
+        row = _next_undo(connection) if undoing else _next_redo(connection)
+        if row is not None:
+            tables = _apply_changes(connection, _merged_changes(connection, row.ChangeSetId, undoing))
+            current = change_set.c.Undone == 0 if undoing else change_set.c.Undone > 0
+            latest = select(func.max(change_set.c.ChangeSetId)).scalar_subquery()
+            result = connection.execute(
+                update(change_set).where(change_set.c.ChangeSetId == row.ChangeSetId, current)
+                .values(Undone=latest if undoing else 0))
+            if result.rowcount != 1:
+                raise UndoConflictError("این عملیات همزمان توسط کاربر دیگری واگرد یا ازنو شده است.")
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    if tables:
+        bump_table_versions(*tables)
+    return _info(row)
+
+
+def undo(session: Session) -> ChangeSetInfo | None:
+    """آخرین عملیات فعال را برمی‌گرداند (یا None)؛ اگر ردیف‌هایش بعداً تغییر کرده باشند UndoConflictError می‌دهد."""
+    return _replay(session, undoing=True)
+
+
+def redo(session: Session) -> ChangeSetInfo | None:
+    """آخرین عملیات واگردشده را دوباره اعمال می‌کند؛ اگر چیزی برای ازنو نباشد None برمی‌گرداند."""
+    return _replay(session, undoing=False)
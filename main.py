@@ -1,87 +1,51 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Float, func
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from sqlalchemy.exc import IntegrityError
+import argparse
 import os
+import sys
 
-# ---------------------------------------------------------
-# بخش ۱: تنظیمات دیتابیس و مدل‌ها (SQLAlchemy Code-First)
-# ---------------------------------------------------------
+from models import (Master, Lesson, Presentation, Student, Selection, Session, close_database, configure_database,
+                    get_engine, migrate, PresentationFullError, rebuild_gpa_summary, verify_gpa_summary)
+import diagnostics
+import journal
+import schedule
+import services
+from workers import QueryRunner
 
-DB_FILE = 'chamran_uni.db'
-Base = declarative_base()
-
-# --- تعریف مدل‌ها ---
-
-class Master(Base):
-    __tablename__ = 'Master'
-    MasterId = Column(Integer, primary_key=True, autoincrement=True)
-    Name = Column(String(100), nullable=False) 
-    Graduation = Column(String(50))
-    Mobile = Column(String(20), nullable=False)
-    Email = Column(String(100), nullable=True)
-    presentations = relationship("Presentation", back_populates="master")
-    COLUMNS = {"ID": "MasterId", "نام استاد": "Name", "مدرک": "Graduation", "موبایل": "Mobile", "ایمیل": "Email"}
-
-class Lesson(Base):
-    __tablename__ = 'Lesson'
-    LessonId = Column(Integer, primary_key=True, autoincrement=True)
-    Name = Column(String(100), nullable=False)
-    Unit = Column(Integer, nullable=False)     
-    Major = Column(String(50), nullable=False) 
-    presentations = relationship("Presentation", back_populates="lesson") 
-    COLUMNS = {"ID": "LessonId", "نام درس": "Name", "تعداد واحد": "Unit", "رشته": "Major"}
-
-class Presentation(Base):
-    __tablename__ = 'Presentation'
-    PresentationId = Column(Integer, primary_key=True, autoincrement=True)
-    MasterId = Column(Integer, ForeignKey('Master.MasterId'), nullable=False)
-    LessonId = Column(Integer, ForeignKey('Lesson.LessonId'), nullable=False)
-    DayHold = Column(String(50))
-    StartTime = Column(Integer)
-    FinishTime = Column(Integer)
-    master = relationship("Master", back_populates="presentations")
-    lesson = relationship("Lesson", back_populates="presentations") 
-    selections = relationship("Selection", back_populates="presentation")
-    COLUMNS = {"ID": "PresentationId", "نام استاد": "MasterId", "نام درس": "LessonId", "روز": "DayHold", "شروع": "StartTime", "پایان": "FinishTime"}
-
-class Student(Base):
-    __tablename__ = 'Student'
-    IdStudent = Column(Integer, primary_key=True, autoincrement=True)
-    Name = Column(String(100), nullable=False)
-    EntranceTerm = Column(String(10)) 
-    Graduation = Column(String(50))
-    Mobile = Column(String(20), nullable=False)
-    Email = Column(String(100), nullable=True)
-    Major = Column(String(50), nullable=False) 
-    selections = relationship("Selection", back_populates="student")
-    COLUMNS = {"ID": "IdStudent", "نام دانشجو": "Name", "ترم ورود": "EntranceTerm", "مقطع": "Graduation", "موبایل": "Mobile", "ایمیل": "Email", "رشته": "Major"}
-
-class Selection(Base):
-    __tablename__ = 'Selection'
-    IdSelection = Column(Integer, primary_key=True, autoincrement=True)
-    IdStudent = Column(Integer, ForeignKey('Student.IdStudent'), nullable=False)
-    IdPresentation = Column(Integer, ForeignKey('Presentation.PresentationId'), nullable=False)
-    Score = Column(Float, nullable=True) 
-    YearEducation = Column(Integer)
-    student = relationship("Student", back_populates="selections")
-    presentation = relationship("Presentation", back_populates="selections")
-    COLUMNS = {"ID": "IdSelection", "نام دانشجو": "IdStudent", "درس ارائه شده": "IdPresentation", "نمره": "Score", "سال": "YearEducation"}
-
-
-# پیکربندی اتصال
-engine = create_engine(f'sqlite:///{DB_FILE}', echo=False)
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
+PAGE_SIZE = int(os.environ.get('CHAMRAN_PAGE_SIZE', '200'))
+# تعداد threadهای اجرای کوئری؛ 0 یعنی اجرای همه کوئری‌ها در thread رابط کاربری (حالت قدیمی)
+QUERY_WORKERS = int(os.environ.get('CHAMRAN_QUERY_WORKERS', '4'))
+# منوهای کشویی قابل جستجو فقط این تعداد نتیجه را نمایش می‌دهند؛ جستجو پس از این مکث در تایپ اجرا می‌شود
+SEARCH_LIMIT = 50
+SEARCH_DELAY_MS = 250
+# گزارش تداخل‌ها فقط این تعداد ردیف را در جدول نمایش می‌دهد (تعداد کل جداگانه شمرده می‌شود)
+CONFLICT_LIMIT = 500
+# سطل بازیافت فقط این تعداد از آخرین رکوردهای حذف‌شده را نمایش می‌دهد (تعداد کل جداگانه شمرده می‌شود)
+TRASH_LIMIT = 500
+# گروه‌بندی‌های تب آمار نمرات و برچسب «بدون فیلتر» منوهای سال و رشته آن
+STATS_GROUPINGS = {'درس': 'lesson', 'استاد': 'master'}
+ALL_LABEL = 'همه'
+# نقاط ورودی که با --profile (یا CHAMRAN_PROFILE=1) اندازه‌گیری می‌شوند
+PROFILED_METHODS = ('on_tab_change', 'load_data', 'load_page', 'load_foreign_key_comboboxes', 'run_search',
+                    'add_record', 'update_record', 'delete_record', 'calculate_average', 'load_top_students',
+                    'load_conflicts', 'load_grade_stats', 'load_gradebook', 'save_gradebook', 'undo_last',
+                    'redo_last', 'load_trash', 'restore_trash')
+PROFILED_SERVICES = ('fetch_display_page', 'count_rows', 'fetch_combo_options', 'fetch_search_entries',
+                     'rank_students', 'fetch_gradebook', 'save_scores', 'fetch_deleted_rows')
 
 # ---------------------------------------------------------
-# بخش ۲: رابط کاربری (GUI با Tkinter)
+# رابط کاربری (GUI با Tkinter)
 # ---------------------------------------------------------
 
 class ChamranApp:
-    def __init__(self, root):
+    def __init__(self, root, page_size=PAGE_SIZE, query_workers=QUERY_WORKERS, profiler=None):
         self.root = root
+        self.profiler = profiler
+        if profiler is not None:
+            # پیش از ساخت ویجت‌ها، تا bindها و دکمه‌ها هم نسخه اندازه‌گیری‌شده را صدا بزنند
+            profiler.wrap(self, *PROFILED_METHODS)
+        self.page_size = page_size
         self.root.title("سیستم مدیریت آموزشی دانشگاه چمران")
         self.root.geometry("1000x750") 
         
@@ -94,56 +58,58 @@ class ChamranApp:
             
         self.session = Session()
         self.setup_styles()
+        self.create_status_bar()
+        self.queries = QueryRunner(root, query_workers, inline_session=self.session,
+                                   on_error=self.show_query_error, on_busy=self.set_loading, profiler=profiler)
 
-        self.majors_list = ['کامپیوتر', 'برق', 'عمران', 'مکانیک', 'معماری', 'سایر']
-        self.week_days = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه']
-        self.id_to_name_map = {} 
+        self.majors_list = services.MAJORS
+        self.week_days = services.WEEK_DAYS
+        self.combo_cache = services.ComboOptionsCache()
+        self.search_timers = {}
         self.combo_fk_cache = {} 
+        self.rankings = {}
+        self.rankings_version = 0
+        self.stats_histograms = {}
+        # ویجت‌ها و داده هر تب در اولین انتخاب آن ساخته می‌شوند: اندیس تب -> تابع سازنده
+        self.tab_builders = {}
+        self.current_tab = None
 
         self.tabs_info = {
             'Student': {'text': 'دانشجو', 'model': Student, 'id_field': 'IdStudent', 
-                        'fields': [("نام دانشجو", "Name"), 
-                                   ("ترم ورود", "EntranceTerm", "str_term_3_digit"), 
-                                   ("مقطع", "Graduation"), 
-                                   ("موبایل", "Mobile"), ("ایمیل", "Email", "str_optional"),
-                                   ("رشته تحصیلی", "Major", "combo", self.majors_list)]},
+                        'fields': services.FIELD_SPECS['Student']},
             'Master': {'text': 'استاد', 'model': Master, 'id_field': 'MasterId', 
-                       'fields': [("نام استاد", "Name"), ("مدرک", "Graduation"), 
-                                  ("موبایل", "Mobile"), ("ایمیل", "Email", "str_optional")]},
+                       'fields': services.FIELD_SPECS['Master']},
             'Lesson': {'text': 'درس', 'model': Lesson, 'id_field': 'LessonId', 
-                       'fields': [("نام درس", "Name"), ("تعداد واحد", "Unit", "int"),
-                                  ("رشته تحصیلی", "Major", "combo", self.majors_list)]},
+                       'fields': services.FIELD_SPECS['Lesson']},
             'Presentation': {'text': 'ارائه', 'model': Presentation, 'id_field': 'PresentationId', 
-                             'fields': [
-                                 ("استاد", "MasterId", "combo_fk", Master, 'MasterId', 'Name'), 
-                                 ("درس", "LessonId", "combo_fk", Lesson, 'LessonId', 'Name'),   
-                                 ("روز برگزاری", "DayHold", "combo", self.week_days),
-                                 ("ساعت شروع", "StartTime", "int_optional"), 
-                                 ("ساعت پایان", "FinishTime", "int_optional")]},
+                             'fields': services.FIELD_SPECS['Presentation']},
             'Selection': {'text': 'وضعیت دروس دانشجو', 'model': Selection, 'id_field': 'IdSelection', 
-                          'fields': [
-                              ("رشته تحصیلی", "MajorFilter", "combo_major_filter", self.majors_list), 
-                              ("دانشجو", "IdStudent", "combo_fk_filtered", Student, 'IdStudent', 'Name'), 
-                              ("درس (ارائه)", "IdPresentation", "combo_fk_filtered", Presentation, 'PresentationId', 'Display'), 
-                              ("سال تحصیلی", "YearEducation", "int_optional"), 
-                              ("نمره", "Score", "float_optional")]},
+                          'fields': services.FIELD_SPECS['Selection']},
         }
 
+        self.create_toolbar()
         self.tab_control = ttk.Notebook(root)
         
         for key, info in self.tabs_info.items():
-            frame = ttk.Frame(self.tab_control)
-            self.tab_control.add(frame, text=info['text'])
-            info['frame'] = frame
-            self.create_generic_tab(info)
-            self.load_foreign_key_comboboxes(key) 
+            info['frame'] = self.add_lazy_tab(info['text'], lambda info=info: self.create_generic_tab(info))
 
-        self.tab_report = ttk.Frame(self.tab_control)
-        self.tab_control.add(self.tab_report, text='گزارش (میانگین نمرات)')
-        self.create_report_tab()
+        self.tab_report = self.add_lazy_tab('گزارش (میانگین نمرات)', self.create_report_tab)
+        self.tab_stats = self.add_lazy_tab('آمار نمرات دروس و استادان', self.create_stats_tab)
+        self.tab_gradebook = self.add_lazy_tab('ثبت نمرات ارائه', self.create_gradebook_tab)
+        self.tab_trash = self.add_lazy_tab('سطل بازیافت', self.create_trash_tab)
+        if profiler is not None:
+            self.tab_diagnostics = self.add_lazy_tab('عیب‌یابی کارایی', self.create_diagnostics_tab)
 
         self.tab_control.pack(expand=1, fill="both")
         self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_change)
+        # فقط تب اول پیش از نمایش پنجره ساخته و بارگذاری می‌شود
+        self.on_tab_change(None)
+
+    def add_lazy_tab(self, text, build):
+        frame = ttk.Frame(self.tab_control)
+        self.tab_control.add(frame, text=text)
+        self.tab_builders[self.tab_control.index(frame)] = build
+        return frame
 
     def setup_styles(self):
         style = ttk.Style()
@@ -155,72 +121,120 @@ class ChamranApp:
         style.configure("Treeview.Heading", font=self.header_font, background="#e7e7e7")
         style.configure("Treeview", font=self.main_font)
 
+    def create_status_bar(self):
+        """نوار پایین پنجره که هنگام اجرای کوئری‌ها در پس‌زمینه نشانگر بارگذاری را نمایش می‌دهد."""
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill="x")
+        self.loading_label = ttk.Label(status_frame, text="")
+        self.loading_bar = ttk.Progressbar(status_frame, mode='indeterminate', length=150)
+
+    def create_toolbar(self):
+        """دکمه‌های واگرد و ازنو بالای تب‌ها (Ctrl+Z و Ctrl+Y)."""
+        toolbar = ttk.Frame(self.root)
+        toolbar.pack(side=tk.TOP, fill="x", padx=10, pady=(5, 0))
+        ttk.Button(toolbar, text="↶ واگرد", command=self.undo_last).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(toolbar, text="↷ ازنو", command=self.redo_last).pack(side=tk.RIGHT, padx=2)
+        self.root.bind('<Control-z>', lambda event: self.undo_last())
+        self.root.bind('<Control-y>', lambda event: self.redo_last())
+
+    def set_loading(self, busy):
+        if busy:
+            self.loading_label.config(text="در حال بارگذاری...")
+            self.loading_label.pack(side=tk.RIGHT, padx=10)
+            self.loading_bar.pack(side=tk.RIGHT, padx=10, pady=4)
+            self.loading_bar.start(10)
+            self.root.config(cursor='watch')
+        else:
+            self.loading_bar.stop()
+            self.loading_bar.pack_forget()
+            self.loading_label.pack_forget()
+            self.root.config(cursor='')
+
+    def show_query_error(self, error):
+        messagebox.showerror("خطای پایگاه داده", f"خطا: {error}")
+
     # ------------------ توابع کمکی برای UI داینامیک ------------------
 
     def load_foreign_key_comboboxes(self, tab_key):
-        """منوهای کشویی کلید خارجی در یک تب مشخص را مجدداً بارگذاری می‌کند."""
+        """منوهای کشویی کلید خارجی در یک تب مشخص را مجدداً (در پس‌زمینه) بارگذاری می‌کند."""
         info = self.tabs_info[tab_key]
+        fk_fields = [(db_field, type_info[1], type_info[2], type_info[3])
+                     for label, db_field, *type_info in info['fields']
+                     if type_info and type_info[0] == 'combo_fk' and (tab_key, db_field) in self.combo_fk_cache]
+        if not fk_fields:
+            return
+
+        def job(session):
+            return [(db_field, fk_model, self.combo_cache.get(session, fk_model, fk_id_field, fk_name_field))
+                    for db_field, fk_model, fk_id_field, fk_name_field in fk_fields]
+
+        def done(results):
+            for db_field, fk_model, loaded in results:
+                # اگر cache در این فاصله با یک CRUD به‌روز شده، همان نسخه به‌روز نمایش داده می‌شود
+                options, id_to_name = self.combo_cache.peek(fk_model) or loaded
+                combo_widget = self.combo_fk_cache[(tab_key, db_field)]
+                current_value = combo_widget.get()
+                combo_widget['values'] = options
+                if current_value in options:
+                    combo_widget.set(current_value)
+                else:
+                    combo_widget.set('')
+
+        self.queries.submit((tab_key, 'combos'), job, done)
         
-        for label, db_field, *type_info in info['fields']:
-            field_type = type_info[0] if type_info else 'str'
-            
-            if field_type == 'combo_fk':
-                fk_model = type_info[1]
-                fk_id_field = type_info[2]
-                fk_name_field = type_info[3]
-                
-                combo_widget = self.combo_fk_cache.get((tab_key, db_field))
-                if combo_widget:
-                    options = self.fetch_combo_options(fk_model, fk_id_field, fk_name_field)
-                    current_value = combo_widget.get()
-                    combo_widget['values'] = options
-                    if current_value in options:
-                        combo_widget.set(current_value)
-                    else:
-                        combo_widget.set('')
-        
-    def fetch_combo_options(self, fk_model, fk_id_field, fk_name_field, major_filter=None):
-        """داده‌ها را از دیتابیس واکشی کرده و map ID به Name را می‌سازد (همراه با فیلتر رشته)."""
-        query = self.session.query(fk_model)
-        
-        if major_filter and major_filter != "سایر":
-            if fk_model == Student:
-                query = query.filter(Student.Major == major_filter)
-            elif fk_model == Lesson:
-                query = query.filter(Lesson.Major == major_filter)
-        
-        options = []
-        id_to_name = {}
-        
-        for record in query.all():
-            record_id = getattr(record, fk_id_field)
-            
-            if fk_model == Presentation:
-                master_name = record.master.Name if record.master else 'نامشخص'
-                lesson_name = record.lesson.Name if record.lesson else 'نامشخص'
-                display_name = f"{lesson_name} ({master_name}, {record.DayHold})"
-            else:
-                display_name = getattr(record, fk_name_field)
-            
-            id_to_name[display_name] = record_id
-            options.append(display_name)
-        
-        self.id_to_name_map[(fk_model.__name__, major_filter)] = id_to_name
-        return sorted(options)
-    
-    def update_filtered_combos(self, major):
-        """Comboboxهای دانشجو و ارائه را بر اساس رشته تحصیلی انتخاب شده فیلتر می‌کند."""
+    def update_filtered_combos(self, major, selected=None):
+        """Comboboxهای دانشجو و ارائه را بر اساس رشته تحصیلی انتخاب شده فیلتر می‌کند.
+
+        selected مقادیری است که پس از بارگذاری گزینه‌ها باید انتخاب‌شده بمانند (مثلاً هنگام انتخاب یک ردیف).
+        """
         info = self.tabs_info['Selection']
-        
-        student_combo = info['entries']['IdStudent']
-        student_options = self.fetch_combo_options(Student, 'IdStudent', 'Name', major_filter=major)
-        student_combo['values'] = student_options
-        student_combo.set('') 
+        selected = selected or {}
+        fk_fields = [('IdStudent', Student, 'IdStudent', 'Name'),
+                     ('IdPresentation', Presentation, 'PresentationId', 'Display')]
+
+        for db_field, *rest in fk_fields:
+            info['entries'][db_field].set(selected.get(db_field, ''))
+
+        def job(session):
+            return [self.combo_cache.get(session, fk_model, fk_id_field, fk_name_field, major_filter=major)
+                    for db_field, fk_model, fk_id_field, fk_name_field in fk_fields]
+
+        def done(results):
+            for (db_field, fk_model, *rest), loaded in zip(fk_fields, results):
+                options, id_to_name = self.combo_cache.peek(fk_model, major) or loaded
+                info['entries'][db_field]['values'] = options[:SEARCH_LIMIT]
+
+        # انتخاب دوباره رشته، نتیجه درخواست قبلی همین کانال را بی‌اثر می‌کند
+        self.queries.submit(('Selection', 'major_filter'), job, done)
+
+    def schedule_search(self, event, tab_key, db_field):
+        """جستجوی منوی کشویی را تا مکث کاربر در تایپ به تعویق می‌اندازد (debounce)."""
+        if event.keysym in ('Up', 'Down', 'Return', 'Tab', 'Escape'):
+            return
+        timer = self.search_timers.pop((tab_key, db_field), None)
+        if timer:
+            self.root.after_cancel(timer)
+        self.search_timers[(tab_key, db_field)] = self.root.after(
+            SEARCH_DELAY_MS, lambda: self.run_search(tab_key, db_field))
+
+    def run_search(self, tab_key, db_field):
+        """K گزینه اول منطبق با متن تایپ‌شده را از اندیس پیشوندی cache در منوی کشویی قرار می‌دهد."""
+        self.search_timers.pop((tab_key, db_field), None)
+        info = self.tabs_info[tab_key]
+        widget = info['entries'][db_field]
+        label, db_field, field_type, fk_model, fk_id_field, fk_name_field = next(
+            field for field in info['fields'] if field[1] == db_field)
+        major = info['entries']['MajorFilter'].get() if 'MajorFilter' in info['entries'] else None
+        text = widget.get()
+
+        def job(session):
+            return self.combo_cache.search(session, fk_model, fk_id_field, fk_name_field, major, text, SEARCH_LIMIT)
+
+        def done(names):
+            if widget.get() == text:
+                widget['values'] = names
 
-        presentation_combo = info['entries']['IdPresentation']
-        presentation_options = self.fetch_combo_options(Presentation, 'PresentationId', 'Display', major_filter=major)
-        presentation_combo['values'] = presentation_options
-        presentation_combo.set('') 
+        self.queries.submit((tab_key, 'search', db_field), job, done)
 
     # ------------------ توابع عمومی CRUD و UI ------------------
     
@@ -260,7 +274,10 @@ class ChamranApp:
                     widget.bind('<<ComboboxSelected>>', lambda event, combo=widget: self.update_filtered_combos(combo.get()))
                 
                 elif field_type == 'combo_fk_filtered': 
+                    # قابل تایپ: گزینه‌ها با جستجوی پیشوندی (و نه کل لیست) پر می‌شوند
+                    widget.configure(state='normal')
                     widget['values'] = []
+                    widget.bind('<KeyRelease>', lambda event, k=tab_key, f=db_field: self.schedule_search(event, k, f))
                 
             else: 
                 entry = ttk.Entry(input_frame, width=20)
@@ -275,24 +292,68 @@ class ChamranApp:
         ttk.Button(btn_frame, text="❌ حذف رکورد", command=lambda: self.delete_record(model, info)).pack(side=tk.LEFT, padx=10)
         ttk.Button(btn_frame, text="🔃 بازخوانی لیست", command=lambda: self.load_data_and_combos(tab_key)).pack(side=tk.LEFT, padx=10)
 
+        pager_frame = ttk.Frame(frame)
+        pager_frame.pack(side=tk.BOTTOM, fill="x", padx=20, pady=(0, 10))
+
+        ttk.Button(pager_frame, text="⏮ ابتدا", command=lambda: self.load_page(info, 'first')).pack(side=tk.LEFT, padx=5)
+        ttk.Button(pager_frame, text="◀ قبلی", command=lambda: self.load_page(info, 'prev')).pack(side=tk.LEFT, padx=5)
+        ttk.Button(pager_frame, text="بعدی ▶", command=lambda: self.load_page(info, 'next')).pack(side=tk.LEFT, padx=5)
+        info['page_label'] = ttk.Label(pager_frame, text="---")
+        info['page_label'].pack(side=tk.RIGHT, padx=10)
+        info['page'] = {'start': 0, 'count': 0, 'first_key': None, 'last_key': None, 'has_next': False, 'total': 0}
+
+        # نوار فیلتر: یک ورودی برای هر ستون جدول؛ فیلتر و مرتب‌سازی در خود دیتابیس انجام می‌شوند
+        filter_frame = ttk.LabelFrame(frame, text="جستجو و فیلتر", padding="5")
+        filter_frame.pack(padx=20, fill="x")
+        combo_values = {db_field: type_info[1] for _, db_field, *type_info in fields
+                        if type_info and type_info[0] == 'combo'}
+        info['filter_entries'] = {}
+        info['filters'] = {}
+        info['sort'] = None
+
+        for i, (heading, db_field) in enumerate(model.COLUMNS.items()):
+            ttk.Label(filter_frame, text=f"{heading}:").grid(row=0, column=i*2, padx=5, pady=5, sticky='w')
+            if db_field in combo_values:
+                widget = ttk.Combobox(filter_frame, width=12, font=self.main_font, state='readonly',
+                                      values=['', *combo_values[db_field]])
+            else:
+                widget = ttk.Entry(filter_frame, width=12)
+            widget.grid(row=0, column=i*2 + 1, padx=5, pady=5, sticky='ew')
+            widget.bind('<Return>', lambda event, i=info: self.apply_filters(i))
+            info['filter_entries'][db_field] = widget
+
+        filter_btn_frame = ttk.Frame(filter_frame)
+        filter_btn_frame.grid(row=1, column=0, columnspan=len(model.COLUMNS) * 2, pady=5, sticky='n')
+        ttk.Button(filter_btn_frame, text="🔍 اعمال فیلتر", command=lambda: self.apply_filters(info)).pack(side=tk.LEFT, padx=10)
+        ttk.Button(filter_btn_frame, text="✖ حذف فیلتر", command=lambda: self.clear_filters(info)).pack(side=tk.LEFT, padx=10)
+
+        tree_frame = ttk.Frame(frame)
+        tree_frame.pack(fill="both", expand=True, padx=20, pady=10)
+
         cols_headings = list(model.COLUMNS.keys())
-        tree = ttk.Treeview(frame, columns=cols_headings, show="headings")
+        tree = ttk.Treeview(tree_frame, columns=cols_headings, show="headings")
         
         for col in cols_headings:
-            tree.heading(col, text=col)
+            tree.heading(col, text=col, command=lambda c=col, i=info: self.sort_by_heading(i, c))
             tree.column(col, anchor=tk.CENTER, width=150)
-            
-        tree.pack(fill="both", expand=True, padx=20, pady=10)
+
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill="y")
+        tree.pack(side=tk.LEFT, fill="both", expand=True)
         info['treeview'] = tree
         
         tree.bind("<<TreeviewSelect>>", lambda event, i=info: self.load_selected_to_entries(i))
-        
-        self.load_data(model)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tree.bind(sequence, lambda event, i=info: self.on_tree_scroll(event, i))
 
     def load_data_and_combos(self, tab_key):
         """بازخوانی داده‌های جدول فعلی و به‌روزرسانی ComboBoxهای وابسته در دیگر تب‌ها."""
         model = self.tabs_info[tab_key]['model']
-        self.load_data(model) 
+        # بازخوانی دستی تغییرات خارج از برنامه (مثلاً ورود دسته‌ای) را هم می‌بیند
+        self.combo_cache.invalidate()
+        self.load_data(model, then=lambda: messagebox.showinfo(
+            "عملیات موفق", "داده‌های جدول فعلی و منوهای کشویی وابسته به‌روزرسانی شدند."))
         
         dependencies = {
             'Master': ['Presentation'],
@@ -308,8 +369,6 @@ class ChamranApp:
         if tab_key in ['Master', 'Lesson']:
              self.load_foreign_key_comboboxes('Presentation')
         
-        messagebox.showinfo("عملیات موفق", "داده‌های جدول فعلی و منوهای کشویی وابسته به‌روزرسانی شدند.")
-        
     def load_selected_to_entries(self, info):
         selected_item = info['treeview'].focus()
         if not selected_item:
@@ -317,120 +376,92 @@ class ChamranApp:
         
         values = info['treeview'].item(selected_item, 'values')
         model = info['model']
+        fields = info['fields']
         
         pk_val = values[0] 
         
         self.clear_entries(info['entries'].values())
-        
-        record = self.session.query(model).get(pk_val)
-        
-        if record:
-            for label, db_field, *type_info in info['fields']:
-                value = getattr(record, db_field)
-                entry = info['entries'][db_field]
-                
+
+        def job(session):
+            """مقادیر نمایشی فیلدهای فرم را در thread پس‌زمینه می‌خواند."""
+            record = services.get_record(session, model, pk_val)
+            if not record:
+                return None
+
+            entry_values = {}
+            for label, db_field, *type_info in fields:
                 field_type = type_info[0] if type_info else 'str'
 
+                if db_field == 'MajorFilter':
+                    if model == Selection and record.student and record.student.Major:
+                        entry_values[db_field] = record.student.Major
+                    continue
+
+                value = getattr(record, db_field)
+
                 if field_type.startswith('combo'):
                     if value is not None:
                         display_value = str(value)
                         
                         if field_type.startswith('combo_fk'):
                             fk_model = type_info[1]
-                            
-                            if fk_model == Presentation:
-                                present = self.session.query(Presentation).get(value)
-                                m_name = present.master.Name if present.master else 'نامشخص'
-                                l_name = present.lesson.Name if present.lesson else 'نامشخص'
-                                display_value = f"{l_name} ({m_name}, {present.DayHold})"
-                            else:
-                                fk_record = self.session.query(fk_model).get(value)
-                                display_value = getattr(fk_record, type_info[3]) if fk_record else str(value)
+                            fk_record = services.get_record(session, fk_model, value)
+                            if fk_record:
+                                display_value = services.combo_entry(fk_model, fk_record)[0]
                         
-                        if db_field == 'MajorFilter':
-                            if model == Selection and record.student and record.student.Major:
-                                entry.set(record.student.Major)
-                                self.update_filtered_combos(record.student.Major)
-                                continue
-                        
-                        entry.set(display_value)
+                        entry_values[db_field] = display_value
                         
                 else: 
-                    entry.insert(0, str(value) if value is not None else "")
-        
-    def validate_and_parse_data(self, fields, entries):
-        data = {}
-        for label, db_field, *type_info in fields:
-            if db_field == "MajorFilter": 
-                continue 
+                    entry_values[db_field] = str(value) if value is not None else ""
+            return entry_values
 
-            value = entries[db_field].get()
-            field_type = type_info[0] if type_info else 'str'
+        def done(entry_values):
+            if entry_values is None:
+                return
+            self.clear_entries(info['entries'].values())
+            for db_field, value in entry_values.items():
+                entry = info['entries'][db_field]
+                if isinstance(entry, ttk.Combobox):
+                    entry.set(value)
+                else:
+                    entry.insert(0, value)
 
-            if field_type.startswith('combo'):
-                if not value and db_field != 'MajorFilter':
-                    raise ValueError(f"لطفاً '{label}' را انتخاب کنید.")
-                
-                if field_type.startswith('combo_fk'):
-                    fk_model = type_info[1]
-                    
-                    major_filter = entries.get('MajorFilter').get() if entries.get('MajorFilter') else None
-                    map_key = (fk_model.__name__, major_filter)
+            if 'MajorFilter' in entry_values:
+                self.update_filtered_combos(entry_values['MajorFilter'], selected=entry_values)
 
-                    id_to_name_map = self.id_to_name_map.get(map_key)
-                    if not id_to_name_map or value not in id_to_name_map:
-                        raise ValueError(f"مقدار انتخابی برای '{label}' نامعتبر است یا هنوز بارگذاری نشده است.")
+        self.queries.submit((model.__name__, 'entries'), job, done)
+        
+    def validate_and_parse_data(self, fields, entries):
+        major_filter = entries.get('MajorFilter').get() if entries.get('MajorFilter') else None
 
-                    data[db_field] = id_to_name_map[value]
-                
-                else: 
-                    data[db_field] = value
-                
-                continue 
+        def resolve_fk(label, type_info, value):
+            loaded = self.combo_cache.peek(type_info[1], major_filter)
+            id_to_name_map = loaded[1] if loaded else None
+            if not id_to_name_map or value not in id_to_name_map:
+                raise ValueError(f"مقدار انتخابی برای '{label}' نامعتبر است یا هنوز بارگذاری نشده است.")
+            return id_to_name_map[value]
 
-            if 'optional' not in field_type and not value:
-                raise ValueError(f"فیلد '{label}' نمی‌تواند خالی باشد.")
-            
-            if not value and 'optional' in field_type:
-                data[db_field] = None
-                continue
-
-            try:
-                if field_type == 'str_term_3_digit':
-                    term_str = value
-                    if len(term_str) != 3 or not term_str.isdigit():
-                         raise ValueError(f"فیلد '{label}' باید یک کد ترم دقیقاً سه‌رقمی و عددی باشد (مانند ۰۱۲).")
-                    data[db_field] = term_str
-                
-                elif 'int' in field_type:
-                    data[db_field] = int(value)
-                elif 'float' in field_type:
-                    data[db_field] = float(value)
-                else: 
-                    data[db_field] = value
-            except ValueError as ve:
-                if 'سه‌رقمی' in str(ve):
-                    raise ve
-                else:
-                    raise ValueError(f"فیلد '{label}' باید از نوع {field_type.split('_')[0]} باشد.")
-        return data
+        raw_values = {db_field: entry.get() for db_field, entry in entries.items()}
+        return services.parse_fields(fields, raw_values, resolve_fk)
 
     # ------------------ توابع عملیات CRUD ------------------
     def add_record(self, model, info):
         try:
             data = self.validate_and_parse_data(info['fields'], info['entries'])
             
-            new_record = model(**data)
-            self.session.add(new_record)
-            self.session.commit()
+            versions = self.combo_cache.snapshot()
+            new_record = services.create_record(self.session, model, data)
             
             messagebox.showinfo("موفقیت", f"{info['text']} با موفقیت افزوده شد.")
             self.clear_entries(info['entries'].values())
             
-            tab_key = next(key for key, val in self.tabs_info.items() if val['model'] == model)
-            self.load_data_and_combos(tab_key) 
+            pk_val = getattr(new_record, info['id_field'])
+            self.apply_crud_delta(info, pk_val, None, services.combo_entry(model, new_record), versions)
 
-            
+        except schedule.ScheduleConflictError as e:
+            messagebox.showerror("تداخل برنامه", str(e))
+        except PresentationFullError as e:
+            messagebox.showerror("ظرفیت تکمیل", str(e))
         except ValueError as e:
             messagebox.showerror("خطای ورودی", str(e))
         except IntegrityError:
@@ -450,21 +481,24 @@ class ChamranApp:
             pk_val = info['treeview'].item(selected_item, 'values')[0]
             data = self.validate_and_parse_data(info['fields'], info['entries'])
             
-            record = self.session.query(model).get(pk_val)
+            record = services.get_record(self.session, model, pk_val)
             if not record:
                 messagebox.showerror("خطا", "رکورد انتخاب شده در دیتابیس یافت نشد.")
                 return
 
-            for key, value in data.items():
-                setattr(record, key, value)
-            
-            self.session.commit()
+            old_entry = services.combo_entry(model, record)
+            versions = self.combo_cache.snapshot()
+            record = services.update_record(self.session, model, pk_val, data)
             messagebox.showinfo("موفقیت", f"{info['text']} با موفقیت بروزرسانی شد.")
             self.clear_entries(info['entries'].values())
             
-            tab_key = next(key for key, val in self.tabs_info.items() if val['model'] == model)
-            self.load_data_and_combos(tab_key) 
+            pk_val = getattr(record, info['id_field'])
+            self.apply_crud_delta(info, pk_val, old_entry, services.combo_entry(model, record), versions)
 
+        except schedule.ScheduleConflictError as e:
+            messagebox.showerror("تداخل برنامه", str(e))
+        except PresentationFullError as e:
+            messagebox.showerror("ظرفیت تکمیل", str(e))
         except ValueError as e:
             messagebox.showerror("خطای ورودی", str(e))
         except IntegrityError:
@@ -480,24 +514,27 @@ class ChamranApp:
             messagebox.showwarning("هشدار", "لطفاً برای حذف، یک رکورد را از لیست انتخاب کنید.")
             return
 
-        if not messagebox.askyesno("تأیید حذف", "آیا مطمئن هستید که می‌خواهید این رکورد را حذف کنید؟ این عمل غیرقابل بازگشت است."):
+        if not messagebox.askyesno("تأیید حذف", "آیا مطمئن هستید که می‌خواهید این رکورد را حذف کنید؟ رکورد به سطل بازیافت منتقل می‌شود و قابل بازگرداندن است."):
             return
 
         try:
             pk_val = info['treeview'].item(selected_item, 'values')[0]
             
-            record = self.session.query(model).get(pk_val)
+            record = services.get_record(self.session, model, pk_val)
             if record:
-                self.session.delete(record)
-                self.session.commit()
+                record_id = getattr(record, info['id_field'])
+                old_entry = services.combo_entry(model, record)
+                versions = self.combo_cache.snapshot()
+                services.delete_record(self.session, model, pk_val)
                 messagebox.showinfo("موفقیت", f"{info['text']} با موفقیت حذف شد.")
                 self.clear_entries(info['entries'].values())
                 
-                tab_key = next(key for key, val in self.tabs_info.items() if val['model'] == model)
-                self.load_data_and_combos(tab_key) 
+                self.apply_crud_delta(info, record_id, old_entry, None, versions, deleted=True)
             else:
                 messagebox.showerror("خطا", "رکورد انتخاب شده در دیتابیس یافت نشد.")
 
+        except journal.DependentRecordsError as e:
+            messagebox.showerror("خطای وابستگی", str(e))
         except IntegrityError:
             self.session.rollback()
             messagebox.showerror("خطای وابستگی", "این رکورد به رکوردهای دیگری وابسته است و قابل حذف نیست. ابتدا رکوردهای وابسته را حذف کنید.")
@@ -505,44 +542,281 @@ class ChamranApp:
             self.session.rollback()
             messagebox.showerror("خطای ناشناخته", str(e))
 
-    def load_data(self, model):
+    # ------------------ واگرد / ازنو ------------------
+
+    def undo_last(self):
+        self.replay_history(journal.undo, "واگرد", "عملیاتی برای واگرد وجود ندارد.")
+
+    def redo_last(self):
+        self.replay_history(journal.redo, "ازنو", "عملیاتی برای ازنو وجود ندارد.")
+
+    def replay_history(self, replay, title, empty_message):
+        """آخرین عملیات تاریخچه را برمی‌گرداند / دوباره اعمال می‌کند و تب فعلی را از نو بارگذاری می‌کند."""
+        try:
+            change_set = replay(self.session)
+        except ValueError as e:
+            messagebox.showerror(f"خطای {title}", str(e))
+            return
+        except Exception as e:
+            self.session.rollback()
+            messagebox.showerror("خطای پایگاه داده", f"خطا: {e}")
+            return
+        if change_set is None:
+            messagebox.showinfo(title, empty_message)
+            return
+
+        self.rankings.clear()
+        self.rankings_version += 1
+        messagebox.showinfo(title, f"{title} انجام شد: {change_set.description}")
+        self.reload_current_tab()
+
+    def reload_current_tab(self):
+        self.current_tab = None
+        self.on_tab_change(None)
+        if self.current_tab == self.tab_control.index(self.tab_gradebook):
+            # نمره‌های ویرایش‌شده و ذخیره‌نشده فقط با تأیید کاربر دور ریخته می‌شوند
+            self.load_gradebook()
+
+    # ------------------ فیلتر و مرتب‌سازی سمت دیتابیس ------------------
+
+    def apply_filters(self, info):
+        """مقادیر نوار فیلتر را اعتبارسنجی و صفحه اول نتایج فیلترشده را بارگذاری می‌کند."""
+        raw_filters = {db_field: widget.get() for db_field, widget in info['filter_entries'].items()}
+        try:
+            info['filters'] = services.parse_filters(info['model'], raw_filters)
+        except ValueError as e:
+            messagebox.showerror("خطای فیلتر", str(e))
+            return
+        self.reset_page(info)
+
+    def clear_filters(self, info):
+        for widget in info['filter_entries'].values():
+            if isinstance(widget, ttk.Combobox):
+                widget.set('')
+            else:
+                widget.delete(0, tk.END)
+        info['filters'] = {}
+        self.reset_page(info)
+
+    def sort_by_heading(self, info, heading):
+        """کلیک روی عنوان ستون: مرتب‌سازی صعودی، سپس نزولی و در نهایت بازگشت به ترتیب شناسه."""
+        db_field = info['model'].COLUMNS[heading]
+        sort = info['sort']
+        if sort and sort[0] == db_field:
+            info['sort'] = None if sort[1] else (db_field, True)
+        else:
+            info['sort'] = (db_field, False)
+
+        tree = info['treeview']
+        for col, field in info['model'].COLUMNS.items():
+            arrow = ''
+            if info['sort'] and info['sort'][0] == field:
+                arrow = ' ▼' if info['sort'][1] else ' ▲'
+            tree.heading(col, text=col + arrow)
+        self.reset_page(info)
+
+    def reset_page(self, info):
+        """با تغییر فیلتر یا ترتیب، کلیدهای صفحه فعلی دیگر معتبر نیستند؛ از صفحه اول شروع می‌شود."""
+        info['page'].update(start=0, first_key=None, last_key=None, has_next=False)
+        self.load_page(info, 'first')
+
+    def load_data(self, model, then=None):
         for key, info in self.tabs_info.items():
             if info['model'] == model:
-                tree = info['treeview']
-                
-                for i in tree.get_children():
-                    tree.delete(i)
-                
-                data = self.session.query(model).all()
-                col_keys = list(model.COLUMNS.values())
-                
-                for record in data:
-                    row = []
-                    for attr in col_keys:
-                        value = getattr(record, attr)
-                        
-                        if model == Presentation and attr == 'MasterId':
-                            row.append(record.master.Name if record.master else 'نامشخص')
-                        elif model == Presentation and attr == 'LessonId':
-                            row.append(record.lesson.Name if record.lesson else 'نامشخص')
-                        
-                        elif model == Selection and attr == 'IdStudent':
-                            row.append(record.student.Name if record.student else 'نامشخص')
-                        elif model == Selection and attr == 'IdPresentation':
-                            if record.presentation:
-                                l_name = record.presentation.lesson.Name if record.presentation.lesson else 'نامشخص'
-                                m_name = record.presentation.master.Name if record.presentation.master else 'نامشخص'
-                                row.append(f"{l_name} ({m_name})")
-                            else:
-                                row.append('نامشخص')
-                        # ------------------------------------
-                        
-                        else:
-                            row.append(value)
-                            
-                    tree.insert("", "end", values=row)
+                self.load_page(info, 'reload', then)
                 break
-            
+
+    def load_page(self, info, direction='reload', then=None):
+        """فقط یک صفحه از ردیف‌ها را با صفحه‌بندی keyset در Treeview نگه می‌دارد.
+
+        فیلترها و ترتیب تب (info['filters']، info['sort']) در همان کوئری اعمال می‌شوند. کوئری در
+        پس‌زمینه اجرا می‌شود و then (در صورت وجود) پس از نمایش صفحه جدید صدا زده می‌شود.
+        """
+        model = info['model']
+        page = info['page']
+        size = self.page_size
+        page_start = page['start']
+
+        if direction == 'next':
+            if not page['has_next']:
+                return
+            query_args = {'after_key': page['last_key'], 'limit': size + 1}
+        elif direction == 'prev':
+            if page['start'] == 0:
+                return
+            query_args = {'before_key': page['first_key'], 'limit': size}
+        elif direction == 'reload' and page['first_key'] is not None:
+            query_args = {'from_key': page['first_key'], 'limit': size + 1}
+        else:
+            direction = 'first'
+            query_args = {'limit': size + 1}
+
+        filters, sort = info['filters'], info['sort']
+
+        def job(session):
+            rows, keys = services.fetch_display_page(session, model, filters, sort, **query_args)
+            return rows, keys, services.count_rows(session, model, filters)
+
+        def done(result):
+            rows, keys, total = result
+
+            if direction == 'next':
+                start = page_start + page['count']
+            elif direction == 'prev':
+                start = page_start - len(rows) if len(rows) == size else 0
+            elif direction == 'reload':
+                start = page_start
+                if not rows and start > 0:
+                    return self.load_page(info, 'first', then)
+            else:
+                start = 0
+
+            if direction == 'prev':
+                page['has_next'] = True
+            else:
+                page['has_next'] = len(rows) > size
+                rows, keys = rows[:size], keys[:size]
+
+            tree = info['treeview']
+            tree.delete(*tree.get_children())
+            for row in rows:
+                tree.insert("", "end", iid=str(row[0]), values=row)
+
+            page['start'] = start
+            page['count'] = len(rows)
+            page['first_key'] = keys[0] if keys else None
+            page['last_key'] = keys[-1] if keys else None
+            page['total'] = total
+            self.update_page_label(info)
+            if then:
+                then()
+
+        self.queries.submit((model.__name__, 'page'), job, done)
+
+    def update_page_label(self, info):
+        page = info['page']
+        if page['count']:
+            text = f"ردیف {page['start'] + 1} تا {page['start'] + page['count']} از {page['total']}"
+        else:
+            text = f"بدون رکورد (مجموع: {page['total']})"
+        if info['filters']:
+            text += " - فیلتر شده"
+        info['page_label'].config(text=text)
+
+    def on_tree_scroll(self, event, info):
+        """با رسیدن اسکرول به انتها یا ابتدای صفحه، صفحه بعدی یا قبلی را بارگذاری می‌کند."""
+        tree = info['treeview']
+        scrolling_down = event.num == 5 or getattr(event, 'delta', 0) < 0
+        top, bottom = tree.yview()
+
+        if scrolling_down and bottom >= 1.0 and info['page']['has_next']:
+            self.load_page(info, 'next', then=lambda: tree.yview_moveto(0))
+            return "break"
+        if not scrolling_down and top <= 0.0 and info['page']['start'] > 0:
+            self.load_page(info, 'prev', then=lambda: tree.yview_moveto(1.0))
+            return "break"
+
+    # ------------------ به‌روزرسانی افزایشی پس از عملیات CRUD ------------------
+
+    def apply_crud_delta(self, info, pk_val, old_entry, new_entry, versions, deleted=False):
+        """تغییر یک رکورد را بدون بارگذاری مجدد کل جدول روی Treeview و منوهای کشویی وابسته اعمال می‌کند."""
+        model = info['model']
+        if info['filters'] or info['sort']:
+            # جای ردیف در نتایج فیلترشده یا مرتب‌شده فقط با کوئری مجدد مشخص می‌شود
+            self.load_page(info, 'reload')
+        else:
+            row = None if deleted else services.fetch_display_row(self.session, model, pk_val)
+            self.patch_tree_row(info, pk_val, row)
+
+            if self.queries.is_pending((model.__name__, 'page')):
+                # صفحه‌ای که هنوز در راه است پیش از این تغییر خوانده شده؛ دوباره خوانده می‌شود
+                self.load_page(info, 'reload')
+
+        if model != Master:
+            self.rankings.clear()
+            self.rankings_version += 1
+
+        if old_entry != new_entry:
+            self.apply_combo_delta(model, pk_val, old_entry, new_entry)
+
+            if model in (Master, Lesson) and old_entry and new_entry and old_entry[0] != new_entry[0]:
+                self.cascade_presentation_names(model, pk_val, old_entry[0])
+
+        # ورودی‌های cache که با deltaهای بالا به‌روز شده‌اند نسخه جدید جدول‌ها را می‌گیرند و نیازی به کوئری مجدد ندارند
+        self.combo_cache.revalidate(versions)
+
+    def patch_tree_row(self, info, pk_val, row):
+        """یک ردیف را با کلید اصلی در صفحه فعلی درج، بروزرسانی یا حذف می‌کند."""
+        tree = info['treeview']
+        page = info['page']
+        iid = str(pk_val)
+
+        if row is None:
+            if tree.exists(iid):
+                tree.delete(iid)
+                page['count'] -= 1
+                children = tree.get_children()
+                page['first_key'] = int(children[0]) if children else None
+                page['last_key'] = int(children[-1]) if children else None
+            page['total'] -= 1
+            if page['count'] == 0 and page['start'] > 0:
+                return self.load_page(info, 'first')
+
+        elif tree.exists(iid):
+            tree.item(iid, values=row)
+
+        else:
+            # کلیدهای جدید همیشه بزرگ‌ترین کلید جدول هستند، پس فقط در انتهای صفحه آخر جا می‌گیرند
+            page['total'] += 1
+            if not page['has_next'] and page['count'] < self.page_size:
+                tree.insert("", "end", iid=iid, values=row)
+                page['count'] += 1
+                page['last_key'] = pk_val
+                if page['first_key'] is None:
+                    page['first_key'] = pk_val
+            else:
+                page['has_next'] = True
+
+        self.update_page_label(info)
+
+    def apply_combo_delta(self, model, record_id, old_entry, new_entry):
+        """حذف نام قدیمی و درج نام جدید یک رکورد در لیست‌های مرتب گزینه‌ها (در cache مشترک)."""
+        self.combo_cache.apply_delta(model, record_id, old_entry, new_entry)
+        self.refresh_combo_widgets(model.__name__)
+
+    def cascade_presentation_names(self, model, record_id, old_name):
+        """با تغییر نام استاد یا درس، نام نمایشی فقط ارائه‌های وابسته به آن را بروزرسانی می‌کند."""
+        for present_id, lesson_name, master_name, day_hold in services.fetch_presentation_names(self.session, model, record_id):
+            if model == Master:
+                old_display = services.presentation_display_name(lesson_name, old_name, day_hold)
+            else:
+                old_display = services.presentation_display_name(old_name, master_name, day_hold)
+            new_display = services.presentation_display_name(lesson_name, master_name, day_hold)
+            self.apply_combo_delta(Presentation, present_id, (old_display, None), (new_display, None))
+
+    def refresh_combo_widgets(self, model_name):
+        """لیست گزینه‌های منوهای کشویی‌ای که به یک مدل اشاره می‌کنند را از لیست‌های مرتب فعلی تنظیم می‌کند."""
+        for tab_key, info in self.tabs_info.items():
+            if 'entries' not in info:
+                continue  # تب هنوز ساخته نشده؛ گزینه‌ها هنگام ساخت از cache خوانده می‌شوند
+            for label, db_field, *type_info in info['fields']:
+                field_type = type_info[0] if type_info else 'str'
+                if not field_type.startswith('combo_fk') or type_info[1].__name__ != model_name:
+                    continue
+
+                major = info['entries']['MajorFilter'].get() if field_type == 'combo_fk_filtered' else None
+                loaded = self.combo_cache.peek(type_info[1], major)
+                if loaded is None:
+                    continue
+
+                options, id_to_name = loaded
+                widget = info['entries'][db_field]
+                current_value = widget.get()
+                if field_type == 'combo_fk':
+                    widget['values'] = options
+                if current_value and current_value not in id_to_name:
+                    widget.set('')
+
     def clear_entries(self, entries):
         for entry in entries:
             if isinstance(entry, ttk.Combobox):
@@ -552,6 +826,15 @@ class ChamranApp:
 
     def on_tab_change(self, event):
         selected_tab_index = self.tab_control.index(self.tab_control.select())
+        if selected_tab_index == self.current_tab:
+            return  # رویداد انتخاب تب اول که Tk پس از شروع حلقه رویداد هم می‌فرستد
+        self.current_tab = selected_tab_index
+        build = self.tab_builders.pop(selected_tab_index, None)
+        if build is not None:
+            build()
+
+        # نتیجه کوئری‌هایی که برای تب قبلی فرستاده شده‌اند دیگر نمایش داده نمی‌شوند
+        self.queries.cancel()
         
         if selected_tab_index < len(self.tabs_info):
             tab_key = list(self.tabs_info.keys())[selected_tab_index]
@@ -566,6 +849,21 @@ class ChamranApp:
                 info['entries']['IdStudent'].set('')
                 info['entries']['IdPresentation']['values'] = []
 
+        elif selected_tab_index == self.tab_control.index(self.tab_stats):
+            self.load_grade_stats()
+
+        elif selected_tab_index == self.tab_control.index(self.tab_gradebook):
+            self.load_gradebook_presentations()
+
+        elif selected_tab_index == self.tab_control.index(self.tab_trash):
+            self.load_trash()
+
+        elif self.profiler is not None and selected_tab_index == self.tab_control.index(self.tab_diagnostics):
+            self.refresh_diagnostics()
+
+        else:
+            self.load_top_students()
+
 
     # ------------------ تب محاسبه میانگین (گزارش) ------------------
     def create_report_tab(self):
@@ -583,12 +881,93 @@ class ChamranApp:
         
         self.lbl_rank = ttk.Label(frame, text="---", font=('B Nazanin', 14, 'bold'))
         self.lbl_rank.pack(pady=10)
+
+        self.lbl_class_rank = ttk.Label(frame, text="---", font=self.main_font)
+        self.lbl_class_rank.pack(pady=5)
+
+        top_frame = ttk.LabelFrame(self.tab_report, text="دانشجویان برتر", padding="10")
+        top_frame.pack(padx=50, pady=(0, 20), fill="both", expand=True)
+
+        top_columns = ["رتبه", "شناسه", "نام دانشجو", "رشته", "معدل"]
+        self.top_tree = ttk.Treeview(top_frame, columns=top_columns, show="headings", height=10)
+        for col in top_columns:
+            self.top_tree.heading(col, text=col)
+            self.top_tree.column(col, anchor=tk.CENTER, width=120)
+        self.top_tree.pack(fill="both", expand=True)
+
+        conflict_frame = ttk.LabelFrame(self.tab_report, text="تداخل‌های برنامه کلاسی", padding="10")
+        conflict_frame.pack(padx=50, pady=(0, 20), fill="both", expand=True)
+
+        ttk.Button(conflict_frame, text="بررسی تداخل‌ها", command=self.load_conflicts).pack(pady=5)
+        self.lbl_conflicts = ttk.Label(conflict_frame, text="---", font=self.main_font)
+        self.lbl_conflicts.pack(pady=5)
+
+        conflict_columns = ["نوع", "نام", "سال", "روز", "ارائه اول", "ارائه دوم"]
+        self.conflict_tree = ttk.Treeview(conflict_frame, columns=conflict_columns, show="headings", height=8)
+        for col in conflict_columns:
+            self.conflict_tree.heading(col, text=col)
+            self.conflict_tree.column(col, anchor=tk.CENTER, width=120)
+        self.conflict_tree.pack(fill="both", expand=True)
+
+    def load_conflicts(self):
+        """همه تداخل‌های استادان و دانشجویان را در پس‌زمینه پیدا و حداکثر CONFLICT_LIMIT مورد را نمایش می‌دهد."""
+        self.lbl_conflicts.config(text="در حال بررسی...")
+
+        def done(result):
+            rows, total = result
+            self.conflict_tree.delete(*self.conflict_tree.get_children())
+            for row in rows:
+                self.conflict_tree.insert("", "end", values=row)
+            if not total:
+                self.lbl_conflicts.config(text="هیچ تداخلی در برنامه وجود ندارد.")
+            elif total > len(rows):
+                self.lbl_conflicts.config(text=f"{total} تداخل یافت شد ({len(rows)} مورد اول نمایش داده شده است).")
+            else:
+                self.lbl_conflicts.config(text=f"{total} تداخل یافت شد.")
+
+        self.queries.submit(('Report', 'conflicts'), lambda session: schedule.conflict_report(session, CONFLICT_LIMIT), done)
+
+    def request_rankings(self, channel, keys, on_done, extra_job=None, on_error=None):
+        """رتبه‌بندی‌های keys=(by_year, by_major) را از cache یا در پس‌زمینه می‌گیرد و on_done(rankings, extra) را صدا می‌زند.
+
+        رتبه‌بندی محاسبه‌شده تا تغییر بعدی نمرات/واحدها نگه داشته می‌شود؛ extra_job(session) در صورت نیاز
+        در همان کار پس‌زمینه اجرا می‌شود.
+        """
+        cached = {key: self.rankings[key] for key in keys if key in self.rankings}
+        if len(cached) == len(keys) and extra_job is None:
+            on_done(cached, None)
+            return
+
+        version = self.rankings_version
+
+        def job(session):
+            computed = {key: services.rank_students(session, by_year=key[0], by_major=key[1])
+                        for key in keys if key not in cached}
+            return computed, extra_job(session) if extra_job else None
+
+        def done(result):
+            computed, extra = result
+            if version == self.rankings_version:
+                self.rankings.update(computed)
+            on_done({**cached, **computed}, extra)
+
+        self.queries.submit(channel, job, done, on_error)
+
+    def load_top_students(self, n=10):
+        def done(rankings, extra):
+            self.top_tree.delete(*self.top_tree.get_children())
+            for entry in rankings[(False, False)].top(n):
+                self.top_tree.insert("", "end", values=(entry.dense_rank, entry.student_id, entry.name,
+                                                       entry.major, f"{entry.gpa:.2f}"))
+
+        self.request_rankings(('Report', 'top'), [(False, False)], done)
         
 
     def calculate_average(self):
         st_id_str = self.rep_sid.get()
         
         self.lbl_rank.config(text="---", foreground='black')
+        self.lbl_class_rank.config(text="---")
 
         if not st_id_str:
             messagebox.showwarning("هشدار", "لطفاً شناسه دانشجو را وارد کنید")
@@ -596,57 +975,509 @@ class ChamranApp:
         
         try:
             st_id = int(st_id_str)
+        except ValueError:
+            messagebox.showerror("خطا", "شناسه دانشجو باید یک عدد باشد.")
+            return
+
+        def student_name(session):
+            student = services.get_record(session, Student, st_id)
+            return student.Name if student else None
+
+        def on_error(e):
+            self.lbl_result.config(text="خطای دیتابیس رخ داد")
+            self.lbl_rank.config(text="---", foreground='black')
+            messagebox.showerror("خطای پایگاه داده", f"خطا: {e}")
+
+        self.lbl_result.config(text="در حال محاسبه...", foreground="#000000")
+        self.request_rankings(('Report', 'gpa'), [(False, False), (False, True)],
+                              lambda rankings, st_name: self.show_average(st_id, rankings, st_name),
+                              extra_job=student_name, on_error=on_error)
+
+    def show_average(self, st_id, rankings, st_name):
+        entry = rankings[(False, False)].get(st_id)
+
+        if entry is None and st_name is None:
+            self.lbl_result.config(text="---")
+            messagebox.showerror("خطا", "دانشجویی با این شناسه یافت نشد.")
+            return
+
+        if entry is not None:
+            st_name = entry.name
+            gpa = entry.gpa
+            self.lbl_result.config(text=f"میانگین وزنی نمرات {st_name}: {gpa:.2f}", foreground="#000000")
             
-            student = self.session.query(Student).filter(Student.IdStudent == st_id).first()
-            
-            if not student:
-                messagebox.showerror("خطا", "دانشجویی با این شناسه یافت نشد.")
-                return
+            rank_text = ""
+            rank_color = "black"
 
-            result = self.session.query(
-                func.sum(Selection.Score * Lesson.Unit) / func.sum(Lesson.Unit)
-            ).select_from(Selection) \
-             .join(Presentation) \
-             .join(Lesson) \
-             .filter(Selection.IdStudent == st_id) \
-             .filter(Selection.Score != None) \
-             .scalar()
+            if 0 <= gpa < 9:
+                rank_text = "رتبه: ضعیف"
+                rank_color = "red" 
+            elif 9 <= gpa < 15:
+                rank_text = "رتبه: متوسط"
+                rank_color = "#f39c12" 
+            elif 15 <= gpa <= 20:
+                rank_text = "رتبه: عالی"
+                rank_color = "green" 
             
-            st_name = student.Name
+            self.lbl_rank.config(text=rank_text, foreground=rank_color)
 
-            if result is not None:
-                gpa = result
-                self.lbl_result.config(text=f"میانگین وزنی نمرات {st_name}: {gpa:.2f}", foreground="#000000")
-                
-                rank_text = ""
-                rank_color = "black"
-
-                if 0 <= gpa < 9:
-                    rank_text = "رتبه: ضعیف"
-                    rank_color = "red" 
-                elif 9 <= gpa < 15:
-                    rank_text = "رتبه: متوسط"
-                    rank_color = "#f39c12" 
-                elif 15 <= gpa <= 20:
-                    rank_text = "رتبه: عالی"
-                    rank_color = "green" 
-                
-                self.lbl_rank.config(text=rank_text, foreground=rank_color)
+            major_entry = rankings[(False, True)].get(st_id)
+            self.lbl_class_rank.config(
+                text=f"رتبه کلاسی: {entry.dense_rank} از {entry.group_size} (صدک {entry.percentile:.0f})"
+                     f" | رتبه در رشته {major_entry.major}: {major_entry.dense_rank} از {major_entry.group_size}")
 
+        else:
+            self.lbl_result.config(text=f"دانشجو {st_name} هیچ نمره ثبت شده‌ای با واحد درسی ندارد.")
+            self.lbl_rank.config(text="---", foreground='black')
+
+    # ------------------ تب آمار نمرات دروس و استادان ------------------
+    def create_stats_tab(self):
+        # analytics (و NumPy) فقط با اولین باز شدن این تب import می‌شود تا شروع برنامه کند نشود
+        import analytics
+        self.grade_stats = analytics.GradeStatsCache()
+
+        controls = ttk.LabelFrame(self.tab_stats, text="آمار نمرات به تفکیک درس یا استاد", padding="10")
+        controls.pack(padx=20, pady=10, fill="x")
+
+        ttk.Label(controls, text="گروه‌بندی:").grid(row=0, column=0, padx=5, pady=5)
+        self.stats_by = ttk.Combobox(controls, width=10, font=self.main_font, state='readonly',
+                                     values=list(STATS_GROUPINGS))
+        self.stats_by.set(next(iter(STATS_GROUPINGS)))
+        self.stats_by.grid(row=0, column=1, padx=5, pady=5)
+
+        ttk.Label(controls, text="سال تحصیلی:").grid(row=0, column=2, padx=5, pady=5)
+        self.stats_year = ttk.Combobox(controls, width=10, font=self.main_font, state='readonly', values=[ALL_LABEL])
+        self.stats_year.set(ALL_LABEL)
+        self.stats_year.grid(row=0, column=3, padx=5, pady=5)
+
+        ttk.Label(controls, text="رشته دانشجو:").grid(row=0, column=4, padx=5, pady=5)
+        self.stats_major = ttk.Combobox(controls, width=12, font=self.main_font, state='readonly',
+                                        values=[ALL_LABEL] + self.majors_list)
+        self.stats_major.set(ALL_LABEL)
+        self.stats_major.grid(row=0, column=5, padx=5, pady=5)
+
+        ttk.Button(controls, text="نمایش آمار", command=self.load_grade_stats).grid(row=0, column=6, padx=10, pady=5)
+        self.lbl_stats = ttk.Label(controls, text="---")
+        self.lbl_stats.grid(row=1, column=0, columnspan=7, pady=5)
+
+        table_frame = ttk.Frame(self.tab_stats)
+        table_frame.pack(padx=20, pady=5, fill="both", expand=True)
+        stats_columns = ["نام", "تعداد نمره", "میانگین", "میانه", "انحراف معیار", "درصد قبولی", "کمینه", "بیشینه"]
+        self.stats_tree = ttk.Treeview(table_frame, columns=stats_columns, show="headings", height=12)
+        for col in stats_columns:
+            self.stats_tree.heading(col, text=col)
+            self.stats_tree.column(col, anchor=tk.CENTER, width=100)
+        self.stats_tree.pack(side="left", fill="both", expand=True)
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.stats_tree.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.stats_tree.configure(yscrollcommand=scrollbar.set)
+        self.stats_tree.bind("<<TreeviewSelect>>", lambda event: self.show_selected_histogram())
+
+        histogram_frame = ttk.LabelFrame(self.tab_stats, text="توزیع نمرات", padding="5")
+        histogram_frame.pack(padx=20, pady=(5, 20), fill="x")
+        self.histogram_canvas = tk.Canvas(histogram_frame, height=180, bg="white", highlightthickness=0)
+        self.histogram_canvas.pack(fill="x")
+
+    def load_grade_stats(self):
+        """آمار همه درس‌ها یا استادان را برای سال و رشته انتخاب‌شده از cache یا در پس‌زمینه می‌گیرد."""
+        import analytics
+        grouping = self.stats_by.get()
+        by = STATS_GROUPINGS[grouping]
+        year = None if self.stats_year.get() in ('', ALL_LABEL) else int(self.stats_year.get())
+        major = None if self.stats_major.get() in ('', ALL_LABEL) else self.stats_major.get()
+        self.lbl_stats.config(text="در حال محاسبه...")
+
+        def job(session):
+            return self.grade_stats.get(session, by, year, major), self.grade_stats.year_values(session)
+
+        def done(result):
+            stats, years = result
+            self.stats_year['values'] = [ALL_LABEL] + years
+            self.stats_tree.delete(*self.stats_tree.get_children())
+            self.stats_histograms = {}
+            total = [0] * analytics.SCORE_BINS
+            for row in stats:
+                iid = self.stats_tree.insert("", "end", values=(
+                    row.name, row.count, f"{row.mean:.2f}", f"{row.median:.2f}", f"{row.stdev:.2f}",
+                    f"{row.pass_rate:.1f}%", f"{row.minimum:g}", f"{row.maximum:g}"))
+                self.stats_histograms[iid] = (row.name, row.histogram)
+                total = [a + b for a, b in zip(total, row.histogram)]
+            self.stats_histograms[''] = (f"همه ({grouping}ها)", total)
+
+            if stats:
+                self.lbl_stats.config(text=f"آمار {len(stats)} {grouping} از {sum(total)} نمره ثبت‌شده")
             else:
-                self.lbl_result.config(text=f"دانشجو {st_name} هیچ نمره ثبت شده‌ای با واحد درسی ندارد.")
-                self.lbl_rank.config(text="---", foreground='black')
-                
-        except ValueError:
-            messagebox.showerror("خطا", "شناسه دانشجو باید یک عدد باشد.")
+                self.lbl_stats.config(text="نمره‌ای با این فیلترها ثبت نشده است.")
+            self.draw_histogram(*self.stats_histograms[''])
+
+        self.queries.submit(('Stats', 'grades'), job, done)
+
+    def show_selected_histogram(self):
+        selected = self.stats_tree.focus()
+        self.draw_histogram(*self.stats_histograms.get(selected, self.stats_histograms.get('', ("", []))))
+
+    def draw_histogram(self, title, counts):
+        """نمودار میله‌ای تعداد نمره‌ها برای هر نمره صحیح ۰ تا ۲۰ (قبولی سبز، مردودی قرمز)."""
+        import analytics
+        canvas = self.histogram_canvas
+        canvas.delete("all")
+        if not counts or not any(counts):
+            return
+        width = max(canvas.winfo_width(), 400)
+        height = max(canvas.winfo_height(), 180)
+        top, bottom = 25, height - 20
+        bar_width = width / len(counts)
+        peak = max(counts)
+        canvas.create_text(width / 2, 10, text=f"توزیع نمرات: {title}", font=self.main_font)
+        for score, count in enumerate(counts):
+            x0 = score * bar_width + 2
+            y0 = bottom - (bottom - top) * count / peak
+            color = "#27ae60" if score >= analytics.PASS_SCORE else "#e74c3c"
+            canvas.create_rectangle(x0, y0, x0 + bar_width - 4, bottom, fill=color, outline="")
+            canvas.create_text(x0 + bar_width / 2 - 2, bottom + 10, text=str(score))
+            if count:
+                canvas.create_text(x0 + bar_width / 2 - 2, y0 - 8, text=str(count))
+
+    # ------------------ تب ثبت دسته‌ای نمرات یک ارائه ------------------
+    def create_gradebook_tab(self):
+        controls = ttk.LabelFrame(self.tab_gradebook, text="ثبت نمرات همه دانشجویان یک ارائه", padding="10")
+        controls.pack(padx=20, pady=10, fill="x")
+
+        ttk.Label(controls, text="ارائه:").grid(row=0, column=0, padx=5, pady=5)
+        self.gradebook_presentation = ttk.Combobox(controls, width=45, font=self.main_font, state='readonly')
+        self.gradebook_presentation.grid(row=0, column=1, padx=5, pady=5)
+        self.gradebook_presentation.bind('<<ComboboxSelected>>', lambda event: self.load_gradebook())
+        ttk.Button(controls, text="💾 ذخیره نمرات", command=self.save_gradebook).grid(row=0, column=2, padx=10, pady=5)
+        ttk.Button(controls, text="↩ لغو تغییرات", command=self.load_gradebook).grid(row=0, column=3, padx=5, pady=5)
+        self.lbl_gradebook = ttk.Label(controls, text="یک ارائه را انتخاب کنید؛ با دوبار کلیک یا Enter روی هر ردیف نمره را وارد کنید.")
+        self.lbl_gradebook.grid(row=1, column=0, columnspan=4, pady=5)
+
+        table_frame = ttk.Frame(self.tab_gradebook)
+        table_frame.pack(padx=20, pady=(5, 20), fill="both", expand=True)
+        columns = ["شناسه دانشجو", "نام دانشجو", "سال تحصیلی", "نمره"]
+        tree = ttk.Treeview(table_frame, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, anchor=tk.CENTER, width=150)
+        tree.pack(side="left", fill="both", expand=True)
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=tree.yview)
+        scrollbar.pack(side="right", fill="y")
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.tag_configure('changed', background="#fff3cd")
+        tree.tag_configure('invalid', background="#f8d7da")
+        tree.bind('<Double-1>', lambda event: self.edit_score(tree.identify_row(event.y)))
+        tree.bind('<Return>', lambda event: self.edit_score(tree.focus()))
+        self.gradebook_tree = tree
+
+        self.gradebook_options = {}
+        self.score_editor = None
+        # ردیف‌های بارگذاری‌شده (شناسه انتخاب -> GradebookRow) و متن نمره‌های ویرایش‌شده و ذخیره‌نشده
+        self.gradebook = {'presentation_id': None, 'rows': {}, 'edits': {}}
+
+    def load_gradebook_presentations(self):
+        def job(session):
+            return self.combo_cache.get(session, Presentation, 'PresentationId', 'Display')
+
+        def done(loaded):
+            options, id_to_name = self.combo_cache.peek(Presentation) or loaded
+            self.gradebook_presentation['values'] = options
+            self.gradebook_options = id_to_name
+
+        self.queries.submit(('Gradebook', 'presentations'), job, done)
+
+    def load_gradebook(self):
+        """انتخاب‌های ارائه انتخاب‌شده را در جدول نمرات بارگذاری می‌کند (تغییرات ذخیره‌نشده پس از تأیید دور ریخته می‌شوند)."""
+        presentation_id = self.gradebook_options.get(self.gradebook_presentation.get())
+        if presentation_id is None:
+            return
+        self.close_score_editor()
+        if self.gradebook['edits'] and not messagebox.askyesno(
+                "تغییرات ذخیره‌نشده", f"{len(self.gradebook['edits'])} نمره ذخیره نشده است. تغییرات دور ریخته شوند؟"):
+            return
+
+        def done(rows):
+            tree = self.gradebook_tree
+            tree.delete(*tree.get_children())
+            for row in rows:
+                tree.insert("", "end", iid=str(row.selection_id), values=(
+                    row.student_id, row.student_name or services.UNKNOWN_NAME, row.year or '',
+                    '' if row.score is None else f"{row.score:g}"))
+            self.gradebook = {'presentation_id': presentation_id, 'edits': {},
+                              'rows': {row.selection_id: row for row in rows}}
+            missing = sum(row.score is None for row in rows)
+            self.lbl_gradebook.config(text=f"{len(rows)} دانشجو ({missing} بدون نمره)")
+
+        self.queries.submit(('Gradebook', 'rows'), lambda session: services.fetch_gradebook(session, presentation_id), done)
+
+    def edit_score(self, iid):
+        """ورودی نمره را روی ستون نمره یک ردیف باز می‌کند؛ Enter / پایین / بالا نمره را ثبت و به ردیف بعد می‌رود."""
+        tree = self.gradebook_tree
+        if not iid:
+            return
+        self.close_score_editor()
+        tree.see(iid)
+        bbox = tree.bbox(iid, "نمره")
+        if not bbox:
+            return
+        x, y, width, height = bbox
+        editor = ttk.Entry(tree, justify=tk.CENTER)
+        editor.insert(0, tree.item(iid, 'values')[3])
+        editor.place(x=x, y=y, width=width, height=height)
+        editor.select_range(0, tk.END)
+        editor.focus_set()
+        editor.bind('<Return>', lambda event: self.close_score_editor(tree.next(iid)))
+        editor.bind('<Down>', lambda event: self.close_score_editor(tree.next(iid)))
+        editor.bind('<Up>', lambda event: self.close_score_editor(tree.prev(iid)))
+        editor.bind('<Escape>', lambda event: self.close_score_editor(save=False))
+        # FocusOut ممکن است بعد از باز شدن ورودی ردیف بعد برسد؛ فقط ورودی همین ردیف بسته شود
+        editor.bind('<FocusOut>', lambda event: self.score_editor and self.score_editor[1] is editor
+                    and self.close_score_editor())
+        self.score_editor = (iid, editor)
+
+    def close_score_editor(self, next_iid=None, save=True):
+        if self.score_editor is None:
+            return
+        iid, editor = self.score_editor
+        self.score_editor = None
+        text = editor.get().strip()
+        editor.destroy()
+
+        if save:
+            selection_id = int(iid)
+            row = self.gradebook['rows'][selection_id]
+            original = '' if row.score is None else f"{row.score:g}"
+            if text == original:
+                self.gradebook['edits'].pop(selection_id, None)
+            else:
+                self.gradebook['edits'][selection_id] = text
+            values = self.gradebook_tree.item(iid, 'values')
+            self.gradebook_tree.item(iid, values=(*values[:3], text),
+                                     tags=('changed',) if selection_id in self.gradebook['edits'] else ())
+            changed = len(self.gradebook['edits'])
+            self.lbl_gradebook.config(text=f"{changed} نمره تغییر کرده (ذخیره نشده)" if changed else "بدون تغییر")
+
+        if next_iid:
+            self.gradebook_tree.focus(next_iid)
+            self.gradebook_tree.selection_set(next_iid)
+            self.edit_score(next_iid)
+
+    def save_gradebook(self):
+        """همه نمره‌های تغییرکرده را یک‌جا اعتبارسنجی و در یک تراکنش ذخیره می‌کند."""
+        self.close_score_editor()
+        gradebook = self.gradebook
+        if not gradebook['edits']:
+            messagebox.showinfo("ثبت نمرات", "نمره‌ای تغییر نکرده است.")
+            return
+
+        tree = self.gradebook_tree
+        labels = {selection_id: row.student_name for selection_id, row in gradebook['rows'].items()}
+        try:
+            scores = services.parse_scores(gradebook['edits'], labels)
+        except services.ScoreValidationError as e:
+            for selection_id in gradebook['edits']:
+                tree.item(str(selection_id), tags=('invalid',) if selection_id in e.errors else ('changed',))
+            messagebox.showerror("خطای ورودی", str(e))
+            return
+
+        try:
+            count = services.save_scores(self.session, gradebook['presentation_id'], scores)
+        except ValueError as e:
+            messagebox.showerror("خطا", str(e))
+            return
         except Exception as e:
-            self.lbl_result.config(text="خطای دیتابیس رخ داد")
-            self.lbl_rank.config(text="---", foreground='black')
+            self.session.rollback()
             messagebox.showerror("خطای پایگاه داده", f"خطا: {e}")
+            return
+
+        self.rankings.clear()
+        self.rankings_version += 1
+        gradebook['edits'] = {}
+        messagebox.showinfo("موفقیت", f"{count} نمره ذخیره شد.")
+        self.load_gradebook()
+
+    # ------------------ تب سطل بازیافت ------------------
+    def create_trash_tab(self):
+        controls = ttk.LabelFrame(self.tab_trash, text="رکوردهای حذف‌شده", padding="10")
+        controls.pack(padx=20, pady=10, fill="x")
+
+        ttk.Label(controls, text="جدول:").grid(row=0, column=0, padx=5, pady=5)
+        self.trash_models = {info['text']: info['model'] for info in self.tabs_info.values()}
+        self.trash_table = ttk.Combobox(controls, width=25, font=self.main_font, state='readonly',
+                                        values=list(self.trash_models))
+        self.trash_table.set(next(iter(self.trash_models)))
+        self.trash_table.grid(row=0, column=1, padx=5, pady=5)
+        self.trash_table.bind('<<ComboboxSelected>>', lambda event: self.load_trash())
+        ttk.Button(controls, text="♻ بازگردانی انتخاب‌شده‌ها", command=self.restore_trash).grid(row=0, column=2, padx=10, pady=5)
+        ttk.Button(controls, text="🔃 بازخوانی", command=self.load_trash).grid(row=0, column=3, padx=5, pady=5)
+        self.lbl_trash = ttk.Label(controls, text="---")
+        self.lbl_trash.grid(row=1, column=0, columnspan=4, pady=5)
+
+        table_frame = ttk.Frame(self.tab_trash)
+        table_frame.pack(padx=20, pady=(5, 20), fill="both", expand=True)
+        # ستون‌ها با انتخاب جدول عوض می‌شوند؛ چند ردیف با Ctrl / Shift انتخاب و یک‌جا بازگردانده می‌شوند
+        self.trash_tree = ttk.Treeview(table_frame, show="headings", selectmode="extended")
+        self.trash_tree.pack(side="left", fill="both", expand=True)
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.trash_tree.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.trash_tree.configure(yscrollcommand=scrollbar.set)
+
+    def load_trash(self):
+        model = self.trash_models[self.trash_table.get()]
+
+        def job(session):
+            return services.fetch_deleted_rows(session, model, TRASH_LIMIT), services.count_deleted(session, model)
+
+        def done(result):
+            rows, total = result
+            tree = self.trash_tree
+            tree.delete(*tree.get_children())
+            columns = list(model.COLUMNS.keys())
+            tree.configure(columns=columns)
+            for col in columns:
+                tree.heading(col, text=col)
+                tree.column(col, anchor=tk.CENTER, width=120)
+            for row in rows:
+                tree.insert("", "end", iid=str(row[0]), values=row)
+            shown = f"{len(rows)} مورد آخر از " if total > len(rows) else ""
+            self.lbl_trash.config(text=f"{shown}{total} رکورد حذف‌شده")
+
+        self.queries.submit(('Trash', 'rows'), job, done)
+
+    def restore_trash(self):
+        model = self.trash_models[self.trash_table.get()]
+        ids = [int(iid) for iid in self.trash_tree.selection()]
+        if not ids:
+            messagebox.showwarning("هشدار", "لطفاً رکوردهایی را که باید بازگردانده شوند از لیست انتخاب کنید.")
+            return
+        try:
+            count = journal.restore_records(self.session, model, ids)
+        except ValueError as e:
+            messagebox.showerror("خطای بازگردانی", str(e))
+            return
+        except Exception as e:
+            self.session.rollback()
+            messagebox.showerror("خطای پایگاه داده", f"خطا: {e}")
+            return
+
+        self.rankings.clear()
+        self.rankings_version += 1
+        messagebox.showinfo("موفقیت", f"{count} رکورد بازگردانده شد.")
+        self.load_trash()
+
+    # ------------------ تب عیب‌یابی کارایی (فقط با --profile) ------------------
+    def create_diagnostics_tab(self):
+        controls = ttk.Frame(self.tab_diagnostics)
+        controls.pack(padx=20, pady=10, fill="x")
+        ttk.Button(controls, text="🔃 بروزرسانی", command=self.refresh_diagnostics).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls, text="صفر کردن آمار", command=self.reset_diagnostics).pack(side=tk.LEFT, padx=5)
+        self.lbl_diagnostics = ttk.Label(controls, text="---")
+        self.lbl_diagnostics.pack(side=tk.LEFT, padx=10)
+
+        operation_columns = ["عملیات", "دفعات", "زمان کل (ms)", "SQL (ms)", "پس‌زمینه (ms)", "رابط کاربری (ms)",
+                             "کوئری", "کوئری در هر بار"]
+        self.operations_tree = ttk.Treeview(self.tab_diagnostics, columns=operation_columns, show="headings", height=10)
+        for col in operation_columns:
+            self.operations_tree.heading(col, text=col)
+            self.operations_tree.column(col, anchor=tk.CENTER, width=90)
+        self.operations_tree.column("عملیات", anchor=tk.W, width=260)
+        self.operations_tree.pack(padx=20, pady=5, fill="both", expand=True)
+
+        slow_frame = ttk.LabelFrame(self.tab_diagnostics, text="کوئری‌های کند", padding="5")
+        slow_frame.pack(padx=20, pady=(5, 20), fill="both", expand=True)
+        slow_columns = ["زمان (ms)", "عملیات", "کوئری"]
+        self.slow_tree = ttk.Treeview(slow_frame, columns=slow_columns, show="headings", height=6)
+        for col in slow_columns:
+            self.slow_tree.heading(col, text=col)
+        self.slow_tree.column("زمان (ms)", anchor=tk.CENTER, width=80)
+        self.slow_tree.column("عملیات", width=200)
+        self.slow_tree.column("کوئری", width=500)
+        self.slow_tree.pack(fill="both", expand=True)
+        self.slow_tree.bind("<<TreeviewSelect>>", lambda event: self.show_slow_query())
+        self.slow_query_text = tk.Text(slow_frame, height=8, wrap="word")
+        self.slow_query_text.pack(fill="x", pady=(5, 0))
+        self.slow_query_rows = {}
+
+    def refresh_diagnostics(self):
+        profiler = self.profiler
+        self.operations_tree.delete(*self.operations_tree.get_children())
+        for name, stats in profiler.operations():
+            self.operations_tree.insert("", "end", values=(
+                name, stats['calls'], f"{stats['wall_ms']:.1f}", f"{stats['db_ms']:.1f}", f"{stats['job_ms']:.1f}",
+                f"{stats['ui_ms']:.1f}", stats['statements'], f"{stats['statements_per_call']:.1f}"))
+
+        self.slow_tree.delete(*self.slow_tree.get_children())
+        self.slow_query_rows = {}
+        slow_queries = profiler.slow_query_log()
+        for query in slow_queries:
+            iid = self.slow_tree.insert("", "end", values=(
+                f"{query.duration_ms:.1f}", query.operation, " ".join(query.statement.split())[:200]))
+            self.slow_query_rows[iid] = query
+        self.lbl_diagnostics.config(
+            text=f"{len(slow_queries)} کوئری کندتر از {profiler.slow_query_ms:g}ms (CHAMRAN_SLOW_QUERY_MS)")
+
+    def reset_diagnostics(self):
+        self.profiler.reset()
+        self.refresh_diagnostics()
+
+    def show_slow_query(self):
+        query = self.slow_query_rows.get(self.slow_tree.focus())
+        self.slow_query_text.delete("1.0", tk.END)
+        if query is None:
+            return
+        plan = "\n".join(self.profiler.explain(query))
+        self.slow_query_text.insert(tk.END, f"{query.statement}\n\nپارامترها: {query.parameters!r}\n\nطرح اجرا:\n{plan}")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="سیستم مدیریت آموزشی دانشگاه چمران")
+    parser.add_argument('--rebuild-gpa-summary', action='store_true', help="بازسازی کامل جدول خلاصه معدل")
+    parser.add_argument('--verify-gpa-summary', action='store_true', help="مقایسه جدول خلاصه معدل با تجمیع از ابتدا")
+    parser.add_argument('--migrate', action='store_true', help="فقط ساخت / به‌روزرسانی اسکیمای دیتابیس و خروج")
+    parser.add_argument('--database-url', help="آدرس دیتابیس (پیش‌فرض: CHAMRAN_DATABASE_URL یا فایل chamran_uni.db)")
+    parser.add_argument('--db-profile', help="پروفایل اتصال SQLite (پیش‌فرض: CHAMRAN_DB_PROFILE یا wal)")
+    parser.add_argument('--profile', action='store_true', default=diagnostics.PROFILE,
+                        help="اندازه‌گیری کوئری‌ها و زمان عملیات‌ها (تب عیب‌یابی؛ پیش‌فرض: CHAMRAN_PROFILE)")
+    parser.add_argument('--profile-output', help="ذخیره گزارش اندازه‌گیری به صورت JSON هنگام خروج (به جای چاپ آن)")
+    args = parser.parse_args()
+
+    engine = configure_database(args.database_url, args.db_profile) if args.database_url or args.db_profile else get_engine()
+    version = migrate(engine)
+    if args.migrate:
+        print(f"اسکیمای دیتابیس در نسخه {version} است.")
+        close_database()
+        sys.exit(0)
+
+    if args.rebuild_gpa_summary:
+        with engine.begin() as connection:
+            rebuild_gpa_summary(connection)
+        print("جدول خلاصه معدل بازسازی شد.")
+        close_database()
+        sys.exit(0)
+
+    if args.verify_gpa_summary:
+        with engine.connect() as connection:
+            mismatches = verify_gpa_summary(connection)
+        for (student_id, year), expected, actual in mismatches:
+            print(f"دانشجو {student_id}، سال {year}: مورد انتظار {expected}، موجود {actual}")
+        print(f"{len(mismatches)} مغایرت یافت شد.")
+        close_database()
+        sys.exit(1 if mismatches else 0)
+
+    profiler = None
+    if args.profile or args.profile_output:
+        profiler = diagnostics.Profiler()
+        profiler.install(engine)
+        profiler.wrap(services, *PROFILED_SERVICES)
+
     root = tk.Tk()
     root.configure(bg="#f0f0f0") 
-    app = ChamranApp(root)
-    root.protocol("WM_DELETE_WINDOW", lambda: [app.session.close(), root.destroy()])
-    root.mainloop()
\ No newline at end of file
+    app = ChamranApp(root, profiler=profiler)
+    root.protocol("WM_DELETE_WINDOW",
+                  lambda: [app.queries.shutdown(), app.session.close(), close_database(), root.destroy()])
+    root.mainloop()
+
+    if profiler is not None:
+        if args.profile_output:
+            profiler.dump(args.profile_output)
+        else:
+            print(profiler.format_report())
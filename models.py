@@ -0,0 +1,758 @@
+"""مدل‌های دیتابیس، اتصال و نگهداری اسکیما (SQLAlchemy Code-First)."""
+from sqlalchemy import (create_engine, event, select, insert, update, delete, literal, literal_column, bindparam,
+                        Column, Integer, String, ForeignKey, Float, Index, DateTime, Text, func, inspect, or_, text)
+from sqlalchemy.orm import (declarative_base, sessionmaker, relationship, attributes, column_property,
+                            with_loader_criteria)
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.pool import NullPool, QueuePool
+from collections import defaultdict
+import datetime
+import json
+import os
+
+# ---------------------------------------------------------
+# تنظیمات دیتابیس و مدل‌ها (SQLAlchemy Code-First)
+# ---------------------------------------------------------
+
+DB_FILE = 'chamran_uni.db'
+Base = declarative_base()
+
+# --- تعریف مدل‌ها ---
+
+def _deleted_flag():
+    """پرچم حذف نرم؛ ردیف حذف‌شده در جدول می‌ماند تا با بازگردانی یا واگرد برگردد."""
+    return Column(Integer, nullable=False, default=0, server_default='0')
+
+
+def _trash_index(table_name, pk_name):
+    # ایندکس جزئی فقط روی ردیف‌های حذف‌شده: سطل بازیافت بدون اسکن جدول خوانده می‌شود و چون شرط Deleted = 0
+    # کوئری‌های عادی با آن نمی‌خواند، طرح اجرای آن‌ها (ایندکس‌های نام، رشته و ...) عوض نمی‌شود
+    condition = text('"Deleted" = 1')
+    return Index(f'ix_{table_name}_Deleted', pk_name, sqlite_where=condition, postgresql_where=condition)
+
+
+class Master(Base):
+    __tablename__ = 'Master'
+    MasterId = Column(Integer, primary_key=True, autoincrement=True)
+    Name = Column(String(100), nullable=False, index=True) 
+    Graduation = Column(String(50))
+    Mobile = Column(String(20), nullable=False)
+    Email = Column(String(100), nullable=True)
+    Deleted = _deleted_flag()
+    presentations = relationship("Presentation", back_populates="master")
+    __table_args__ = (_trash_index('Master', 'MasterId'),)
+    COLUMNS = {"ID": "MasterId", "نام استاد": "Name", "مدرک": "Graduation", "موبایل": "Mobile", "ایمیل": "Email"}
+
+class Lesson(Base):
+    __tablename__ = 'Lesson'
+    LessonId = Column(Integer, primary_key=True, autoincrement=True)
+    Name = Column(String(100), nullable=False, index=True)
+    Unit = Column(Integer, nullable=False)     
+    Major = Column(String(50), nullable=False) 
+    Deleted = _deleted_flag()
+    presentations = relationship("Presentation", back_populates="lesson") 
+    __table_args__ = (Index('ix_Lesson_Major_Name', 'Major', 'Name'), _trash_index('Lesson', 'LessonId'))
+    COLUMNS = {"ID": "LessonId", "نام درس": "Name", "تعداد واحد": "Unit", "رشته": "Major"}
+
+class Presentation(Base):
+    __tablename__ = 'Presentation'
+    PresentationId = Column(Integer, primary_key=True, autoincrement=True)
+    MasterId = Column(Integer, ForeignKey('Master.MasterId'), nullable=False, index=True)
+    LessonId = Column(Integer, ForeignKey('Lesson.LessonId'), nullable=False, index=True)
+    DayHold = Column(String(50))
+    StartTime = Column(Integer)
+    FinishTime = Column(Integer)
+    # Capacity خالی یعنی بدون محدودیت؛ Enrolled تعداد انتخاب‌های ارائه است و همراه هر ثبت‌نام/حذف به‌روز می‌شود
+    Capacity = Column(Integer)
+    Enrolled = Column(Integer, nullable=False, default=0, server_default='0')
+    Deleted = _deleted_flag()
+    master = relationship("Master", back_populates="presentations")
+    lesson = relationship("Lesson", back_populates="presentations") 
+    selections = relationship("Selection", back_populates="presentation")
+    # جستجوی بازه‌ای تداخل برنامه یک استاد در یک روز (schedule.master_conflicts)
+    __table_args__ = (Index('ix_Presentation_MasterId_DayHold_StartTime', 'MasterId', 'DayHold', 'StartTime'),
+                      _trash_index('Presentation', 'PresentationId'))
+    COLUMNS = {"ID": "PresentationId", "نام استاد": "MasterId", "نام درس": "LessonId", "روز": "DayHold", "شروع": "StartTime", "پایان": "FinishTime", "ظرفیت": "Capacity", "ثبت‌نام": "Enrolled"}
+
+class Student(Base):
+    __tablename__ = 'Student'
+    IdStudent = Column(Integer, primary_key=True, autoincrement=True)
+    Name = Column(String(100), nullable=False, index=True)
+    EntranceTerm = Column(String(10)) 
+    Graduation = Column(String(50))
+    Mobile = Column(String(20), nullable=False, index=True)
+    Email = Column(String(100), nullable=True)
+    Major = Column(String(50), nullable=False) 
+    Deleted = _deleted_flag()
+    selections = relationship("Selection", back_populates="student")
+    __table_args__ = (Index('ix_Student_Major_Name', 'Major', 'Name'), _trash_index('Student', 'IdStudent'))
+    COLUMNS = {"ID": "IdStudent", "نام دانشجو": "Name", "ترم ورود": "EntranceTerm", "مقطع": "Graduation", "موبایل": "Mobile", "ایمیل": "Email", "رشته": "Major"}
+
+class Selection(Base):
+    __tablename__ = 'Selection'
+    IdSelection = Column(Integer, primary_key=True, autoincrement=True)
+    # active_history: مقدار قبلی حتی روی شیء expireشده (پس از commit) هم پیش از تغییر خوانده می‌شود تا
+    # track_gpa_summary و track_enrollment سهم قبلی انتخاب را بدانند
+    IdStudent = column_property(Column(Integer, ForeignKey('Student.IdStudent'), nullable=False), active_history=True)
+    IdPresentation = column_property(Column(Integer, ForeignKey('Presentation.PresentationId'), nullable=False,
+                                            index=True), active_history=True)
+    Score = column_property(Column(Float, nullable=True), active_history=True)
+    YearEducation = column_property(Column(Integer, index=True), active_history=True)
+    Deleted = column_property(_deleted_flag(), active_history=True)
+    student = relationship("Student", back_populates="selections")
+    presentation = relationship("Presentation", back_populates="selections")
+    __table_args__ = (Index('ix_Selection_IdStudent_Score', 'IdStudent', 'Score'), _trash_index('Selection', 'IdSelection'))
+    COLUMNS = {"ID": "IdSelection", "نام دانشجو": "IdStudent", "درس ارائه شده": "IdPresentation", "نمره": "Score", "سال": "YearEducation"}
+
+class StudentGpaSummary(Base):
+    """خلاصه تجمیعی معدل: مجموع نمره×واحد و مجموع واحد هر دانشجو (کل و به تفکیک سال تحصیلی)."""
+    __tablename__ = 'StudentGpaSummary'
+    IdStudent = Column(Integer, ForeignKey('Student.IdStudent'), primary_key=True)
+    YearEducation = Column(Integer, primary_key=True)  # ALL_YEARS = ردیف کل سال‌ها
+    WeightedSum = Column(Float, nullable=False, default=0)
+    UnitSum = Column(Integer, nullable=False, default=0)
+
+class ChangeSet(Base):
+    """یک عملیات در تاریخچه؛ Undone برای عملیات فعال ۰ و برای واگردشده بزرگ‌ترین شناسه عملیات هنگام واگرد است."""
+    __tablename__ = 'ChangeSet'
+    ChangeSetId = Column(Integer, primary_key=True, autoincrement=True)
+    Description = Column(String(200))
+    CreatedAt = Column(DateTime, default=datetime.datetime.now)
+    Undone = Column(Integer, nullable=False, default=0, server_default='0', index=True)
+
+class ChangeJournal(Base):
+    """تاریخچه فقط‌افزودنی تغییرات ردیف‌ها: تصویر قبل و بعد ستون‌های تغییرکرده به صورت JSON."""
+    __tablename__ = 'ChangeJournal'
+    EntryId = Column(Integer, primary_key=True, autoincrement=True)
+    ChangeSetId = Column(Integer, ForeignKey('ChangeSet.ChangeSetId'), nullable=False, index=True)
+    TableName = Column(String(50), nullable=False)
+    RowId = Column(Integer, nullable=False)
+    Action = Column(String(10), nullable=False)  # insert / update / delete / restore
+    Before = Column(Text)
+    After = Column(Text)
+
+class SchemaVersion(Base):
+    """نسخه‌های مهاجرت اعمال‌شده روی فایل دیتابیس."""
+    __tablename__ = 'SchemaVersion'
+    Version = Column(Integer, primary_key=True, autoincrement=False)
+    Description = Column(String(200))
+
+
+# --- جدول خلاصه معدل (به‌روزرسانی دلتایی) ---
+
+ALL_YEARS = -1
+SELECTION_GPA_FIELDS = ('IdStudent', 'IdPresentation', 'YearEducation', 'Score')
+# کلیدهای خارجی که با رابطه (مثل selection.presentation = ...) هم عوض می‌شوند و تا flush خالی می‌مانند
+SELECTION_GPA_RELATIONS = ('student', 'presentation')
+
+
+def _old_value(obj, attr):
+    """مقدار ذخیره‌شده یک فیلد، پیش از تغییرات فعلی session."""
+    history = attributes.get_history(obj, attr)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _has_changes(obj, *attrs):
+    # بدون بارگذاری: رابطه‌ای که خوانده نشده تغییری هم ندارد
+    return any(attributes.get_history(obj, attr, attributes.PASSIVE_NO_INITIALIZE).has_changes() for attr in attrs)
+
+
+def add_gpa_delta(deltas, student_id, year, weighted, units):
+    years = (ALL_YEARS,) if year is None else (ALL_YEARS, year)
+    for key_year in years:
+        deltas[(student_id, key_year)][0] += weighted
+        deltas[(student_id, key_year)][1] += units
+
+
+def _chunked(items, size=500):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def apply_gpa_deltas(connection, deltas):
+    """دلتاهای {(دانشجو، سال): [مجموع نمره×واحد، مجموع واحد]} را با UPDATE و INSERT چندردیفی اعمال می‌کند."""
+    summary = StudentGpaSummary.__table__
+    changed = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if not changed:
+        return
+    touched = {student_id for student_id, year in changed}
+
+    existing = set()
+    for students in _chunked(touched):
+        existing.update(connection.execute(
+            select(summary.c.IdStudent, summary.c.YearEducation).where(summary.c.IdStudent.in_(students))).all())
+
+    updates = [{'b_student': student_id, 'b_year': year, 'b_weighted': weighted, 'b_units': units}
+               for (student_id, year), (weighted, units) in changed.items() if (student_id, year) in existing]
+    inserts = [{'IdStudent': student_id, 'YearEducation': year, 'WeightedSum': weighted, 'UnitSum': units}
+               for (student_id, year), (weighted, units) in changed.items() if (student_id, year) not in existing]
+    if updates:
+        connection.execute(
+            update(summary)
+            .where(summary.c.IdStudent == bindparam('b_student'), summary.c.YearEducation == bindparam('b_year'))
+            .values(WeightedSum=summary.c.WeightedSum + bindparam('b_weighted'),
+                    UnitSum=summary.c.UnitSum + bindparam('b_units')),
+            updates)
+    if inserts:
+        connection.execute(insert(summary), inserts)
+
+    for students in _chunked(touched):
+        connection.execute(delete(summary).where(summary.c.IdStudent.in_(students), summary.c.UnitSum <= 0))
+
+
+def _regrouped_scores(condition, excluded=()):
+    """مجموع نمره×واحد و مجموع واحد نمرات ثبت‌شده به تفکیک (دانشجو، سال) برای انتخاب‌هایی که شرط را دارند."""
+    query = select(Selection.IdStudent, Selection.YearEducation, func.sum(Selection.Score * Lesson.Unit),
+                   func.sum(Lesson.Unit)) \
+        .select_from(Selection) \
+        .join(Presentation, Selection.IdPresentation == Presentation.PresentationId) \
+        .join(Lesson, Presentation.LessonId == Lesson.LessonId) \
+        .where(condition, Selection.Score != None, Selection.Deleted == 0)
+    if excluded:
+        query = query.where(Selection.IdSelection.not_in(excluded))
+    return query.group_by(Selection.IdStudent, Selection.YearEducation)
+
+
+def _add_selection_deltas(connection, deltas, contributions):
+    """دلتای (علامت، دانشجو، ارائه، سال، نمره)ها را با واحد فعلی درس هر ارائه در دیتابیس اضافه می‌کند."""
+    presentation_ids = {c[2] for c in contributions if c[4] is not None}
+    units = dict(connection.execute(
+        select(Presentation.PresentationId, Lesson.Unit)
+        .join(Lesson, Presentation.LessonId == Lesson.LessonId)
+        .where(Presentation.PresentationId.in_(presentation_ids))).all()) if presentation_ids else {}
+
+    for sign, student_id, presentation_id, year, score in contributions:
+        unit = units.get(presentation_id)
+        if score is None or unit is None:
+            continue
+        add_gpa_delta(deltas, student_id, year, sign * score * unit, sign * unit)
+
+
+def _add_regrouped_deltas(connection, deltas, condition, excluded, sign):
+    for student_id, year, weighted, units in connection.execute(_regrouped_scores(condition, excluded)):
+        add_gpa_delta(deltas, student_id, year, sign * weighted, sign * units)
+
+
+def track_gpa_summary(session, flush_context, instances):
+    """پیش از هر flush، سهم قبلی انتخاب‌های تغییرکرده و ارائه‌های با واحد تغییرکرده را از خلاصه معدل کم می‌کند."""
+    session.info.pop('gpa_pending', None)
+    removed, added = [], []
+    lesson_ids, presentation_ids = set(), set()
+
+    for obj in session.new:
+        if isinstance(obj, Selection) and not obj.Deleted:
+            added.append(obj)
+
+    for obj in session.deleted:
+        if isinstance(obj, Selection) and not _old_value(obj, 'Deleted'):
+            removed.append(obj)
+
+    for obj in session.dirty:
+        if isinstance(obj, Selection) and _has_changes(obj, *SELECTION_GPA_FIELDS, *SELECTION_GPA_RELATIONS, 'Deleted'):
+            if not _old_value(obj, 'Deleted'):
+                removed.append(obj)
+            if not obj.Deleted:
+                added.append(obj)
+        elif isinstance(obj, Lesson) and _has_changes(obj, 'Unit'):
+            lesson_ids.add(obj.LessonId)
+        elif isinstance(obj, Presentation) and _has_changes(obj, 'LessonId', 'lesson'):
+            presentation_ids.add(obj.PresentationId)
+
+    if not removed and not added and not lesson_ids and not presentation_ids:
+        return
+
+    deltas = defaultdict(lambda: [0.0, 0])
+    # نمره‌های انتخاب‌هایی که در همین flush تغییر می‌کنند فقط از راه سهم قبلی/جدید خودشان حساب می‌شوند
+    excluded = [obj.IdSelection for obj in removed]
+    conditions = []
+    if lesson_ids:
+        conditions.append(Presentation.LessonId.in_(lesson_ids))
+    if presentation_ids:
+        conditions.append(Presentation.PresentationId.in_(presentation_ids))
+    regrouped = or_(*conditions) if conditions else None
+
+    contributions = [(-1, *(_old_value(obj, attr) for attr in SELECTION_GPA_FIELDS)) for obj in removed]
+    if regrouped is None:
+        # واحدی در این flush عوض نمی‌شود؛ سهم جدید انتخاب‌هایی که شناسه‌هایشان معلوم است با همان کوئری واحدها حساب
+        # می‌شود و فقط انتخاب‌های وابسته به ردیف تازه یا رابطه تغییرکرده به پس از flush می‌روند
+        pending = []
+        for obj in added:
+            if obj.IdStudent is None or obj.IdPresentation is None or _has_changes(obj, *SELECTION_GPA_RELATIONS):
+                pending.append(obj)
+            else:
+                contributions.append((1, *(getattr(obj, attr) for attr in SELECTION_GPA_FIELDS)))
+        added = pending
+    if contributions or regrouped is not None:
+        connection = session.connection()
+        _add_selection_deltas(connection, deltas, contributions)
+        if regrouped is not None:
+            _add_regrouped_deltas(connection, deltas, regrouped, excluded, -1)
+    session.info['gpa_pending'] = deltas, added, regrouped, excluded
+
+
+def apply_gpa_summary(session, flush_context):
+    """پس از flush، سهم جدید انتخاب‌ها با واحدهای جدید اضافه و دلتاها در جدول خلاصه نوشته می‌شوند."""
+    pending = session.info.pop('gpa_pending', None)
+    if pending is None:
+        return
+    deltas, added, regrouped, excluded = pending
+    connection = session.connection()
+    if added:
+        _add_selection_deltas(connection, deltas,
+                              [(1, *(getattr(obj, attr) for attr in SELECTION_GPA_FIELDS)) for obj in added])
+    if regrouped is not None:
+        _add_regrouped_deltas(connection, deltas, regrouped, excluded + [obj.IdSelection for obj in added], 1)
+    apply_gpa_deltas(connection, deltas)
+
+
+event.listen(OrmSession, 'before_flush', track_gpa_summary)
+event.listen(OrmSession, 'after_flush', apply_gpa_summary)
+
+
+# --- ظرفیت ارائه‌ها ---
+
+class PresentationFullError(ValueError):
+    """ارائه ظرفیت خالی ندارد."""
+
+
+def take_seat(connection, presentation_id) -> bool:
+    """یک صندلی ارائه را با یک UPDATE شرطی رزرو می‌کند؛ برای ارائه پر، ناموجود یا حذف‌شده False برمی‌گرداند."""
+    presentation = Presentation.__table__
+    result = connection.execute(
+        update(presentation)
+        .where(presentation.c.PresentationId == presentation_id, presentation.c.Deleted == 0,
+               or_(presentation.c.Capacity.is_(None), presentation.c.Enrolled < presentation.c.Capacity))
+        .values(Enrolled=presentation.c.Enrolled + 1))
+    return result.rowcount == 1
+
+
+def adjust_enrolled(connection, counts):
+    """شمارنده ثبت‌نام ارائه‌ها را بدون بررسی ظرفیت با {شناسه ارائه: تغییر} جابه‌جا می‌کند."""
+    presentation = Presentation.__table__
+    params = [{'b_present': present_id, 'b_count': count} for present_id, count in counts.items() if count]
+    if params:
+        connection.execute(
+            update(presentation)
+            .where(presentation.c.PresentationId == bindparam('b_present'))
+            .values(Enrolled=presentation.c.Enrolled + bindparam('b_count')),
+            params)
+
+
+def track_enrollment(session, flush_context, instances):
+    """پیش از هر flush، شمارنده ثبت‌نام ارائه‌ها را با درج/حذف/جابه‌جایی انتخاب‌ها همگام می‌کند."""
+    taken, released, capacities = [], defaultdict(int), []
+
+    for obj in session.new:
+        if isinstance(obj, Selection) and obj.IdPresentation is not None and not obj.Deleted:
+            taken.append(obj.IdPresentation)
+
+    for obj in session.deleted:
+        if isinstance(obj, Selection) and not _old_value(obj, 'Deleted'):
+            released[_old_value(obj, 'IdPresentation')] -= 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Selection) and _has_changes(obj, 'IdPresentation', 'Deleted'):
+            if not _old_value(obj, 'Deleted'):
+                released[_old_value(obj, 'IdPresentation')] -= 1
+            if obj.IdPresentation is not None and not obj.Deleted:
+                taken.append(obj.IdPresentation)
+        elif isinstance(obj, Presentation) and _has_changes(obj, 'Capacity') and obj.Capacity is not None:
+            capacities.append((obj.PresentationId, obj.Capacity))
+
+    if not taken and not released and not capacities:
+        return
+
+    connection = session.connection()
+    adjust_enrolled(connection, released)
+    for presentation_id in taken:
+        if not take_seat(connection, presentation_id):
+            raise PresentationFullError("ظرفیت ارائه انتخاب‌شده تکمیل است.")
+
+    for presentation_id, capacity in capacities:
+        enrolled = connection.execute(
+            select(Presentation.Enrolled).where(Presentation.PresentationId == presentation_id)).scalar() or 0
+        if capacity < enrolled:
+            raise ValueError(f"ظرفیت نمی‌تواند کمتر از تعداد ثبت‌نام‌شده‌ها ({enrolled}) باشد.")
+
+
+event.listen(OrmSession, 'before_flush', track_enrollment)
+
+
+def recount_enrolled(connection, presentation_ids=None):
+    """شمارنده ثبت‌نام همه ارائه‌ها (یا فقط ارائه‌های داده‌شده) را از نو با شمردن انتخاب‌ها می‌سازد."""
+    presentation = Presentation.__table__
+    counts = select(func.count()).select_from(Selection) \
+        .where(Selection.IdPresentation == presentation.c.PresentationId, Selection.Deleted == 0).scalar_subquery()
+    if presentation_ids is None:
+        connection.execute(update(presentation).values(Enrolled=counts))
+        return
+    for chunk in _chunked(presentation_ids):
+        connection.execute(update(presentation).where(presentation.c.PresentationId.in_(chunk)).values(Enrolled=counts))
+
+
+def _summary_source(student_ids=None, per_year=False):
+    """کوئری تجمیعی از ابتدا (بدون جدول خلاصه) برای ساخت یا بررسی جدول خلاصه."""
+    year = Selection.YearEducation if per_year else literal(ALL_YEARS)
+    query = select(
+        Selection.IdStudent, year, func.sum(Selection.Score * Lesson.Unit), func.sum(Lesson.Unit)
+    ).select_from(Selection) \
+     .join(Presentation, Selection.IdPresentation == Presentation.PresentationId) \
+     .join(Lesson, Presentation.LessonId == Lesson.LessonId) \
+     .where(Selection.Score != None, Selection.Deleted == 0) \
+     .having(func.sum(Lesson.Unit) > 0)
+    if per_year:
+        query = query.where(Selection.YearEducation != None).group_by(Selection.IdStudent, Selection.YearEducation)
+    else:
+        query = query.group_by(Selection.IdStudent)
+    if student_ids is not None:
+        query = query.where(Selection.IdStudent.in_(student_ids))
+    return query
+
+
+def rebuild_gpa_summary(connection, student_ids=None):
+    """جدول خلاصه معدل را (برای همه یا فقط دانشجویان داده‌شده) از روی داده‌های خام بازسازی می‌کند."""
+    summary = StudentGpaSummary.__table__
+    clear = delete(summary)
+    if student_ids is not None:
+        student_ids = list(student_ids)
+        clear = clear.where(summary.c.IdStudent.in_(student_ids))
+    connection.execute(clear)
+
+    columns = [summary.c.IdStudent, summary.c.YearEducation, summary.c.WeightedSum, summary.c.UnitSum]
+    for per_year in (False, True):
+        connection.execute(insert(summary).from_select(columns, _summary_source(student_ids, per_year)))
+
+
+def verify_gpa_summary(connection, tolerance=1e-6):
+    """جدول خلاصه را با تجمیع از ابتدا مقایسه و لیست مغایرت‌ها را برمی‌گرداند."""
+    expected = {}
+    for per_year in (False, True):
+        for student_id, year, weighted, units in connection.execute(_summary_source(per_year=per_year)):
+            expected[(student_id, year)] = (weighted, units)
+
+    actual = {(row[0], row[1]): (row[2], row[3]) for row in connection.execute(select(StudentGpaSummary.__table__))}
+
+    mismatches = []
+    for key in expected.keys() | actual.keys():
+        exp_weighted, exp_units = expected.get(key, (0.0, 0))
+        act_weighted, act_units = actual.get(key, (0.0, 0))
+        if exp_units != act_units or abs(exp_weighted - act_weighted) > tolerance:
+            mismatches.append((key, (exp_weighted, exp_units), (act_weighted, act_units)))
+    return sorted(mismatches)
+
+
+# --- شمارنده نسخه جدول‌ها (برای باطل کردن cacheها) ---
+
+TABLE_VERSIONS = defaultdict(int)
+
+
+def table_versions(*models):
+    """نسخه فعلی جدول‌های چند مدل؛ با هر commit که ردیفی از آن جدول را تغییر دهد یک واحد زیاد می‌شود."""
+    return tuple(TABLE_VERSIONS[model.__tablename__] for model in models)
+
+
+def bump_table_versions(*table_names):
+    """برای نوشتن‌هایی که از ORM عبور نمی‌کنند (مثل INSERT دسته‌ای Core) باید دستی صدا زده شود."""
+    for table_name in table_names:
+        TABLE_VERSIONS[table_name] += 1
+
+
+def _collect_changed_tables(session, flush_context):
+    changed = session.info.setdefault('changed_tables', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        changed.add(obj.__table__.name)
+
+
+def _publish_changed_tables(session):
+    # نسخه‌ها فقط پس از commit زیاد می‌شوند تا خواننده‌های دیگر داده قدیمی را با نسخه جدید cache نکنند
+    bump_table_versions(*session.info.pop('changed_tables', ()))
+
+
+def _discard_changed_tables(session):
+    session.info.pop('changed_tables', None)
+
+
+event.listen(OrmSession, 'after_flush', _collect_changed_tables)
+event.listen(OrmSession, 'after_commit', _publish_changed_tables)
+event.listen(OrmSession, 'after_rollback', _discard_changed_tables)
+
+
+# --- حذف نرم ---
+
+SOFT_DELETE_MODELS = (Master, Lesson, Presentation, Student, Selection)
+
+# شرط ردیف‌های حذف‌شده با عدد ثابت (نه پارامتر) تا SQLite بتواند از ایندکس جزئی _trash_index استفاده کند
+DELETED = literal_column('1')
+
+_LIVE_ROWS = [with_loader_criteria(model, lambda cls: cls.Deleted == 0, include_aliases=True)
+              for model in SOFT_DELETE_MODELS]
+
+
+def _hide_deleted_rows(execute_state):
+    """شرط Deleted = 0 را به همه کوئری‌های ORM اضافه می‌کند، مگر با execution_options(include_deleted=True)."""
+    if (execute_state.is_select and not execute_state.is_column_load and not execute_state.is_relationship_load
+            and not execute_state.execution_options.get('include_deleted', False)):
+        execute_state.statement = execute_state.statement.options(*_LIVE_ROWS)
+
+
+event.listen(OrmSession, 'do_orm_execute', _hide_deleted_rows)
+
+
+# --- تاریخچه تغییرات (journal) ---
+
+JOURNAL_TABLES = {model.__tablename__: model for model in SOFT_DELETE_MODELS}
+# شمارنده‌های مشتق‌شده در تاریخچه نمی‌آیند؛ پس از واگرد از روی داده‌ها از نو ساخته می‌شوند
+JOURNAL_SKIPPED_COLUMNS = {'Enrolled'}
+ACTION_LABELS = {'insert': 'درج', 'update': 'ویرایش', 'delete': 'حذف', 'restore': 'بازگردانی'}
+TABLE_LABELS = {'Master': 'استاد', 'Lesson': 'درس', 'Presentation': 'ارائه', 'Student': 'دانشجو',
+                'Selection': 'انتخاب واحد'}
+
+
+def describe_changes(entries):
+    """توضیح کوتاه یک عملیات برای دکمه‌ها و لیست تاریخچه، از روی اولین ورودی آن."""
+    table_name, row_id, action = entries[0][:3]
+    label = TABLE_LABELS.get(table_name, table_name)
+    if len(entries) == 1:
+        return f"{ACTION_LABELS[action]} {label} {row_id}"
+    return f"{ACTION_LABELS[action]} {len(entries)} {label}"
+
+
+def open_change_set(connection, description):
+    return connection.execute(insert(ChangeSet.__table__).values(Description=description[:200])).inserted_primary_key[0]
+
+
+_IMAGE_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def _image_json(image):
+    return None if image is None else _IMAGE_ENCODER.encode(image)
+
+
+def write_journal(connection, change_set_id, entries):
+    """ورودی‌های (جدول، شناسه ردیف، عمل، تصویر قبل، تصویر بعد) را با یک INSERT چندردیفی ثبت می‌کند."""
+    connection.execute(insert(ChangeJournal.__table__), [
+        {'ChangeSetId': change_set_id, 'TableName': table_name, 'RowId': row_id, 'Action': action,
+         'Before': _image_json(before), 'After': _image_json(after)}
+        for table_name, row_id, action, before, after in entries])
+
+
+def journal_changes(session, entries, description=None):
+    """ورودی‌ها را در همان تراکنش session به عملیات جاری تاریخچه اضافه می‌کند (اولین بار عملیات ساخته می‌شود)."""
+    if not entries:
+        return
+    connection = session.connection()
+    change_set_id = session.info.get('change_set')
+    if change_set_id is None:
+        change_set_id = session.info['change_set'] = open_change_set(connection, description or describe_changes(entries))
+    write_journal(connection, change_set_id, entries)
+
+
+def _journal_flush(session, flush_context):
+    """پس از هر flush، درج و ویرایش ردیف‌های جدول‌های اصلی را با تصویر قبل و بعد در تاریخچه ثبت می‌کند."""
+    entries = []
+    for obj in session.new:
+        if obj.__tablename__ in JOURNAL_TABLES:
+            state = inspect(obj)
+            after = {column.key: state.dict.get(column.key) for column in obj.__table__.columns
+                     if column.key not in JOURNAL_SKIPPED_COLUMNS}
+            entries.append((obj.__tablename__, after[obj.__mapper__.primary_key[0].key], 'insert', None, after))
+
+    for obj in session.dirty:
+        if obj.__tablename__ not in JOURNAL_TABLES:
+            continue
+        state = inspect(obj)
+        before, after = {}, {}
+        for column in obj.__table__.columns:
+            if column.key in JOURNAL_SKIPPED_COLUMNS:
+                continue
+            history = state.attrs[column.key].history
+            if history.added and (history.deleted or [None])[0] != history.added[0]:
+                before[column.key] = (history.deleted or [None])[0]
+                after[column.key] = history.added[0]
+        if after:
+            action = {(0, 1): 'delete', (1, 0): 'restore'}.get((before.get('Deleted'), after.get('Deleted')), 'update')
+            entries.append((obj.__tablename__, state.dict.get(obj.__mapper__.primary_key[0].key), action, before, after))
+
+    journal_changes(session, entries)
+
+
+def _close_change_set(session):
+    session.info.pop('change_set', None)
+
+
+event.listen(OrmSession, 'after_flush', _journal_flush)
+event.listen(OrmSession, 'after_commit', _close_change_set)
+event.listen(OrmSession, 'after_rollback', _close_change_set)
+
+
+# --- مهاجرت نسخه‌دار اسکیما ---
+
+def create_declared_indexes(connection):
+    """ایندکس‌های تعریف‌شده در مدل‌ها را که هنوز در دیتابیس وجود ندارند می‌سازد."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def add_presentation_capacity(connection):
+    """ستون‌های Capacity و Enrolled را به جدول ارائه قدیمی اضافه و Enrolled را از روی انتخاب‌ها پر می‌کند."""
+    existing = {column['name'] for column in inspect(connection).get_columns('Presentation')}
+    if 'Capacity' not in existing:
+        connection.execute(text('ALTER TABLE "Presentation" ADD COLUMN "Capacity" INTEGER'))
+    if 'Enrolled' not in existing:
+        connection.execute(text('ALTER TABLE "Presentation" ADD COLUMN "Enrolled" INTEGER NOT NULL DEFAULT 0'))
+    recount_enrolled(connection)
+
+
+def add_soft_delete_columns(connection):
+    """ستون Deleted را به جدول‌های قدیمی که آن را ندارند اضافه می‌کند."""
+    for model in SOFT_DELETE_MODELS:
+        existing = {column['name'] for column in inspect(connection).get_columns(model.__tablename__)}
+        if 'Deleted' not in existing:
+            connection.execute(text(f'ALTER TABLE "{model.__tablename__}" ADD COLUMN "Deleted" INTEGER NOT NULL DEFAULT 0'))
+
+
+def add_soft_delete(connection):
+    """ستون Deleted را به جدول‌های قدیمی اضافه و ایندکس جزئی ردیف‌های حذف‌شده را می‌سازد."""
+    add_soft_delete_columns(connection)
+    create_declared_indexes(connection)
+
+
+# create_all فقط جدول‌های جدید را می‌سازد و جدول‌های موجود را تغییر نمی‌دهد؛
+# تغییرات روی فایل‌های دیتابیس قدیمی به ترتیب نسخه از این لیست اعمال می‌شوند.
+MIGRATIONS = [
+    (1, "ساخت جدول خلاصه معدل از روی نمرات موجود", rebuild_gpa_summary),
+    (2, "ایندکس کلیدهای خارجی و ستون‌های فیلتر رشته", create_declared_indexes),
+    (3, "ایندکس ستون‌های جستجو و مرتب‌سازی تب‌ها (نام، موبایل، سال تحصیلی)", create_declared_indexes),
+    (4, "ایندکس بازه‌های زمانی ارائه‌های هر استاد برای بررسی تداخل", create_declared_indexes),
+    (5, "ستون‌های ظرفیت و تعداد ثبت‌نام ارائه", add_presentation_capacity),
+    (6, "حذف نرم (ستون Deleted) و جدول‌های تاریخچه تغییرات", add_soft_delete),
+]
+
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+SOFT_DELETE_VERSION = 6
+
+
+def schema_version(connection):
+    """نسخه اسکیمای فایل دیتابیس (0 برای دیتابیس خالی یا قدیمی‌تر از جدول SchemaVersion)."""
+    if not inspect(connection).has_table(SchemaVersion.__tablename__):
+        return 0
+    return connection.execute(select(func.max(SchemaVersion.Version))).scalar() or 0
+
+
+def migrate(engine):
+    """جدول‌های جدید را می‌سازد و مهاجرت‌های اعمال‌نشده را به ترتیب اجرا می‌کند؛ نسخه نهایی را برمی‌گرداند."""
+    # دیتابیس به‌روز بدون create_all برمی‌گردد؛ پس هر جدول جدید به یک مهاجرت در MIGRATIONS نیاز دارد
+    with engine.connect() as connection:
+        current = schema_version(connection)
+    if current >= LATEST_VERSION:
+        return current
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        current = connection.execute(select(func.max(SchemaVersion.Version))).scalar() or 0
+        if current < SOFT_DELETE_VERSION:
+            # مهاجرت‌های قدیمی‌تر با کوئری‌ها و ایندکس‌های مدل فعلی اجرا می‌شوند که ستون Deleted را می‌خوانند
+            # (بازسازی معدل، شمارش ثبت‌نام و ایندکس‌های جزئی)؛ پس این ستون پیش از همه آن‌ها اضافه می‌شود
+            add_soft_delete_columns(connection)
+        for version, description, upgrade in MIGRATIONS:
+            if version <= current:
+                continue
+            upgrade(connection)
+            connection.execute(insert(SchemaVersion).values(Version=version, Description=description))
+            current = version
+    return current
+
+
+# --- پروفایل‌های اتصال SQLite ---
+
+# PRAGMAهای هر پروفایل روی هر اتصال جدید اجرا می‌شوند. 'wal' برای چند کاربر همزمان روی یک فایل محلی است:
+# خواننده‌ها نویسنده را متوقف نمی‌کنند و commit بدون fsync کامل انجام می‌شود. WAL روی فایل اشتراکی شبکه
+# کار نمی‌کند؛ برای آن حالت 'network' همان rollback journal را با انتظار طولانی‌تر برای قفل نگه می‌دارد.
+ENGINE_PROFILES = {
+    'legacy': {'pragmas': {}, 'poolclass': QueuePool},
+    'wal': {
+        'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -64000,
+                    'mmap_size': 256 * 1024 * 1024, 'temp_store': 'MEMORY', 'busy_timeout': 5000},
+        'poolclass': QueuePool,
+    },
+    'wal_durable': {
+        'pragmas': {'journal_mode': 'WAL', 'synchronous': 'FULL', 'cache_size': -64000,
+                    'mmap_size': 256 * 1024 * 1024, 'temp_store': 'MEMORY', 'busy_timeout': 5000},
+        'poolclass': QueuePool,
+    },
+    'network': {
+        'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'cache_size': -16000,
+                    'temp_store': 'MEMORY', 'busy_timeout': 30000},
+        # اتصال باز نگه داشته نمی‌شود تا cache صفحات بین دو کاربر روی فایل شبکه کهنه نماند
+        'poolclass': NullPool,
+    },
+}
+DB_PROFILE = os.environ.get('CHAMRAN_DB_PROFILE', 'wal')
+
+
+def make_engine(url, profile=DB_PROFILE, **options):
+    """engine با PRAGMAها و نوع pool پروفایل داده‌شده می‌سازد؛ options مستقیماً به create_engine می‌رود."""
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"پروفایل اتصال '{profile}' تعریف نشده است (گزینه‌ها: {', '.join(ENGINE_PROFILES)})")
+    settings = ENGINE_PROFILES[profile]
+    url = make_url(url)
+    if url.get_backend_name() != 'sqlite':
+        return create_engine(url, **options)
+
+    if url.database not in (None, '', ':memory:'):
+        options.setdefault('poolclass', settings['poolclass'])
+        options.setdefault('connect_args', {'check_same_thread': False})
+    engine = create_engine(url, **options)
+
+    pragmas = settings['pragmas']
+    if pragmas:
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    return engine
+
+
+# --- پیکربندی اتصال ---
+
+# آدرس دیتابیس و گزینه‌های create_engine (به صورت JSON، مثلاً {"pool_size": 10}) از متغیرهای محیطی خوانده
+# می‌شوند. ساخت engine به دیتابیس وصل نمی‌شود و اسکیما فقط با فراخوانی صریح migrate ساخته یا به‌روز می‌شود.
+DATABASE_URL = os.environ.get('CHAMRAN_DATABASE_URL', f'sqlite:///{DB_FILE}')
+DB_OPTIONS = json.loads(os.environ.get('CHAMRAN_DB_OPTIONS', '{}'))
+
+engine = make_engine(DATABASE_URL, DB_PROFILE, **DB_OPTIONS)
+Session = sessionmaker(bind=engine)
+
+
+def configure_database(url=None, profile=None, **options):
+    """engine سراسری و Session را به دیتابیس دیگری وصل می‌کند و engine جدید را برمی‌گرداند."""
+    global engine
+    previous = engine
+    engine = make_engine(url or DATABASE_URL, profile or DB_PROFILE, **(options or DB_OPTIONS))
+    Session.configure(bind=engine)
+    previous.dispose()
+    return engine
+
+
+def get_engine():
+    """engine فعلی؛ پس از configure_database با engine زمان import یکی نیست."""
+    return engine
+
+
+def close_database():
+    """هنگام خروج: WAL را در فایل اصلی checkpoint و اتصال‌ها را می‌بندد تا فایل .db به تنهایی کامل باشد."""
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    engine.dispose()
@@ -0,0 +1,236 @@
+"""تشخیص تداخل زمانی در برنامه کلاسی: ارائه‌های همزمان یک استاد و کلاس‌های همزمان یک دانشجو.
+
+بازه هر ارائه [StartTime, FinishTime) در روز DayHold است و دو بازه وقتی تداخل دارند که
+start1 < finish2 و start2 < finish1 باشد. بررسی هر درج/بروزرسانی یک کوئری بازه‌ای روی ایندکس
+(استاد، روز، شروع) یا روی انتخاب‌های همان دانشجو است، پس با دیتابیس مشترک چند کاربر همیشه همخوان
+می‌ماند؛ گزارش کامل با یک پیمایش مرتب (sweep) روی کل برنامه ساخته می‌شود.
+
+انتخاب‌های یک دانشجو فقط در همان سال تحصیلی با هم مقایسه می‌شوند.
+
+نمونه:
+    python schedule.py
+"""
+import argparse
+import sys
+from collections import namedtuple
+
+from sqlalchemy.orm import aliased
+
+from models import (Lesson, Master, Presentation, Student, Selection, Session, close_database, configure_database,
+                    get_engine, migrate)
+import services
+
+# kind: 'master' یا 'student'؛ owner_id شناسه استاد یا دانشجو و year سال تحصیلی (فقط برای دانشجو)
+Conflict = namedtuple('Conflict', 'kind owner_id year day first_id second_id')
+
+CONFLICT_KINDS = {'master': "استاد", 'student': "دانشجو"}
+
+
+class ScheduleConflictError(ValueError):
+    """درج یا بروزرسانی باعث تداخل زمانی می‌شود؛ conflicts لیست تداخل‌های پیدا‌شده است."""
+
+    def __init__(self, message, conflicts=()):
+        super().__init__(message)
+        self.conflicts = list(conflicts)
+
+
+def _same_year(column, year):
+    return column.is_(None) if year is None else column == year
+
+
+# --- بررسی یک درج یا بروزرسانی ---
+
+def master_conflicts(session, master_id, day, start, finish, exclude_id=None) -> list[int]:
+    """شناسه ارائه‌های دیگر استاد که در همان روز با بازه [start, finish) تداخل دارند."""
+    query = session.query(Presentation.PresentationId).filter(
+        Presentation.MasterId == master_id, Presentation.DayHold == day,
+        Presentation.StartTime < finish, Presentation.FinishTime > start)
+    if exclude_id is not None:
+        query = query.filter(Presentation.PresentationId != exclude_id)
+    return [present_id for present_id, in query.order_by(Presentation.StartTime)]
+
+
+def student_conflicts(session, student_id, year, day, start, finish, exclude_id=None) -> list[int]:
+    """شناسه ارائه‌هایی که دانشجو در همان سال انتخاب کرده و در همان روز با [start, finish) تداخل دارند."""
+    query = session.query(Presentation.PresentationId) \
+        .join(Selection, Selection.IdPresentation == Presentation.PresentationId) \
+        .filter(Selection.IdStudent == student_id, _same_year(Selection.YearEducation, year),
+                Presentation.DayHold == day, Presentation.StartTime < finish, Presentation.FinishTime > start)
+    if exclude_id is not None:
+        query = query.filter(Selection.IdSelection != exclude_id)
+    return [present_id for present_id, in query.order_by(Presentation.StartTime)]
+
+
+def enrolled_conflicts(session, presentation_id, day, start, finish) -> list[tuple]:
+    """با جابه‌جایی ارائه به [start, finish)، کدام دانشجویان ثبت‌نام‌شده با کلاس دیگرشان تداخل پیدا می‌کنند؟
+
+    خروجی (دانشجو، سال، ارائه متداخل) است.
+    """
+    mine, theirs = aliased(Selection), aliased(Selection)
+    query = session.query(mine.IdStudent, mine.YearEducation, Presentation.PresentationId) \
+        .select_from(mine) \
+        .join(theirs, (theirs.IdStudent == mine.IdStudent) & (theirs.IdSelection != mine.IdSelection)
+              & theirs.YearEducation.is_not_distinct_from(mine.YearEducation)) \
+        .join(Presentation, theirs.IdPresentation == Presentation.PresentationId) \
+        .filter(mine.IdPresentation == presentation_id, Presentation.PresentationId != presentation_id,
+                Presentation.DayHold == day, Presentation.StartTime < finish, Presentation.FinishTime > start)
+    return query.distinct().all()
+
+
+def check_presentation(session, record) -> None:
+    """اگر ارائه با برنامه استاد یا دانشجویان ثبت‌نام‌شده تداخل داشته باشد ScheduleConflictError می‌دهد."""
+    day, start, finish = record.DayHold, record.StartTime, record.FinishTime
+    if start is not None and finish is not None and start >= finish:
+        raise ValueError("ساعت پایان باید بعد از ساعت شروع باشد.")
+    if day is None or start is None or finish is None:
+        return
+
+    with session.no_autoflush:
+        clashes = master_conflicts(session, record.MasterId, day, start, finish, exclude_id=record.PresentationId)
+        if clashes:
+            names = describe_presentations(session, clashes)
+            raise ScheduleConflictError(
+                "استاد در این زمان ارائه دیگری دارد: " + "، ".join(names[i] for i in clashes),
+                [Conflict('master', record.MasterId, None, day, record.PresentationId, i) for i in clashes])
+
+        if record.PresentationId is None:
+            return
+        clashes = enrolled_conflicts(session, record.PresentationId, day, start, finish)
+        if clashes:
+            raise ScheduleConflictError(
+                f"با این زمان، {len({student for student, _, _ in clashes})} دانشجوی ثبت‌نام‌شده در این ارائه "
+                f"تداخل کلاسی پیدا می‌کنند.",
+                [Conflict('student', student, year, day, record.PresentationId, other)
+                 for student, year, other in clashes])
+
+
+def selection_conflicts(session, student_id, presentation_id, year, exclude_id=None) -> list[Conflict]:
+    """تداخل‌های ارائه presentation_id با کلاس‌های دیگری که دانشجو در همان سال انتخاب کرده است."""
+    present = session.get(Presentation, presentation_id)
+    if present is None or present.DayHold is None or present.StartTime is None or present.FinishTime is None:
+        return []
+    clashes = student_conflicts(session, student_id, year, present.DayHold, present.StartTime, present.FinishTime,
+                                exclude_id=exclude_id)
+    return [Conflict('student', student_id, year, present.DayHold, presentation_id, i) for i in clashes]
+
+
+def check_selection(session, record) -> None:
+    """اگر ارائه انتخاب‌شده با کلاس دیگر دانشجو در همان سال تداخل داشته باشد ScheduleConflictError می‌دهد."""
+    with session.no_autoflush:
+        conflicts = selection_conflicts(session, record.IdStudent, record.IdPresentation, record.YearEducation,
+                                        exclude_id=record.IdSelection)
+        if conflicts:
+            names = describe_presentations(session, [c.second_id for c in conflicts])
+            raise ScheduleConflictError(
+                "دانشجو در این زمان کلاس دیگری دارد: " + "، ".join(names[c.second_id] for c in conflicts), conflicts)
+
+
+SCHEDULE_CHECKS = {Presentation: check_presentation, Selection: check_selection}
+
+
+def check_record(session, model, record) -> None:
+    """بررسی تداخل پیش از commit یک رکورد جدید یا ویرایش‌شده (برای جدول‌های بدون زمان‌بندی کاری نمی‌کند)."""
+    check = SCHEDULE_CHECKS.get(model)
+    if check is not None:
+        check(session, record)
+
+
+# --- گزارش کامل با پیمایش مرتب ---
+
+def _sweep(rows):
+    """ردیف‌های (کلید، شروع، پایان، شناسه) مرتب‌شده بر اساس (کلید، شروع) را می‌گیرد و جفت‌های متداخل را برمی‌گرداند.
+
+    برای هر کلید فقط بازه‌هایی نگه داشته می‌شوند که هنوز تمام نشده‌اند، پس هزینه کل
+    O(n + تعداد تداخل‌ها) است.
+    """
+    current, active = None, []
+    for key, start, finish, item in rows:
+        if key != current:
+            current, active = key, []
+        active = [(end, other) for end, other in active if end > start]
+        for _, other in active:
+            yield key, other, item
+        active.append((finish, item))
+
+
+def iter_conflicts(session, batch_size=10000):
+    """همه تداخل‌های برنامه (اول استادان، سپس دانشجویان) را با یک پیمایش مرتب برای هرکدام برمی‌گرداند."""
+    timed = (Presentation.DayHold.isnot(None), Presentation.StartTime.isnot(None),
+             Presentation.FinishTime.isnot(None))
+
+    masters = session.query(Presentation.MasterId, Presentation.DayHold, Presentation.StartTime,
+                            Presentation.FinishTime, Presentation.PresentationId) \
+        .filter(*timed) \
+        .order_by(Presentation.MasterId, Presentation.DayHold, Presentation.StartTime)
+    rows = (((master_id, day), start, finish, present_id)
+            for master_id, day, start, finish, present_id in masters.yield_per(batch_size))
+    for (master_id, day), first, second in _sweep(rows):
+        yield Conflict('master', master_id, None, day, first, second)
+
+    students = session.query(Selection.IdStudent, Selection.YearEducation, Presentation.DayHold,
+                             Presentation.StartTime, Presentation.FinishTime, Presentation.PresentationId) \
+        .join(Presentation, Selection.IdPresentation == Presentation.PresentationId) \
+        .filter(*timed) \
+        .order_by(Selection.IdStudent, Selection.YearEducation, Presentation.DayHold, Presentation.StartTime)
+    rows = (((student_id, year, day), start, finish, present_id)
+            for student_id, year, day, start, finish, present_id in students.yield_per(batch_size))
+    for (student_id, year, day), first, second in _sweep(rows):
+        yield Conflict('student', student_id, year, day, first, second)
+
+
+def describe_presentations(session, presentation_ids) -> dict[int, str]:
+    """{شناسه ارائه: «درس (استاد، روز) شروع-پایان»} برای نمایش تداخل‌ها."""
+    ids = list(set(presentation_ids))
+    names = {}
+    for i in range(0, len(ids), 500):
+        query = services.join_presentation_names(session.query(
+            Presentation.PresentationId, Lesson.Name, Master.Name, Presentation.DayHold,
+            Presentation.StartTime, Presentation.FinishTime)).filter(Presentation.PresentationId.in_(ids[i:i + 500]))
+        for present_id, l_name, m_name, day_hold, start, finish in query:
+            names[present_id] = f"{services.presentation_display_name(l_name, m_name, day_hold)} {start}-{finish}"
+    return names
+
+
+def conflict_report(session, limit=None) -> tuple[list[tuple], int]:
+    """ردیف‌های قابل نمایش (نوع، نام، سال، روز، ارائه اول، ارائه دوم) و تعداد کل تداخل‌ها."""
+    conflicts, total = [], 0
+    for conflict in iter_conflicts(session):
+        total += 1
+        if limit is None or len(conflicts) < limit:
+            conflicts.append(conflict)
+
+    presentations = describe_presentations(session, [c.first_id for c in conflicts] + [c.second_id for c in conflicts])
+    owners = {}
+    for kind, model, pk_column in (('master', Master, Master.MasterId), ('student', Student, Student.IdStudent)):
+        ids = list({c.owner_id for c in conflicts if c.kind == kind})
+        for i in range(0, len(ids), 500):
+            for owner_id, name in session.query(pk_column, model.Name).filter(pk_column.in_(ids[i:i + 500])):
+                owners[kind, owner_id] = name
+
+    rows = [(CONFLICT_KINDS[c.kind], owners.get((c.kind, c.owner_id), services.UNKNOWN_NAME),
+             c.year if c.year is not None else '', c.day,
+             presentations.get(c.first_id, c.first_id), presentations.get(c.second_id, c.second_id))
+            for c in conflicts]
+    return rows, total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="گزارش تداخل‌های زمانی برنامه کلاسی استادان و دانشجویان")
+    parser.add_argument('--limit', type=int, default=100, help="حداکثر تعداد تداخل نمایش‌داده‌شده")
+    parser.add_argument('--database-url', help="آدرس دیتابیس (پیش‌فرض: CHAMRAN_DATABASE_URL یا فایل chamran_uni.db)")
+    args = parser.parse_args(argv)
+
+    engine = configure_database(args.database_url) if args.database_url else get_engine()
+    migrate(engine)
+    session = Session()
+    rows, total = conflict_report(session, args.limit)
+    for row in rows:
+        print(" | ".join(str(value) for value in row))
+    print(f"{total} تداخل یافت شد.")
+    return 1 if total else 0
+
+
+if __name__ == '__main__':
+    status = main()
+    close_database()
+    sys.exit(status)
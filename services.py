@@ -0,0 +1,875 @@
+"""لایه سرویس مستقل از رابط کاربری برای دسترسی به داده‌ها."""
+import math
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import Integer, and_, bindparam, func, insert, or_, select, tuple_, update
+from sqlalchemy.orm import Session, aliased
+
+from models import (Base, Master, Lesson, Presentation, Student, Selection, StudentGpaSummary, ALL_YEARS, DELETED,
+                    TABLE_VERSIONS, PresentationFullError, add_gpa_delta, adjust_enrolled, apply_gpa_deltas,
+                    bump_table_versions, journal_changes, table_versions, take_seat)
+import journal
+import schedule
+
+UNKNOWN_NAME = 'نامشخص'
+
+Row = tuple
+Model = type[Base]
+
+
+def _format_selection_row(row) -> Row:
+    sel_id, st_name, present_id, l_name, m_name, score, year = row
+    present_name = f"{l_name} ({m_name})" if present_id is not None else UNKNOWN_NAME
+    return (sel_id, st_name, present_name, score, year)
+
+
+def join_presentation_names(query, present=Presentation):
+    """درس و استاد یک ارائه را با outer join به کوئری اضافه می‌کند (منبع مشترک نام‌های نمایشی ارائه‌ها)."""
+    return query.outerjoin(Lesson, present.LessonId == Lesson.LessonId) \
+                .outerjoin(Master, present.MasterId == Master.MasterId)
+
+
+def _display_query(session, model):
+    """کوئری ستون‌های نمایشی هر جدول را به همراه ستون کلید اصلی و تابع قالب‌بندی ردیف برمی‌گرداند."""
+    if model == Presentation:
+        columns = [
+            Presentation.PresentationId,
+            func.coalesce(Master.Name, UNKNOWN_NAME),
+            func.coalesce(Lesson.Name, UNKNOWN_NAME),
+            Presentation.DayHold,
+            Presentation.StartTime,
+            Presentation.FinishTime,
+            Presentation.Capacity,
+            Presentation.Enrolled,
+        ]
+        query = session.query(*columns)
+        return join_presentation_names(query), Presentation.PresentationId, tuple, columns
+
+    if model == Selection:
+        present = aliased(Presentation)
+        student_name = func.coalesce(Student.Name, UNKNOWN_NAME)
+        lesson_name = func.coalesce(Lesson.Name, UNKNOWN_NAME)
+        query = session.query(
+            Selection.IdSelection,
+            student_name,
+            present.PresentationId,
+            lesson_name,
+            func.coalesce(Master.Name, UNKNOWN_NAME),
+            Selection.Score,
+            Selection.YearEducation,
+        ).outerjoin(Student, Selection.IdStudent == Student.IdStudent) \
+         .outerjoin(present, Selection.IdPresentation == present.PresentationId)
+        columns = [Selection.IdSelection, student_name, lesson_name, Selection.Score, Selection.YearEducation]
+        return join_presentation_names(query, present), Selection.IdSelection, _format_selection_row, columns
+
+    columns = [getattr(model, attr) for attr in model.COLUMNS.values()]
+    return session.query(*columns), model.__mapper__.primary_key[0], tuple, columns
+
+
+# پایان بازه پیشوندی: value <= ستون < value + PREFIX_END همان LIKE 'value%' است ولی از ایندکس استفاده می‌کند.
+# این مقایسه فقط با collation دودویی SQLite درست است؛ در دیتابیس‌های دیگر از LIKE استفاده می‌شود.
+PREFIX_END = '\U0010ffff'
+# دیتابیس‌هایی که NULL را در ترتیب صعودی اول می‌آورند؛ برای بقیه NULLS FIRST/LAST صریح نوشته می‌شود
+NULLS_FIRST_DIALECTS = ('sqlite', 'mysql', 'mariadb')
+
+
+def _filter_kind(model, db_field):
+    """نوع مقایسه فیلتر هر ستون از روی نوع فیلد در FIELD_SPECS: عددی و منوها دقیق، متن‌ها پیشوندی."""
+    if db_field == model.__mapper__.primary_key[0].key:
+        return 'int'
+    spec = next((field for field in FIELD_SPECS[model.__name__] if field[1] == db_field), None)
+    if spec is None and isinstance(getattr(model, db_field).type, Integer):
+        return 'int'  # ستون‌های فقط‌خواندنی مثل تعداد ثبت‌نام ارائه
+    field_type = spec[2] if spec and len(spec) > 2 else 'str'
+    if field_type.startswith('combo_fk'):
+        return 'prefix'
+    if field_type.startswith('combo'):
+        return 'exact'
+    if 'int' in field_type:
+        return 'int'
+    if 'float' in field_type:
+        return 'float'
+    return 'prefix'
+
+
+def parse_filters(model: Model, raw_filters: dict[str, str]) -> dict:
+    """مقادیر متنی نوار فیلتر ({ستون COLUMNS: متن}) را اعتبارسنجی و به مقدار قابل مقایسه تبدیل می‌کند."""
+    labels = {db_field: label for label, db_field in model.COLUMNS.items()}
+    filters = {}
+    for db_field, value in raw_filters.items():
+        value = (value or '').strip()
+        if not value:
+            continue
+        kind = _filter_kind(model, db_field)
+        try:
+            if kind == 'int':
+                value = int(value)
+            elif kind == 'float':
+                value = float(value)
+        except ValueError:
+            raise ValueError(f"فیلتر '{labels[db_field]}' باید یک عدد باشد.")
+        filters[db_field] = value
+    return filters
+
+
+def _apply_filters(query, model, columns, filters, dialect_name='sqlite'):
+    db_fields = list(model.COLUMNS.values())
+    for db_field, value in (filters or {}).items():
+        column = columns[db_fields.index(db_field)]
+        if _filter_kind(model, db_field) != 'prefix':
+            query = query.filter(column == value)
+        elif dialect_name == 'sqlite':
+            query = query.filter(column >= value, column < value + PREFIX_END)
+        else:
+            query = query.filter(column.startswith(value, autoescape=True))
+    return query
+
+
+def _dialect_name(session):
+    return session.get_bind().dialect.name
+
+
+def _keyset_after(sort_column, pk_column, key, inclusive=False):
+    """ردیف‌های بعد از key در ترتیب صعودی (sort_column، کلید اصلی)؛ NULL کوچک‌ترین مقدار در نظر گرفته می‌شود."""
+    if sort_column is None:
+        return pk_column >= key if inclusive else pk_column > key
+    value, pk_val = key
+    if value is None:
+        return or_(sort_column.isnot(None),
+                   and_(sort_column.is_(None), pk_column >= pk_val if inclusive else pk_column > pk_val))
+    row, bound = tuple_(sort_column, pk_column), tuple_(value, pk_val)
+    return row >= bound if inclusive else row > bound
+
+
+def _keyset_before(sort_column, pk_column, key, inclusive=False):
+    """ردیف‌های قبل از key در ترتیب صعودی (sort_column، کلید اصلی)."""
+    if sort_column is None:
+        return pk_column <= key if inclusive else pk_column < key
+    value, pk_val = key
+    if value is None:
+        return and_(sort_column.is_(None), pk_column <= pk_val if inclusive else pk_column < pk_val)
+    row, bound = tuple_(sort_column, pk_column), tuple_(value, pk_val)
+    return or_(sort_column.is_(None), row <= bound if inclusive else row < bound)
+
+
+def fetch_display_page(session: Session, model: Model, filters: dict | None = None, sort: tuple | None = None,
+                       after_key=None, from_key=None, before_key=None,
+                       limit: int | None = None) -> tuple[list[Row], list]:
+    """یک صفحه keyset از ردیف‌های نمایشی را با فیلتر و مرتب‌سازی انجام‌شده در SQL برمی‌گرداند: (ردیف‌ها، کلیدها)."""
+    query, pk_column, format_row, columns = _display_query(session, model)
+    dialect_name = _dialect_name(session)
+    query = _apply_filters(query, model, columns, filters, dialect_name)
+
+    sort_field, descending = sort if sort else (None, False)
+    sort_column = None
+    if sort_field is not None and sort_field != pk_column.key:
+        sort_column = columns[list(model.COLUMNS.values()).index(sort_field)]
+        query = query.add_columns(sort_column)
+
+    # در ترتیب نزولی «بعد» و «قبل» نسبت به ترتیب صعودی جابه‌جا می‌شوند
+    after, before = (_keyset_before, _keyset_after) if descending else (_keyset_after, _keyset_before)
+    if after_key is not None:
+        query = query.filter(after(sort_column, pk_column, after_key))
+    if from_key is not None:
+        query = query.filter(after(sort_column, pk_column, from_key, inclusive=True))
+    if before_key is not None:
+        query = query.filter(before(sort_column, pk_column, before_key))
+
+    reverse = descending != (before_key is not None)
+    order = [pk_column.desc() if reverse else pk_column]
+    if sort_column is not None:
+        sort_order = sort_column.desc() if reverse else sort_column
+        if dialect_name not in NULLS_FIRST_DIALECTS:
+            sort_order = sort_order.nulls_last() if reverse else sort_order.nulls_first()
+        order.insert(0, sort_order)
+    query = query.order_by(*order)
+
+    if limit is not None:
+        query = query.limit(limit)
+
+    rows, keys = [], []
+    for row in query:
+        if sort_column is None:
+            rows.append(format_row(row))
+            keys.append(row[0])
+        else:
+            rows.append(format_row(tuple(row[:-1])))
+            keys.append((row[-1], row[0]))
+    if before_key is not None:
+        rows.reverse()
+        keys.reverse()
+    return rows, keys
+
+
+def fetch_display_rows(session: Session, model: Model, after_key: int | None = None, from_key: int | None = None,
+                       before_key: int | None = None, limit: int | None = None) -> list[Row]:
+    """ردیف‌های قابل نمایش یک جدول را با نام‌های حل‌شده در یک کوئری join واحد برمی‌گرداند."""
+    return fetch_display_page(session, model, after_key=after_key, from_key=from_key,
+                              before_key=before_key, limit=limit)[0]
+
+
+def fetch_display_row(session: Session, model: Model, pk_val) -> Row | None:
+    """ردیف نمایشی یک رکورد را با کلید اصلی آن برمی‌گرداند (یا None اگر وجود نداشته باشد)."""
+    query, pk_column, format_row, columns = _display_query(session, model)
+    row = query.filter(pk_column == pk_val).first()
+    return format_row(row) if row is not None else None
+
+
+def presentation_display_name(lesson_name: str | None, master_name: str | None, day_hold: str | None) -> str:
+    """نام نمایشی یک ارائه در منوهای کشویی."""
+    return f"{lesson_name or UNKNOWN_NAME} ({master_name or UNKNOWN_NAME}, {day_hold})"
+
+
+def major_matches(major_filter: str | None, record_major: str | None) -> bool:
+    """آیا رکوردی با این رشته در نتایج فیلتر رشته (مانند fetch_combo_options) قرار می‌گیرد؟"""
+    return not major_filter or major_filter == "سایر" or record_major is None or major_filter == record_major
+
+
+def count_rows(session: Session, model: Model, filters: dict | None = None) -> int:
+    """تعداد کل ردیف‌های یک جدول (یا ردیف‌های منطبق با فیلترهای parse_filters) را برمی‌گرداند."""
+    pk_column = model.__mapper__.primary_key[0]
+    if not filters:
+        # کل ردیف‌ها منهای ردیف‌های حذف‌شده: هر دو شمارش فقط از ایندکس خوانده می‌شوند، در حالی که شرط
+        # Deleted = 0 روی کل جدول خواندن همه ردیف‌ها را لازم دارد
+        total = select(func.count(pk_column)).scalar_subquery()
+        deleted = select(func.count(pk_column)).where(model.Deleted == DELETED).scalar_subquery()
+        return session.query(total - deleted).execution_options(include_deleted=True).scalar()
+    query, pk_column, format_row, columns = _display_query(session, model)
+    query = _apply_filters(query, model, columns, filters, _dialect_name(session))
+    return query.with_entities(func.count(pk_column)).scalar()
+
+
+def fetch_deleted_rows(session: Session, model: Model, limit: int | None = None) -> list[Row]:
+    """ردیف‌های نمایشی رکوردهای حذف‌شده (سطل بازیافت)، آخرین شناسه اول."""
+    query, pk_column, format_row, columns = _display_query(session, model)
+    query = query.execution_options(include_deleted=True).filter(model.Deleted == DELETED).order_by(pk_column.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return [format_row(row) for row in query]
+
+
+def _deleted_ids(session: Session, model: Model) -> set:
+    pk_column = model.__mapper__.primary_key[0]
+    return {row[0] for row in session.query(pk_column).execution_options(include_deleted=True)
+            .filter(model.Deleted == DELETED)}
+
+
+def count_deleted(session: Session, model: Model) -> int:
+    pk_column = model.__mapper__.primary_key[0]
+    return session.query(func.count(pk_column)).execution_options(include_deleted=True) \
+        .filter(model.Deleted == DELETED).scalar()
+
+
+# --- فیلدهای فرم‌ها و قواعد اعتبارسنجی ---
+
+MAJORS = ['کامپیوتر', 'برق', 'عمران', 'مکانیک', 'معماری', 'سایر']
+WEEK_DAYS = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه']
+
+# هر فیلد: (برچسب، ستون، نوع، ...پارامترهای نوع)؛ هم فرم‌های رابط کاربری و هم ورود دسته‌ای از آن استفاده می‌کنند.
+FIELD_SPECS = {
+    'Student': [("نام دانشجو", "Name"), 
+                ("ترم ورود", "EntranceTerm", "str_term_3_digit"), 
+                ("مقطع", "Graduation"), 
+                ("موبایل", "Mobile"), ("ایمیل", "Email", "str_optional"),
+                ("رشته تحصیلی", "Major", "combo", MAJORS)],
+    'Master': [("نام استاد", "Name"), ("مدرک", "Graduation"), 
+               ("موبایل", "Mobile"), ("ایمیل", "Email", "str_optional")],
+    'Lesson': [("نام درس", "Name"), ("تعداد واحد", "Unit", "int"),
+               ("رشته تحصیلی", "Major", "combo", MAJORS)],
+    'Presentation': [
+        ("استاد", "MasterId", "combo_fk", Master, 'MasterId', 'Name'), 
+        ("درس", "LessonId", "combo_fk", Lesson, 'LessonId', 'Name'),   
+        ("روز برگزاری", "DayHold", "combo", WEEK_DAYS),
+        ("ساعت شروع", "StartTime", "int_optional"), 
+        ("ساعت پایان", "FinishTime", "int_optional"),
+        ("ظرفیت", "Capacity", "int_optional")],
+    'Selection': [
+        ("رشته تحصیلی", "MajorFilter", "combo_major_filter", MAJORS), 
+        ("دانشجو", "IdStudent", "combo_fk_filtered", Student, 'IdStudent', 'Name'), 
+        ("درس (ارائه)", "IdPresentation", "combo_fk_filtered", Presentation, 'PresentationId', 'Display'), 
+        ("سال تحصیلی", "YearEducation", "int_optional"), 
+        ("نمره", "Score", "float_optional")],
+}
+
+
+def parse_fields(fields: list[tuple], raw_values: dict, resolve_fk) -> dict:
+    """مقادیر متنی ورودی را طبق نوع هر فیلد اعتبارسنجی و تبدیل می‌کند."""
+    data = {}
+    for label, db_field, *type_info in fields:
+        if db_field == "MajorFilter": 
+            continue 
+
+        value = raw_values.get(db_field) or ''
+        field_type = type_info[0] if type_info else 'str'
+
+        if field_type.startswith('combo'):
+            if not value:
+                raise ValueError(f"لطفاً '{label}' را انتخاب کنید.")
+            
+            if field_type.startswith('combo_fk'):
+                data[db_field] = resolve_fk(label, type_info, value)
+            
+            elif value not in type_info[1]:
+                raise ValueError(f"مقدار '{value}' برای '{label}' مجاز نیست.")
+            
+            else: 
+                data[db_field] = value
+            
+            continue 
+
+        if 'optional' not in field_type and not value:
+            raise ValueError(f"فیلد '{label}' نمی‌تواند خالی باشد.")
+        
+        if not value and 'optional' in field_type:
+            data[db_field] = None
+            continue
+
+        try:
+            if field_type == 'str_term_3_digit':
+                term_str = value
+                if len(term_str) != 3 or not term_str.isdigit():
+                     raise ValueError(f"فیلد '{label}' باید یک کد ترم دقیقاً سه‌رقمی و عددی باشد (مانند ۰۱۲).")
+                data[db_field] = term_str
+            
+            elif 'int' in field_type:
+                data[db_field] = int(value)
+            elif 'float' in field_type:
+                data[db_field] = float(value)
+            else: 
+                data[db_field] = value
+        except ValueError as ve:
+            if 'سه‌رقمی' in str(ve):
+                raise ve
+            else:
+                raise ValueError(f"فیلد '{label}' باید از نوع {field_type.split('_')[0]} باشد.")
+    return data
+
+
+# --- خواندن و نوشتن رکوردها ---
+
+def _commit(session: Session) -> None:
+    try:
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+def get_record(session: Session, model: Model, pk_val):
+    """یک رکورد را با کلید اصلی برمی‌گرداند (یا None)."""
+    return session.get(model, pk_val)
+
+
+def create_record(session: Session, model: Model, data: dict):
+    """یک رکورد جدید درج و commit می‌کند و رکورد ساخته‌شده را برمی‌گرداند."""
+    record = model(**data)
+    session.add(record)
+    try:
+        schedule.check_record(session, model, record)
+    except ValueError:
+        session.expunge(record)
+        raise
+    _commit(session)
+    return record
+
+
+def update_record(session: Session, model: Model, pk_val, data: dict):
+    """مقادیر یک رکورد را بروزرسانی و commit می‌کند؛ اگر رکورد وجود نداشته باشد None برمی‌گرداند."""
+    record = session.get(model, pk_val)
+    if record is None:
+        return None
+    for key, value in data.items():
+        setattr(record, key, value)
+    try:
+        schedule.check_record(session, model, record)
+    except ValueError:
+        session.rollback()
+        raise
+    _commit(session)
+    return record
+
+
+def delete_record(session: Session, model: Model, pk_val) -> bool:
+    """یک رکورد را (نرم) حذف و commit می‌کند؛ اگر رکورد وجود نداشته باشد False برمی‌گرداند."""
+    return journal.delete_records(session, model, [pk_val]) == 1
+
+
+# --- ثبت‌نام در ارائه‌ها ---
+
+EnrollRequest = namedtuple('EnrollRequest', 'student_id presentation_id year', defaults=(None,))
+
+
+def enroll_many(session: Session, requests, check_schedule: bool = True) -> list:
+    """درخواست‌های ثبت‌نام را در یک تراکنش کوتاه ثبت می‌کند؛ برای هر درخواست شناسه انتخاب جدید یا خطای آن برمی‌گردد."""
+    selection = Selection.__table__
+    requests = list(requests)
+    results, entries = [], []
+    try:
+        connection = session.connection()
+        student_ids = {student_id for student_id, presentation_id, year in requests}
+        live_students = set(connection.execute(
+            select(Student.IdStudent).where(Student.IdStudent.in_(student_ids), Student.Deleted == 0)).scalars())
+        for student_id, presentation_id, year in requests:
+            if student_id not in live_students:
+                results.append(ValueError("دانشجوی انتخاب‌شده وجود ندارد."))
+                continue
+            # اول صندلی گرفته می‌شود تا بررسی تداخل داخل همان تراکنش نوشتن انجام شود
+            if not take_seat(connection, presentation_id):
+                if session.get(Presentation, presentation_id) is None:
+                    results.append(ValueError("ارائه انتخاب‌شده وجود ندارد."))
+                else:
+                    results.append(PresentationFullError("ظرفیت ارائه انتخاب‌شده تکمیل است."))
+                continue
+            if check_schedule:
+                with session.no_autoflush:
+                    conflicts = schedule.selection_conflicts(session, student_id, presentation_id, year)
+                if conflicts:
+                    adjust_enrolled(connection, {presentation_id: -1})
+                    results.append(schedule.ScheduleConflictError("دانشجو در این زمان کلاس دیگری دارد.", conflicts))
+                    continue
+            result = connection.execute(
+                insert(selection).values(IdStudent=student_id, IdPresentation=presentation_id, YearEducation=year))
+            results.append(result.inserted_primary_key[0])
+            entries.append((Selection.__tablename__, results[-1], 'insert', None, {
+                'IdSelection': results[-1], 'IdStudent': student_id, 'IdPresentation': presentation_id,
+                'Score': None, 'YearEducation': year, 'Deleted': 0}))
+        journal_changes(session, entries)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    if any(not isinstance(result, Exception) for result in results):
+        bump_table_versions(Selection.__tablename__, Presentation.__tablename__)
+    return results
+
+
+def enroll(session: Session, student_id: int, presentation_id: int, year: int | None = None) -> int:
+    """ثبت‌نام یک دانشجو؛ شناسه انتخاب جدید را برمی‌گرداند یا PresentationFullError/ScheduleConflictError می‌دهد."""
+    result, = enroll_many(session, [EnrollRequest(student_id, presentation_id, year)])
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+# --- ثبت دسته‌ای نمرات یک ارائه ---
+
+MIN_SCORE = 0
+MAX_SCORE = 20
+
+GradebookRow = namedtuple('GradebookRow', 'selection_id student_id student_name year score')
+
+
+class ScoreValidationError(ValueError):
+    """نمره‌های نامعتبر یک دسته؛ errors برای هر شناسه انتخاب پیام خطای همان ردیف را دارد."""
+
+    def __init__(self, message, errors):
+        super().__init__(message)
+        self.errors = errors
+
+
+def fetch_gradebook(session: Session, presentation_id: int) -> list[GradebookRow]:
+    """همه انتخاب‌های یک ارائه با نام دانشجو (جدیدترین سال اول، سپس به ترتیب نام) در یک کوئری."""
+    query = session.query(Selection.IdSelection, Selection.IdStudent, Student.Name, Selection.YearEducation,
+                          Selection.Score) \
+        .outerjoin(Student, Selection.IdStudent == Student.IdStudent) \
+        .filter(Selection.IdPresentation == presentation_id) \
+        .order_by(Selection.YearEducation.desc(), Student.Name, Selection.IdSelection)
+    return [GradebookRow(*row) for row in query]
+
+
+def parse_scores(raw_scores: dict, labels: dict | None = None) -> dict:
+    """{شناسه انتخاب: متن نمره} را در یک گذر به {شناسه: نمره یا None (خالی)} تبدیل می‌کند."""
+    labels = labels or {}
+    scores, errors = {}, {}
+    for selection_id, text in raw_scores.items():
+        text = (text or '').strip()
+        if not text:
+            scores[selection_id] = None
+            continue
+        try:
+            score = float(text)
+        except ValueError:
+            errors[selection_id] = f"«{text}» عدد نیست"
+            continue
+        if math.isnan(score) or not MIN_SCORE <= score <= MAX_SCORE:
+            errors[selection_id] = f"{text} خارج از بازه {MIN_SCORE} تا {MAX_SCORE} است"
+            continue
+        scores[selection_id] = score
+
+    if errors:
+        lines = [f"{labels.get(selection_id, selection_id)}: {error}" for selection_id, error in errors.items()]
+        more = f"\n... و {len(lines) - 10} مورد دیگر" if len(lines) > 10 else ""
+        raise ScoreValidationError(f"{len(errors)} نمره نامعتبر است:\n" + "\n".join(lines[:10]) + more, errors)
+    return scores
+
+
+def save_scores(session: Session, presentation_id: int, scores: dict) -> int:
+    """نمره‌های تغییرکرده یک ارائه را در یک تراکنش با یک UPDATE دسته‌ای ذخیره و تعدادشان را برمی‌گرداند."""
+    selection = Selection.__table__
+    try:
+        connection = session.connection()
+        unit = connection.execute(
+            select(Lesson.Unit).join(Presentation, Presentation.LessonId == Lesson.LessonId)
+            .where(Presentation.PresentationId == presentation_id)).scalar()
+        current = {row[0]: row[1:] for row in connection.execute(
+            select(selection.c.IdSelection, selection.c.IdStudent, selection.c.YearEducation, selection.c.Score)
+            .where(selection.c.IdPresentation == presentation_id, selection.c.Deleted == 0))}
+        unknown = scores.keys() - current.keys()
+        if unknown:
+            raise ValueError(f"{len(unknown)} انتخاب دیگر در این ارائه وجود ندارد؛ لیست را دوباره بارگذاری کنید.")
+
+        changed = {selection_id: score for selection_id, score in scores.items() if current[selection_id][2] != score}
+        if changed:
+            result = connection.execute(
+                update(selection)
+                .where(selection.c.IdSelection == bindparam('b_id'),
+                       selection.c.Score.is_not_distinct_from(bindparam('b_old')))
+                .values(Score=bindparam('b_score')),
+                [{'b_id': selection_id, 'b_old': current[selection_id][2], 'b_score': score}
+                 for selection_id, score in changed.items()])
+            if connection.dialect.supports_sane_multi_rowcount:
+                skipped = result.rowcount != len(changed)
+            else:
+                # درایورهایی مثل psycopg2 تعداد ردیف‌های executemany را برنمی‌گردانند؛ ردیفی که شرط نمره قبلی
+                # آن را کنار گذاشته نمره تازه را ندارد
+                ids = list(changed)
+                written = {}
+                for start in range(0, len(ids), 500):
+                    written.update(connection.execute(select(selection.c.IdSelection, selection.c.Score)
+                                                      .where(selection.c.IdSelection.in_(ids[start:start + 500]))).all())
+                skipped = any(written.get(selection_id) != score for selection_id, score in changed.items())
+            if skipped:
+                raise ValueError("نمره برخی دانشجویان در این فاصله توسط کاربر دیگری تغییر کرده است؛ "
+                                 "لیست را دوباره بارگذاری کنید.")
+
+            deltas = defaultdict(lambda: [0.0, 0])
+            for selection_id, score in changed.items():
+                student_id, year, old_score = current[selection_id]
+                if not unit:
+                    continue
+                if old_score is not None:
+                    add_gpa_delta(deltas, student_id, year, -old_score * unit, -unit)
+                if score is not None:
+                    add_gpa_delta(deltas, student_id, year, score * unit, unit)
+            apply_gpa_deltas(connection, deltas)
+            journal_changes(session, [(Selection.__tablename__, selection_id, 'update', {'Score': current[selection_id][2]},
+                                       {'Score': score}) for selection_id, score in changed.items()],
+                            f"ثبت {len(changed)} نمره ارائه {presentation_id}")
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    if changed:
+        bump_table_versions(Selection.__tablename__)
+    return len(changed)
+
+
+# --- گزینه‌های منوهای کشویی کلید خارجی ---
+
+def fetch_combo_options(session: Session, fk_model: Model, fk_id_field: str, fk_name_field: str,
+                        major_filter: str | None = None) -> tuple[list[str], dict[str, int]]:
+    """لیست مرتب نام‌های نمایشی و map نام به شناسه را (همراه با فیلتر رشته) برمی‌گرداند."""
+    if fk_model == Presentation:
+        query = join_presentation_names(session.query(
+            Presentation.PresentationId, Lesson.Name, Master.Name, Presentation.DayHold))
+        id_to_name = {presentation_display_name(l_name, m_name, day_hold): present_id
+                      for present_id, l_name, m_name, day_hold in query}
+        return sorted(id_to_name), id_to_name
+
+    # ایندکس‌های نام و (رشته، نام) این کوئری را پوشش می‌دهند و شرط Deleted = 0 خواندن ردیف‌ها را لازم دارد؛
+    # به جای آن شناسه‌های حذف‌شده از ایندکس جزئی خوانده و کنار گذاشته می‌شوند
+    deleted = _deleted_ids(session, fk_model)
+    query = session.query(getattr(fk_model, fk_id_field), getattr(fk_model, fk_name_field)) \
+        .execution_options(include_deleted=True)
+    
+    if major_filter and major_filter != "سایر":
+        if fk_model == Student:
+            query = query.filter(Student.Major == major_filter)
+        elif fk_model == Lesson:
+            query = query.filter(Lesson.Major == major_filter)
+    
+    id_to_name = {display_name: record_id for record_id, display_name in query if record_id not in deleted}
+    
+    return sorted(id_to_name), id_to_name
+
+
+def combo_entry(model: Model, record) -> tuple[str, str | None] | None:
+    """(نام نمایشی، رشته) یک رکورد را در منوهای کشویی کلید خارجی برمی‌گرداند."""
+    if model == Presentation:
+        display_name = presentation_display_name(record.lesson.Name if record.lesson else None,
+                                                 record.master.Name if record.master else None,
+                                                 record.DayHold)
+        return display_name, None
+    if model in (Master, Lesson, Student):
+        return record.Name, getattr(record, 'Major', None)
+    return None
+
+
+# --- جستجوی پیشوندی در منوهای کشویی ---
+
+def normalize_search_text(text: str) -> str:
+    """یکسان‌سازی حروف عربی/فارسی، نیم‌فاصله و بزرگی حروف برای مقایسه پیشوندی."""
+    text = text.replace('\u200c', ' ').replace('ي', 'ی').replace('ك', 'ک')
+    return ' '.join(text.casefold().split())
+
+
+def fetch_search_entries(session: Session, fk_model: Model, major_filter: str | None = None) -> list[tuple]:
+    """(نام نمایشی، شناسه، عبارت‌های قابل جستجو) رکوردهای یک منوی کشویی: نام و موبایل، یا نام درس و استاد ارائه."""
+    if fk_model == Presentation:
+        query = join_presentation_names(session.query(
+            Presentation.PresentationId, Lesson.Name, Master.Name, Presentation.DayHold))
+        return [(presentation_display_name(l_name, m_name, day_hold), present_id, (l_name or '', m_name or ''))
+                for present_id, l_name, m_name, day_hold in query]
+
+    pk_column = fk_model.__mapper__.primary_key[0]
+    mobile = getattr(fk_model, 'Mobile', fk_model.Name)
+    query = session.query(pk_column, fk_model.Name, mobile)
+    if major_filter and major_filter != "سایر" and fk_model in (Student, Lesson):
+        query = query.filter(fk_model.Major == major_filter)
+    return [(name, record_id, (name, extra or '')) for record_id, name, extra in query]
+
+
+class PrefixIndex:
+    """اندیس پیشوندی مرتب روی کلمات و عبارت‌های کامل؛ search فقط K نتیجه اول را با bisect برمی‌گرداند."""
+
+    def __init__(self, entries):
+        pairs = set()
+        for display_name, record_id, terms in entries:
+            for term in terms:
+                term = normalize_search_text(term)
+                if not term:
+                    continue
+                pairs.add((term, display_name))
+                for word in term.split()[1:]:
+                    pairs.add((word, display_name))
+        pairs = sorted(pairs)
+        self.keys = [key for key, display_name in pairs]
+        self.names = [display_name for key, display_name in pairs]
+        self.sorted_names = sorted({display_name for display_name, record_id, terms in entries})
+
+    def search(self, text: str, limit: int = 50) -> list[str]:
+        prefix = normalize_search_text(text)
+        if not prefix:
+            return self.sorted_names[:limit]
+
+        results, seen = [], set()
+        for index in range(bisect_left(self.keys, prefix), len(self.keys)):
+            if not self.keys[index].startswith(prefix):
+                break
+            display_name = self.names[index]
+            if display_name not in seen:
+                seen.add(display_name)
+                results.append(display_name)
+                if len(results) == limit:
+                    break
+        return results
+
+
+# جدول‌هایی که نام‌های نمایشی منوی کشویی هر مدل از آن‌ها ساخته می‌شود
+COMBO_DEPENDENCIES = {Presentation: (Presentation, Lesson, Master)}
+COMBO_MODELS = {model.__name__: model for model in (Master, Lesson, Presentation, Student)}
+
+
+class ComboOptionsCache:
+    """cache مشترک گزینه‌های منوهای کشویی کلید خارجی به تفکیک (مدل، فیلتر رشته) که با نسخه جدول‌ها باطل می‌شود."""
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(fk_model: Model, major_filter: str | None = None) -> tuple[str, str | None]:
+        # فقط دانشجو و درس بر اساس رشته فیلتر می‌شوند؛ «سایر» و بدون فیلتر یک ورودی مشترک دارند
+        if fk_model not in (Student, Lesson) or not major_filter or major_filter == "سایر":
+            major_filter = None
+        return fk_model.__name__, major_filter
+
+    @staticmethod
+    def versions(fk_model: Model) -> tuple:
+        return table_versions(*COMBO_DEPENDENCIES.get(fk_model, (fk_model,)))
+
+    def get(self, session: Session, fk_model: Model, fk_id_field: str, fk_name_field: str,
+            major_filter: str | None = None) -> tuple[list[str], dict[str, int]]:
+        """مانند fetch_combo_options، ولی تا وقتی جدول‌های وابسته تغییر نکرده‌اند از cache پاسخ می‌دهد."""
+        key = self.key(fk_model, major_filter)
+        versions = self.versions(fk_model)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+
+        options, id_to_name = fetch_combo_options(session, fk_model, fk_id_field, fk_name_field, key[1])
+        with self.lock:
+            current = self.entries.get(key)
+            # ورودی تازه‌تری که در این فاصله (مثلاً با revalidate) ثبت شده نباید با نتیجه قدیمی جایگزین شود
+            if current is None or current[0] != self.versions(fk_model):
+                self.entries[key] = [versions, options, id_to_name, None]
+        return options, id_to_name
+
+    def peek(self, fk_model: Model, major_filter: str | None = None) -> tuple[list[str], dict[str, int]] | None:
+        """آخرین گزینه‌های بارگذاری‌شده (بدون کوئری و بدون بررسی نسخه)، یا None."""
+        entry = self.entries.get(self.key(fk_model, major_filter))
+        return (entry[1], entry[2]) if entry is not None else None
+
+    @staticmethod
+    def snapshot() -> dict[str, int]:
+        """نسخه جدول‌ها پیش از یک عملیات CRUD، برای revalidate پس از آن."""
+        return dict(TABLE_VERSIONS)
+
+    def apply_delta(self, model: Model, record_id: int, old_entry: tuple | None, new_entry: tuple | None):
+        """حذف نام قدیمی و درج نام جدید یک رکورد در همه ورودی‌های این مدل (لیست‌ها مرتب می‌مانند)."""
+        model_name = model.__name__
+        with self.lock:
+            for (map_model, map_major), entry in self.entries.items():
+                if map_model != model_name:
+                    continue
+                options, id_to_name = entry[1], entry[2]
+                # اندیس جستجو در جستجوی بعدی از نو ساخته می‌شود
+                entry[3] = None
+
+                if old_entry and major_matches(map_major, old_entry[1]) and id_to_name.get(old_entry[0]) == record_id:
+                    del id_to_name[old_entry[0]]
+                    index = bisect_left(options, old_entry[0])
+                    if index < len(options) and options[index] == old_entry[0]:
+                        options.pop(index)
+
+                if new_entry and major_matches(map_major, new_entry[1]):
+                    if new_entry[0] not in id_to_name:
+                        insort(options, new_entry[0])
+                    id_to_name[new_entry[0]] = record_id
+
+    def revalidate(self, snapshot: dict[str, int]):
+        """پس از commit و apply_delta، ورودی‌هایی که پیش از عملیات به‌روز بودند به نسخه فعلی منتقل می‌شوند."""
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                dependencies = COMBO_DEPENDENCIES.get(COMBO_MODELS[key[0]], (COMBO_MODELS[key[0]],))
+                before = tuple(snapshot.get(model.__tablename__, 0) for model in dependencies)
+                if entry[0] == before:
+                    entry[0] = table_versions(*dependencies)
+                else:
+                    del self.entries[key]
+
+    def search(self, session: Session, fk_model: Model, fk_id_field: str, fk_name_field: str,
+               major_filter: str | None, text: str, limit: int = 50) -> list[str]:
+        """K نام نمایشی اول که یکی از کلمات یا عبارت‌هایشان با text شروع می‌شود."""
+        self.get(session, fk_model, fk_id_field, fk_name_field, major_filter)
+        key = self.key(fk_model, major_filter)
+        entry = self.entries.get(key)
+        index = entry[3] if entry is not None else None
+        if index is None:
+            versions = self.versions(fk_model)
+            index = PrefixIndex(fetch_search_entries(session, fk_model, key[1]))
+            with self.lock:
+                # اگر حین ساخت اندیس commit دیگری رسیده باشد، اندیس ذخیره نمی‌شود
+                if entry is not None and self.entries.get(key) is entry and entry[0] == versions == self.versions(fk_model):
+                    entry[3] = index
+        return index.search(text, limit)
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries),
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+def fetch_presentation_names(session: Session, fk_model: Model, record_id: int) -> list[tuple]:
+    """(شناسه ارائه، نام درس، نام استاد، روز) ارائه‌های وابسته به یک استاد یا درس."""
+    fk_column = Presentation.MasterId if fk_model == Master else Presentation.LessonId
+    query = join_presentation_names(session.query(
+        Presentation.PresentationId, Lesson.Name, Master.Name, Presentation.DayHold
+    )).filter(fk_column == record_id)
+    return [tuple(row) for row in query]
+
+
+# --- معدل ---
+
+def student_gpa(session: Session, student_id: int, year: int = ALL_YEARS) -> float | None:
+    """معدل وزنی یک دانشجو از جدول خلاصه (یا None اگر نمره‌ای نداشته باشد)."""
+    row = session.query(StudentGpaSummary.WeightedSum, StudentGpaSummary.UnitSum) \
+        .filter(StudentGpaSummary.IdStudent == student_id, StudentGpaSummary.YearEducation == year).first()
+    return row[0] / row[1] if row and row[1] else None
+
+
+def rank_students(session: Session, by_year: bool = False, by_major: bool = False) -> 'GpaRanking':
+    """رتبه‌بندی کامل دانشجویان را محاسبه می‌کند."""
+    return GpaRanking(session, by_year=by_year, by_major=by_major).refresh()
+
+
+# --- موتور معدل و رتبه‌بندی ---
+
+RankEntry = namedtuple('RankEntry', 'student_id name major year gpa dense_rank ordinal_rank group_size percentile')
+
+
+class GpaRanking:
+    """معدل وزنی همه دانشجویان را از جدول خلاصه معدل می‌خواند و رتبه‌ها را با توابع پنجره‌ای SQL محاسبه می‌کند."""
+
+    def __init__(self, session: Session, by_year: bool = False, by_major: bool = False):
+        self.session = session
+        self.by_year = by_year
+        self.by_major = by_major
+        self.entries = {}
+        self.groups = {}
+
+    def refresh(self) -> 'GpaRanking':
+        gpa = StudentGpaSummary.WeightedSum / StudentGpaSummary.UnitSum
+        partition = []
+        if self.by_year:
+            partition.append(StudentGpaSummary.YearEducation)
+        if self.by_major:
+            partition.append(Student.Major)
+        over = {'partition_by': partition} if partition else {}
+
+        query = self.session.query(
+            StudentGpaSummary.IdStudent, Student.Name, Student.Major, StudentGpaSummary.YearEducation,
+            gpa,
+            func.dense_rank().over(order_by=gpa.desc(), **over),
+            func.row_number().over(order_by=(gpa.desc(), StudentGpaSummary.IdStudent), **over),
+            func.count().over(**over),
+            func.percent_rank().over(order_by=gpa.desc(), **over),
+        ).join(Student, StudentGpaSummary.IdStudent == Student.IdStudent)
+
+        if self.by_year:
+            query = query.filter(StudentGpaSummary.YearEducation != ALL_YEARS)
+        else:
+            query = query.filter(StudentGpaSummary.YearEducation == ALL_YEARS)
+
+        self.entries = {}
+        self.groups = {}
+        for st_id, name, major, year, gpa_value, dense, ordinal, size, pct_rank in query:
+            if not self.by_year:
+                year = None
+            entry = RankEntry(st_id, name, major, year, gpa_value, dense, ordinal, size, 100 * (1 - float(pct_rank)))
+            self.entries[(st_id, year)] = entry
+            self.groups.setdefault(self.group_key(year, major), []).append(entry)
+
+        for members in self.groups.values():
+            members.sort(key=lambda e: e.ordinal_rank)
+        return self
+
+    def group_key(self, year=None, major=None):
+        return (year if self.by_year else None, major if self.by_major else None)
+
+    def get(self, student_id: int, year: int | None = None) -> RankEntry | None:
+        """رتبه یک دانشجو (یا None اگر نمره‌ای ثبت نکرده باشد)."""
+        return self.entries.get((student_id, year if self.by_year else None))
+
+    def top(self, n: int, year: int | None = None, major: str | None = None) -> list[RankEntry]:
+        """n دانشجوی برتر یک گروه (سال / رشته) به ترتیب رتبه."""
+        return self.groups.get(self.group_key(year, major), [])[:n]
+
+    def top_percent(self, percent: float, year: int | None = None, major: str | None = None) -> list[RankEntry]:
+        """دانشجویانی که در percent درصد بالای گروه خود قرار دارند."""
+        return [e for e in self.groups.get(self.group_key(year, major), []) if e.percentile >= 100 - percent]
+
+    def percentile(self, student_id: int, year: int | None = None) -> float | None:
+        entry = self.get(student_id, year)
+        return entry.percentile if entry else None
@@ -0,0 +1,292 @@
+"""تولید خودکار برنامه کلاسی ترم: روز و ساعت ارائه‌ها بدون تداخل استادان."""
+import argparse
+import json
+import random
+import sys
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from models import Lesson, Master, Presentation, Session, close_database, configure_database, get_engine, migrate
+import schedule
+import services
+
+DAY_START = 8
+DAY_END = 18
+HOURS_PER_UNIT = 1
+# وزن هر ساعت تداخل استاد در برابر هر ساعت همزمانی دو درس یک رشته
+HARD_WEIGHT = 1000
+
+Offering = namedtuple('Offering', 'lesson_id major hours masters')
+Slot = namedtuple('Slot', 'master_id day start finish')
+# hard: ساعات تداخل استادان (صفر یعنی برنامه معتبر)، soft: ساعات همزمانی دروس یک رشته
+Solution = namedtuple('Solution', 'hard soft slots seed iterations')
+
+
+class TimetableProblem:
+    """داده مسئله به شکل ساده و قابل pickle: ارائه‌ها، ساعات مسدود استادان و گزینه‌های مجاز هر ارائه."""
+
+    def __init__(self, offerings, blocked=(), days=services.WEEK_DAYS, day_start=DAY_START, day_end=DAY_END):
+        self.offerings = list(offerings)
+        self.days = list(days)
+        self.day_start = day_start
+        self.day_end = day_end
+        self.blocked = defaultdict(int)
+        for master_id, day, start, finish in blocked:
+            self.blocked[master_id, day] |= self.hours_mask(start, finish)
+        self.options = [self._options(offering) for offering in self.offerings]
+
+    def hours_mask(self, start, finish):
+        """بیت‌های ساعات [start, finish) در بازه روز کاری."""
+        start, finish = max(start, self.day_start), min(finish, self.day_end)
+        return ((1 << (finish - start)) - 1) << (start - self.day_start) if finish > start else 0
+
+    def _options(self, offering):
+        options = []
+        for master_id in offering.masters:
+            for day in self.days:
+                blocked = self.blocked.get((master_id, day), 0)
+                for start in range(self.day_start, self.day_end - offering.hours + 1):
+                    if not blocked & self.hours_mask(start, start + offering.hours):
+                        options.append(Slot(master_id, day, start, start + offering.hours))
+        return options
+
+
+class _Search:
+    """وضعیت یک اجرای جستجو: تعداد ارائه‌های هر ساعت به تفکیک (استاد، روز) و (رشته، روز)."""
+
+    def __init__(self, problem, rnd):
+        self.problem = problem
+        self.rnd = rnd
+        span = problem.day_end - problem.day_start
+        self.master_hours = defaultdict(lambda: [0] * span)
+        self.major_hours = defaultdict(lambda: [0] * span)
+        self.slots = [None] * len(problem.offerings)
+        self.hard = self.soft = 0
+
+    def _counters(self, i, slot):
+        major = self.problem.offerings[i].major
+        cohort = self.major_hours[major, slot.day] if major and major != 'سایر' else None
+        hours = range(slot.start - self.problem.day_start, slot.finish - self.problem.day_start)
+        return self.master_hours[slot.master_id, slot.day], cohort, hours
+
+    def cost(self, i, slot):
+        """(تداخل استاد، همزمانی رشته) در صورت قرار گرفتن ارائه i (که هنوز جای‌گذاری نشده) در slot."""
+        master, cohort, hours = self._counters(i, slot)
+        hard = sum(master[h] for h in hours)
+        soft = sum(cohort[h] for h in hours) if cohort else 0
+        return hard, soft
+
+    def place(self, i, slot):
+        hard, soft = self.cost(i, slot)
+        master, cohort, hours = self._counters(i, slot)
+        for h in hours:
+            master[h] += 1
+            if cohort:
+                cohort[h] += 1
+        self.slots[i] = slot
+        self.hard += hard
+        self.soft += soft
+
+    def remove(self, i):
+        slot = self.slots[i]
+        master, cohort, hours = self._counters(i, slot)
+        for h in hours:
+            master[h] -= 1
+            if cohort:
+                cohort[h] -= 1
+        hard, soft = self.cost(i, slot)
+        self.slots[i] = None
+        self.hard -= hard
+        self.soft -= soft
+
+    def total(self):
+        return self.hard * HARD_WEIGHT + self.soft
+
+    def best_option(self, i):
+        best, best_key = None, None
+        for slot in self.problem.options[i]:
+            hard, soft = self.cost(i, slot)
+            key = (hard * HARD_WEIGHT + soft, self.rnd.random())
+            if best_key is None or key < best_key:
+                best, best_key = slot, key
+        return best
+
+    def greedy(self):
+        """ارائه‌ها به ترتیب کمترین گزینه مجاز و بیشترین مدت (سخت‌ترین اول) در بهترین جای فعلی قرار می‌گیرند."""
+        order = sorted(range(len(self.slots)),
+                       key=lambda i: (len(self.problem.options[i]), -self.problem.offerings[i].hours, self.rnd.random()))
+        for i in order:
+            self.place(i, self.best_option(i))
+
+    def _conflicted(self, tries=30):
+        """یک ارائه تصادفی که در تداخل استاد (و اگر تداخلی نمانده، در همزمانی رشته) سهم دارد."""
+        if self.hard:
+            # تعداد ارائه‌های درگیر تداخل استاد معمولاً کم است؛ نمونه‌گیری تصادفی آن‌ها را پیدا نمی‌کند
+            hard = [i for i, slot in enumerate(self.slots)
+                    if any(self.master_hours[slot.master_id, slot.day][h] > 1 for h in self._counters(i, slot)[2])]
+            return self.rnd.choice(hard)
+        for _ in range(tries):
+            i = self.rnd.randrange(len(self.slots))
+            _, cohort, hours = self._counters(i, self.slots[i])
+            if cohort and any(cohort[h] > 1 for h in hours):
+                return i
+        return self.rnd.randrange(len(self.slots))
+
+    def local_search(self, deadline, max_iterations, patience=5000, noise=0.05):
+        """min-conflicts: ارائه‌ای متداخل برداشته و در بهترین گزینه (یا گاهی گزینه تصادفی) گذاشته می‌شود."""
+        best_total, best_slots = self.total(), list(self.slots)
+        best = (self.hard, self.soft)
+        iterations = improved_at = 0
+        while iterations < max_iterations and best_total and iterations - improved_at < patience:
+            if iterations % 100 == 0 and time.monotonic() > deadline:
+                break
+            iterations += 1
+            i = self._conflicted()
+            self.remove(i)
+            if self.rnd.random() < noise:
+                self.place(i, self.rnd.choice(self.problem.options[i]))
+            else:
+                self.place(i, self.best_option(i))
+            if self.total() < best_total:
+                best_total, best_slots, best = self.total(), list(self.slots), (self.hard, self.soft)
+                improved_at = iterations
+        return best, best_slots, iterations
+
+
+def solve_once(problem, seed, seconds=5.0, max_iterations=200000):
+    """یک اجرای حریصانه + جستجوی محلی با بذر تصادفی seed."""
+    search = _Search(problem, random.Random(seed))
+    search.greedy()
+    (hard, soft), slots, iterations = search.local_search(time.monotonic() + seconds, max_iterations)
+    return Solution(hard, soft, slots, seed, iterations)
+
+
+def solve(problem, restarts=4, workers=None, seconds=5.0, seed=0):
+    """restarts اجرای مستقل (با workers=0 در همین پردازش) و بهترین نتیجه بر اساس (hard، soft)."""
+    for offering, options in zip(problem.offerings, problem.options):
+        if not options:
+            raise ValueError(f"برای درس {offering.lesson_id} با {offering.hours} ساعت هیچ زمان آزادی "
+                             f"نزد استادان مجاز آن وجود ندارد.")
+    if not problem.offerings:
+        return Solution(0, 0, [], seed, 0)
+
+    seeds = [seed + k for k in range(restarts)]
+    if workers == 0 or restarts == 1:
+        results = [solve_once(problem, s, seconds) for s in seeds]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(solve_once, repeat(problem), seeds, repeat(seconds)))
+    return min(results, key=lambda solution: (solution.hard, solution.soft))
+
+
+# --- خواندن مسئله از دیتابیس و نوشتن نتیجه ---
+
+# مشخصات JSON ورودی:
+#     {"offerings": [{"lesson_id": 12, "masters": [3, 7], "count": 2}, ...],
+#      "unavailable": [{"master_id": 3, "day": "شنبه", "start": 8, "finish": 12}, ...],
+#      "days": ["شنبه", "یکشنبه"], "day_start": 8, "day_end": 18}
+def load_problem(session, spec, include_existing=True) -> TimetableProblem:
+    """مسئله را از مشخصات JSON و دروس دیتابیس می‌سازد؛ با include_existing ارائه‌های موجود استادان هم مسدودند."""
+    entries = spec.get('offerings', [])
+    lesson_ids = {entry['lesson_id'] for entry in entries}
+    master_ids = {master_id for entry in entries for master_id in entry['masters']}
+
+    lessons = {lesson_id: (unit, major) for lesson_id, unit, major in
+               session.query(Lesson.LessonId, Lesson.Unit, Lesson.Major).filter(Lesson.LessonId.in_(lesson_ids))}
+    known_masters = {master_id for master_id, in session.query(Master.MasterId).filter(Master.MasterId.in_(master_ids))}
+    if lesson_ids - lessons.keys():
+        raise ValueError(f"درس‌های {sorted(lesson_ids - lessons.keys())} در دیتابیس وجود ندارند.")
+    if master_ids - known_masters:
+        raise ValueError(f"استادان {sorted(master_ids - known_masters)} در دیتابیس وجود ندارند.")
+
+    offerings = []
+    for entry in entries:
+        unit, major = lessons[entry['lesson_id']]
+        hours = max(1, unit or 1) * HOURS_PER_UNIT
+        offering = Offering(entry['lesson_id'], major, hours, tuple(entry['masters']))
+        offerings.extend([offering] * entry.get('count', 1))
+
+    blocked = [(item['master_id'], item['day'], item['start'], item['finish']) for item in spec.get('unavailable', [])]
+    if include_existing:
+        blocked.extend(session.query(Presentation.MasterId, Presentation.DayHold, Presentation.StartTime,
+                                     Presentation.FinishTime)
+                       .filter(Presentation.MasterId.in_(master_ids), Presentation.DayHold.isnot(None),
+                               Presentation.StartTime.isnot(None), Presentation.FinishTime.isnot(None)).all())
+
+    return TimetableProblem(offerings, blocked, spec.get('days', services.WEEK_DAYS),
+                            spec.get('day_start', DAY_START), spec.get('day_end', DAY_END))
+
+
+def write_timetable(session, problem, solution) -> list[Presentation]:
+    """نتیجه را در یک تراکنش به صورت ردیف‌های Presentation درج می‌کند."""
+    if solution.hard:
+        raise ValueError(f"برنامه بدون تداخل پیدا نشد ({solution.hard} ساعت تداخل استاد باقی مانده است).")
+
+    records = [Presentation(MasterId=slot.master_id, LessonId=offering.lesson_id, DayHold=slot.day,
+                            StartTime=slot.start, FinishTime=slot.finish)
+               for offering, slot in zip(problem.offerings, solution.slots)]
+    try:
+        for record in records:
+            schedule.check_record(session, Presentation, record)
+        session.add_all(records)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="تولید خودکار برنامه کلاسی بدون تداخل")
+    parser.add_argument('spec', help="فایل JSON دروس، استادان و ساعات عدم حضور")
+    parser.add_argument('--restarts', type=int, default=4, help="تعداد اجراهای مستقل با بذر تصادفی متفاوت")
+    parser.add_argument('--workers', type=int, help="تعداد پردازش‌های موازی (0: همه در همین پردازش)")
+    parser.add_argument('--seconds', type=float, default=5.0, help="حداکثر زمان جستجوی محلی هر اجرا")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ignore-existing', action='store_true', help="ارائه‌های موجود استادان را در نظر نگیر")
+    parser.add_argument('--dry-run', action='store_true', help="فقط نمایش برنامه، بدون درج در دیتابیس")
+    parser.add_argument('--database-url', help="آدرس دیتابیس (پیش‌فرض: CHAMRAN_DATABASE_URL یا فایل chamran_uni.db)")
+    args = parser.parse_args(argv)
+
+    engine = configure_database(args.database_url) if args.database_url else get_engine()
+    migrate(engine)
+
+    with open(args.spec, encoding='utf-8') as handle:
+        spec = json.load(handle)
+
+    session = Session()
+    try:
+        problem = load_problem(session, spec, include_existing=not args.ignore_existing)
+        started = time.perf_counter()
+        solution = solve(problem, args.restarts, args.workers, args.seconds, args.seed)
+    except ValueError as e:
+        print(f"خطا: {e}")
+        return 1
+    elapsed = time.perf_counter() - started
+
+    lessons = dict(session.query(Lesson.LessonId, Lesson.Name))
+    masters = dict(session.query(Master.MasterId, Master.Name))
+    day_order = {day: k for k, day in enumerate(problem.days)}
+    for offering, slot in sorted(zip(problem.offerings, solution.slots),
+                                 key=lambda pair: (day_order[pair[1].day], pair[1].start, pair[1].master_id)):
+        print(f"{slot.day} {slot.start:>2}-{slot.finish:<2} {lessons[offering.lesson_id]} ({masters[slot.master_id]})")
+    print(f"{len(problem.offerings)} ارائه در {elapsed:.2f} ثانیه: {solution.hard} ساعت تداخل استاد، "
+          f"{solution.soft} ساعت همزمانی دروس یک رشته (بذر {solution.seed}، {solution.iterations} گام جستجو)")
+
+    if args.dry_run or solution.hard:
+        return 1 if solution.hard else 0
+    try:
+        records = write_timetable(session, problem, solution)
+    except ValueError as e:
+        print(f"خطا: {e}")
+        return 1
+    print(f"{len(records)} ارائه در دیتابیس درج شد.")
+    return 0
+
+
+if __name__ == '__main__':
+    status = main()
+    close_database()
+    sys.exit(status)
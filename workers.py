@@ -0,0 +1,115 @@
+"""اجرای کوئری‌ها در پس‌زمینه تا حلقه رویداد Tkinter هیچ‌وقت منتظر دیتابیس نماند.
+
+هر کار روی یک thread pool و با session مخصوص همان thread اجرا می‌شود و نتیجه‌اش از طریق یک صف
+که با root.after خوانده می‌شود به thread رابط کاربری برمی‌گردد. هر کار در یک «کانال» ثبت می‌شود؛
+ارسال کار جدید یا cancel روی همان کانال نتیجه کارهای قبلی را بی‌اثر می‌کند.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from models import Session
+
+POLL_MS = 20
+
+
+class QueryRunner:
+    """صف کارهای دیتابیس؛ با max_workers=0 کارها همان لحظه و با session اصلی در thread رابط اجرا می‌شوند.
+
+    با profiler (diagnostics.Profiler) زمان هر کار و callback آن به عملیاتی که آن را فرستاده نسبت داده می‌شود.
+    """
+
+    def __init__(self, root, max_workers=4, inline_session=None, on_error=None, on_busy=None, profiler=None):
+        self.root = root
+        self.profiler = profiler
+        self.inline_session = inline_session
+        self.on_error = on_error
+        self.on_busy = on_busy
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix='chamran-query') if max_workers else None
+        self.local = threading.local()
+        self.results = queue.SimpleQueue()
+        self.tokens = {}
+        self.waiting = set()
+        self.pending = 0
+        self.polling = False
+
+    def _session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = Session()
+        return self.local.session
+
+    def _run(self, job):
+        session = self._session()
+        try:
+            return job(session)
+        finally:
+            session.close()
+
+    def submit(self, channel, job, on_done, on_error=None):
+        """job(session) را اجرا و on_done(result) را در thread رابط صدا می‌زند، مگر اینکه کانال تا آن زمان کار جدیدتری گرفته باشد."""
+        token = self.tokens.get(channel, 0) + 1
+        self.tokens[channel] = token
+        on_error = on_error or self.on_error
+        if self.profiler is not None:
+            job, on_done, on_error = self.profiler.track(job, on_done, on_error)
+
+        if self.executor is None:
+            try:
+                result = job(self.inline_session)
+            except Exception as e:
+                if on_error:
+                    on_error(e)
+                    return
+                raise
+            on_done(result)
+            return
+
+        self.waiting.add(channel)
+        future = self.executor.submit(self._run, job)
+        future.add_done_callback(lambda f: self.results.put((channel, token, f, on_done, on_error)))
+        self._set_pending(self.pending + 1)
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_MS, self._poll)
+
+    def cancel(self, predicate=None):
+        """نتیجه کارهای در حال اجرای کانال‌هایی که predicate(channel) را دارند (یا همه کانال‌ها) دور ریخته می‌شود."""
+        for channel in self.tokens:
+            if predicate is None or predicate(channel):
+                self.tokens[channel] += 1
+                self.waiting.discard(channel)
+
+    def is_pending(self, channel):
+        """آیا نتیجه‌ای برای این کانال هنوز در راه است؟"""
+        return channel in self.waiting
+
+    def _poll(self):
+        while True:
+            try:
+                channel, token, future, on_done, on_error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self._set_pending(self.pending - 1)
+            if self.tokens.get(channel) != token:
+                continue
+            self.waiting.discard(channel)
+            try:
+                on_done(future.result())
+            except Exception as e:
+                # خطای کار یا callback نباید حلقه خواندن صف را متوقف کند
+                if on_error:
+                    on_error(e)
+
+        if self.pending:
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self.polling = False
+
+    def _set_pending(self, pending):
+        was_busy, self.pending = bool(self.pending), pending
+        if self.on_busy and was_busy != bool(pending):
+            self.on_busy(bool(pending))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)